@@ -0,0 +1,391 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import sys
+import errno
+import logging
+import argparse
+import random
+import threading
+from time import sleep
+
+from owfs_tree import make_skeleton, write_device, remove_tree
+
+logger = logging.getLogger(__name__)
+
+
+class _Device(object):
+    """
+    State of one simulated device.
+    """
+
+    def __init__(self, index, path, value):
+        self.index = index
+        self.path = path
+        self.value = value
+        self.stopped = False
+        self.thread = None
+
+    @property
+    def fifo(self):
+        return os.path.join(self.path, 'temperature')
+
+
+class SimulatedOWFS(object):
+    """
+    A local stand-in for an owfs mount that behaves like a real 1-Wire bus,
+    for evaluating the OWFS sensor class's concurrency and caching modes
+    without hardware. :py:class:`rpymostat_sensor.sensors.owfs.OWFS` can be
+    pointed at :py:attr:`~.path` with the ``owfs_path`` class argument.
+
+    Each device's ``temperature`` file is a named pipe served by a thread.
+    A read blocks while the device holds the (single, shared) bus lock and
+    waits ``conversion_delay`` seconds, so concurrent reads serialize the
+    way they do on a real bus. With probability ``error_rate`` a read
+    returns no data, which the sensor class treats as a failed read.
+
+    Writing to ``simultaneous/temperature`` holds the bus for one
+    conversion and then updates every device's ``latesttemp`` file, like
+    owfs's simultaneous conversion. If ``hotplug_interval`` is set, a
+    device is added or removed at random that often.
+
+    Only ``temperature`` reads and the simultaneous trigger go through the
+    simulated bus; other files (``address``, ``type``, etc.) are plain files.
+    """
+
+    def __init__(self, devices=10, conversion_delay=0.75, error_rate=0.0,
+                 hotplug_interval=None, base=None, seed=0):
+        """
+        :param devices: number of devices initially present
+        :type devices: int
+        :param conversion_delay: seconds each temperature conversion holds
+          the bus
+        :type conversion_delay: float
+        :param error_rate: probability (0-1) that a temperature read fails
+        :type error_rate: float
+        :param hotplug_interval: if set, add or remove a random device every
+          this many seconds
+        :type hotplug_interval: float
+        :param base: directory to create the tree in
+        :type base: str
+        :param seed: random seed
+        :type seed: int
+        """
+        self.initial_devices = devices
+        self.conversion_delay = conversion_delay
+        self.error_rate = error_rate
+        self.hotplug_interval = hotplug_interval
+        self.base = base
+        self.path = None
+        self.stats = {
+            'reads': 0, 'errors': 0, 'bulk_conversions': 0, 'added': 0,
+            'removed': 0
+        }
+        self._rnd = random.Random(seed)
+        self._bus = threading.Lock()
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._next_index = 0
+        self._stopping = threading.Event()
+        self._threads = []
+        self._hotplug_thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+    @property
+    def device_count(self):
+        """
+        Number of devices currently present.
+
+        :rtype: int
+        """
+        with self._lock:
+            return len(self._devices)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def start(self):
+        """
+        Create the tree and start serving it.
+        """
+        self.path = make_skeleton(self.base)
+        os.mkdir(os.path.join(self.path, 'simultaneous'))
+        trigger = os.path.join(self.path, 'simultaneous', 'temperature')
+        os.mkfifo(trigger)
+        for _ in range(self.initial_devices):
+            self.add_device()
+        self._start_thread(self._serve_simultaneous, trigger)
+        if self.hotplug_interval is not None:
+            self._hotplug_thread = self._start_thread(self._hotplug)
+        logger.info('Simulated OWFS with %d devices at %s',
+                    self.initial_devices, self.path)
+
+    def stop(self):
+        """
+        Stop all threads and remove the tree.
+        """
+        self._stopping.set()
+        if self._hotplug_thread is not None:
+            self._hotplug_thread.join(5)
+        for index in list(self._devices.keys()):
+            self.remove_device(index)
+        self._unblock_writer(
+            os.path.join(self.path, 'simultaneous', 'temperature')
+        )
+        for t in self._threads:
+            t.join(5)
+        remove_tree(self.path)
+
+    def _start_thread(self, target, *args):
+        t = threading.Thread(target=target, args=args)
+        t.daemon = True
+        t.start()
+        self._threads.append(t)
+        return t
+
+    def add_device(self):
+        """
+        Add a new device to the bus.
+
+        :return: the new device's index
+        :rtype: int
+        """
+        with self._lock:
+            index = self._next_index
+            self._next_index += 1
+        path = write_device(self.path, index)
+        dev = _Device(index, path, self._rnd.uniform(15, 30))
+        self._write_latest(dev)
+        os.mkfifo(dev.fifo)
+        with self._lock:
+            self._devices[index] = dev
+        dev.thread = threading.Thread(target=self._serve_device, args=(dev,))
+        dev.thread.daemon = True
+        dev.thread.start()
+        return index
+
+    def remove_device(self, index):
+        """
+        Remove a device from the bus.
+
+        :param index: index of the device to remove
+        :type index: int
+        """
+        with self._lock:
+            dev = self._devices.pop(index)
+        dev.stopped = True
+        self._unblock_reader(dev.fifo)
+        dev.thread.join(5)
+        remove_tree(dev.path)
+
+    def _unblock_reader(self, fifo):
+        """
+        Open a FIFO for reading (without blocking) and close it again, to
+        wake a serving thread blocked opening it for writing.
+        """
+        try:
+            os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+    def _unblock_writer(self, fifo):
+        """
+        Open a FIFO for writing (without blocking) and close it again, to
+        wake a serving thread blocked opening it for reading.
+        """
+        try:
+            os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+    def _convert(self, dev):
+        """
+        Advance a device's temperature by a small random walk step.
+        """
+        dev.value += self._rnd.uniform(-0.25, 0.25)
+        return dev.value
+
+    def _write_latest(self, dev):
+        """
+        Atomically write a device's current value to its ``latesttemp``.
+        """
+        tmp = os.path.join(dev.path, '.latesttemp')
+        with open(tmp, 'w') as fh:
+            fh.write('%12.4f' % dev.value)
+        os.rename(tmp, os.path.join(dev.path, 'latesttemp'))
+
+    def _serve_device(self, dev):
+        """
+        Serve reads of one device's ``temperature`` FIFO until the device is
+        removed.
+        """
+        while not dev.stopped:
+            try:
+                # blocks until a reader opens the FIFO
+                fh = open(dev.fifo, 'w')
+            except (IOError, OSError):
+                return
+            try:
+                if dev.stopped:
+                    break
+                self._replace_fifo(dev)
+                with self._bus:
+                    sleep(self.conversion_delay)
+                    self._convert(dev)
+                self._count('reads')
+                self._write_latest(dev)
+                if self._rnd.random() < self.error_rate:
+                    # close without answering; the read gets no data
+                    self._count('errors')
+                else:
+                    fh.write('%12.4f' % dev.value)
+            except (IOError, OSError) as ex:
+                # reader went away before we answered
+                if ex.errno != errno.EPIPE:
+                    logger.exception('Error serving %s', dev.fifo)
+            finally:
+                try:
+                    fh.close()
+                except (IOError, OSError):
+                    pass
+
+    def _replace_fifo(self, dev):
+        """
+        Atomically replace a device's ``temperature`` FIFO with a new one.
+        Called once a reader has opened the old FIFO, so that the next
+        read opens the new one instead of re-using the pipe this reader
+        still has open (which would hand it a second value).
+        """
+        tmp = os.path.join(dev.path, '.temperature')
+        os.mkfifo(tmp)
+        os.rename(tmp, dev.fifo)
+
+    def _serve_simultaneous(self, trigger):
+        """
+        Serve writes to ``simultaneous/temperature``; each write converts all
+        devices at once, holding the bus for one conversion delay.
+        """
+        while not self._stopping.is_set():
+            with open(trigger, 'r') as fh:
+                data = fh.read()
+            if self._stopping.is_set():
+                return
+            if data.strip() == '':
+                continue
+            with self._bus:
+                sleep(self.conversion_delay)
+                with self._lock:
+                    devices = list(self._devices.values())
+                for dev in devices:
+                    self._convert(dev)
+            for dev in devices:
+                try:
+                    self._write_latest(dev)
+                except (IOError, OSError):
+                    pass  # removed in the meantime
+            self._count('bulk_conversions')
+
+    def _hotplug(self):
+        """
+        Every ``hotplug_interval`` seconds, add or remove a random device.
+        """
+        while not self._stopping.wait(self.hotplug_interval):
+            with self._lock:
+                indexes = list(self._devices.keys())
+            if len(indexes) > 1 and self._rnd.random() < 0.5:
+                index = self._rnd.choice(indexes)
+                self.remove_device(index)
+                self._count('removed')
+                logger.info('Hot-unplugged device %d', index)
+            else:
+                index = self.add_device()
+                self._count('added')
+                logger.info('Hot-plugged device %d', index)
+
+
+def parse_args(argv):
+    p = argparse.ArgumentParser(
+        description='Serve a simulated OWFS tree until interrupted; point '
+                    'the sensor daemon at it with -c OWFS=owfs_path=PATH'
+    )
+    p.add_argument('-n', '--devices', dest='devices', type=int, default=10,
+                   help='number of devices (default: 10)')
+    p.add_argument('-d', '--conversion-delay', dest='conversion_delay',
+                   type=float, default=0.75,
+                   help='seconds per temperature conversion (default: 0.75)')
+    p.add_argument('-e', '--error-rate', dest='error_rate', type=float,
+                   default=0.0, help='probability of a failed read (0-1)')
+    p.add_argument('-p', '--hotplug-interval', dest='hotplug_interval',
+                   type=float, default=None, help='add or remove a random '
+                   'device every this many seconds')
+    p.add_argument('--tree-dir', dest='tree_dir', default=None,
+                   help='directory to create the tree in (default: /dev/shm '
+                   'if available)')
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    sim = SimulatedOWFS(
+        devices=args.devices, conversion_delay=args.conversion_delay,
+        error_rate=args.error_rate, hotplug_interval=args.hotplug_interval,
+        base=args.tree_dir
+    )
+    with sim:
+        print(sim.path)
+        sys.stdout.flush()
+        try:
+            while True:
+                sleep(60)
+                logger.info('Stats: %s', sim.stats)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import random
+import shutil
+import tempfile
+from time import sleep
+
+import rpymostat_sensor.sensors.owfs as owfs_module
+
+try:
+    import __builtin__ as builtins  # python 2
+except ImportError:
+    import builtins
+
+
+def tmpfs_dir():
+    """
+    Return a directory to create trees in; ``/dev/shm`` (tmpfs) if it is
+    available and writable, otherwise the default temporary directory.
+
+    :rtype: str
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def make_skeleton(base=None):
+    """
+    Create an empty OWFS-like tree: the non-sensor directories that owfs
+    presents (which discovery has to skip) and the temperature scale
+    setting, but no devices.
+
+    :param base: directory to create the tree in; see :py:func:`~.tmpfs_dir`
+    :type base: str
+    :return: path to the new tree; remove it with :py:func:`~.remove_tree`
+    :rtype: str
+    """
+    path = tempfile.mkdtemp(prefix='owfs-bench-', dir=base or tmpfs_dir())
+    for name in ['bus.0', 'settings', 'statistics', 'structure', 'system',
+                 'uncached']:
+        os.mkdir(os.path.join(path, name))
+    os.mkdir(os.path.join(path, 'settings', 'units'))
+    with open(
+        os.path.join(path, 'settings', 'units', 'temperature_scale'), 'w'
+    ) as fh:
+        fh.write('C')
+    return path
+
+
+def write_device(path, index, temperature=None):
+    """
+    Create a DS18B20 device directory (``28.XXXXXXXXXXXX``) in an OWFS tree,
+    with ``address``, ``type`` and (for even indexes) ``alias`` files, and a
+    ``temperature`` file if ``temperature`` is given.
+
+    :param path: path to the tree
+    :type path: str
+    :param index: device number; determines the serial number
+    :type index: int
+    :param temperature: temperature to write, if any
+    :type temperature: float
+    :return: path to the device directory
+    :rtype: str
+    """
+    serial = '%012X' % (index + 1)
+    sdir = os.path.join(path, '28.%s' % serial)
+    os.mkdir(sdir)
+    files = {
+        'address': '28%s%02X' % (serial, index % 256),
+        'type': 'DS18B20'
+    }
+    if index % 2 == 0:
+        files['alias'] = 'sensor%d' % index
+    if temperature is not None:
+        files['temperature'] = '%12.4f' % temperature
+    for fname, content in files.items():
+        with open(os.path.join(sdir, fname), 'w') as fh:
+            fh.write(content)
+    return sdir
+
+
+def make_tree(count, base=None, seed=0):
+    """
+    Create a synthetic OWFS tree with ``count`` DS18B20 temperature sensors,
+    laid out the way owfs presents them. Temperatures are plain files, so
+    reads are as fast as the filesystem; see :py:class:`~.FileLatency` and
+    :py:mod:`owfs_sim` for slower, more realistic trees.
+
+    :param count: number of sensors to create
+    :type count: int
+    :param base: directory to create the tree in; see :py:func:`~.tmpfs_dir`
+    :type base: str
+    :param seed: random seed for temperatures
+    :type seed: int
+    :return: path to the new tree; remove it with :py:func:`~.remove_tree`
+    :rtype: str
+    """
+    rnd = random.Random(seed)
+    path = make_skeleton(base)
+    for i in range(count):
+        write_device(path, i, temperature=rnd.uniform(15, 30))
+    return path
+
+
+def remove_tree(path):
+    """
+    Remove a tree created by :py:func:`~.make_tree`.
+
+    :param path: path to the tree
+    :type path: str
+    """
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class FileLatency(object):
+    """
+    Context manager that makes every file opened by the OWFS sensor class
+    block for ``delay`` seconds first, approximating the per-file read time
+    of a real 1-Wire bus.
+    """
+
+    def __init__(self, delay):
+        """
+        :param delay: seconds to sleep before each file open
+        :type delay: float
+        """
+        self.delay = delay
+
+    def __enter__(self):
+        if self.delay <= 0:
+            return self
+        delay = self.delay
+        real_open = builtins.open
+
+        def slow_open(*args, **kwargs):
+            sleep(delay)
+            return real_open(*args, **kwargs)
+
+        # shadows the builtin open() within the owfs module only
+        owfs_module.open = slow_open
+        return self
+
+    def __exit__(self, *args):
+        if hasattr(owfs_module, 'open'):
+            del owfs_module.open
+        return False
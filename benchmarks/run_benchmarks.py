@@ -0,0 +1,344 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import json
+import math
+import logging
+import argparse
+import platform
+import time
+from contextlib import contextmanager
+
+from owfs_tree import make_tree, remove_tree, FileLatency
+from owfs_sim import SimulatedOWFS
+from stub_engine import StubEngine
+
+from rpymostat_sensor.version import VERSION
+from rpymostat_sensor.sensors.owfs import OWFS
+from rpymostat_sensor.utils import monotonic_time
+
+logger = logging.getLogger(__name__)
+
+
+def measure(func, repeat):
+    """
+    Call ``func`` ``repeat`` times; return the list of durations.
+
+    :param func: callable to time
+    :param repeat: number of calls
+    :type repeat: int
+    :rtype: list
+    """
+    samples = []
+    for _ in range(repeat):
+        start = monotonic_time()
+        func()
+        samples.append(monotonic_time() - start)
+    return samples
+
+
+def summarize(samples):
+    """
+    Return min/mean/p50/p95/max of a list of durations.
+
+    :param samples: durations in seconds
+    :type samples: list
+    :rtype: dict
+    """
+    s = sorted(samples)
+    n = len(s)
+    return {
+        'min': s[0],
+        'mean': sum(s) / n,
+        'p50': s[max(int(math.ceil(n * 0.5)) - 1, 0)],
+        'p95': s[max(int(math.ceil(n * 0.95)) - 1, 0)],
+        'max': s[-1]
+    }
+
+
+def result(name, samples, **params):
+    """
+    Build one benchmark result dict.
+
+    :param name: benchmark name
+    :type name: str
+    :param samples: durations in seconds
+    :type samples: list
+    :param params: benchmark parameters (device count, latency, etc.)
+    :rtype: dict
+    """
+    r = {'name': name, 'params': params, 'repeat': len(samples)}
+    r.update(summarize(samples))
+    logger.info('%s %s: p50=%.6fs p95=%.6fs', name, params, r['p50'],
+                r['p95'])
+    return r
+
+
+def make_daemon(tree, engine, args):
+    """
+    Construct a :py:class:`~.SensorDaemon` that reads the synthetic tree and
+    sends to the stub Engine. Imported here so that the OWFS-only
+    benchmarks can run without the daemon's dependencies.
+    """
+    from rpymostat_sensor.sensor_daemon import SensorDaemon
+    return SensorDaemon(
+        engine_addr='127.0.0.1', engine_port=engine.port,
+        class_args={'OWFS': dict(
+            (k, str(v)) for k, v in owfs_kwargs(tree, args).items()
+        )}
+    )
+
+
+def owfs_kwargs(tree, args):
+    """
+    Return the OWFS class arguments to benchmark with.
+
+    :rtype: dict
+    """
+    return {
+        'owfs_path': tree,
+        'read_threads': args.read_threads,
+        'simultaneous': args.simultaneous,
+        'conversion_delay': args.conversion_delay
+    }
+
+
+@contextmanager
+def owfs_tree(count, args):
+    """
+    Context manager that yields the path to an OWFS tree of ``count``
+    devices; a :py:class:`~.SimulatedOWFS` if ``args.simulate`` is set,
+    otherwise a plain tree from :py:func:`~.make_tree`.
+    """
+    if args.simulate:
+        with SimulatedOWFS(
+            devices=count, conversion_delay=args.conversion_delay,
+            error_rate=args.error_rate, base=args.tree_dir
+        ) as sim:
+            yield sim.path
+        return
+    tree = make_tree(count, base=args.tree_dir)
+    try:
+        yield tree
+    finally:
+        remove_tree(tree)
+
+
+def run_size(count, args, engine):
+    """
+    Run all benchmarks against a synthetic tree of ``count`` devices.
+
+    :param count: number of devices
+    :type count: int
+    :param args: parsed command line arguments
+    :param engine: running stub Engine
+    :type engine: :py:class:`~.StubEngine`
+    :rtype: list
+    """
+    results = []
+    params = {
+        'devices': count,
+        'latency': args.latency,
+        'read_threads': args.read_threads,
+        'simulate': args.simulate,
+        'simultaneous': args.simultaneous
+    }
+    if args.simulate:
+        params['conversion_delay'] = args.conversion_delay
+        params['error_rate'] = args.error_rate
+    with owfs_tree(count, args) as tree:
+        sensor = OWFS(**owfs_kwargs(tree, args))
+        with FileLatency(args.latency):
+            results.append(result(
+                'owfs.find_sensors',
+                measure(sensor._find_sensors, args.repeat), **params
+            ))
+            sensor.sensors_present()
+            results.append(result(
+                'owfs.read', measure(sensor.read, args.repeat), **params
+            ))
+            if args.skip_daemon:
+                return results
+            daemon = make_daemon(tree, engine, args)
+
+            def build_payload():
+                json.dumps(daemon.read_sensors()).encode('utf-8')
+
+            results.append(result(
+                'daemon.payload', measure(build_payload, args.repeat),
+                **params
+            ))
+            data = daemon.read_sensors()
+            results.append(result(
+                'daemon.send',
+                measure(lambda: daemon.send_data(data), args.repeat),
+                engine_delay=args.engine_delay, **params
+            ))
+            results.append(result(
+                'daemon.read_and_send',
+                measure(daemon.read_and_send, args.repeat),
+                engine_delay=args.engine_delay, **params
+            ))
+            daemon.session.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare p50 timings against a baseline results file. Return a list of
+    regression description strings for results more than ``threshold``
+    times slower than the matching baseline result.
+
+    :param results: current results
+    :type results: list
+    :param baseline: baseline results (the ``results`` list from a previous
+      run's output)
+    :type baseline: list
+    :param threshold: ratio above which a result is a regression
+    :type threshold: float
+    :rtype: list
+    """
+    base = dict(
+        ((r['name'], json.dumps(r['params'], sort_keys=True)), r)
+        for r in baseline
+    )
+    regressions = []
+    for r in results:
+        b = base.get((r['name'], json.dumps(r['params'], sort_keys=True)))
+        if b is None or b['p50'] <= 0:
+            continue
+        ratio = r['p50'] / b['p50']
+        if ratio > threshold:
+            regressions.append('%s %s: p50 %.6fs vs %.6fs (%.2fx)' % (
+                r['name'], r['params'], r['p50'], b['p50'], ratio
+            ))
+    return regressions
+
+
+def parse_args(argv):
+    p = argparse.ArgumentParser(
+        description='Benchmark the RPyMostat-sensor read/serialize/send '
+                    'pipeline against synthetic OWFS trees and a local stub '
+                    'Engine; writes results as JSON.'
+    )
+    p.add_argument('-s', '--sizes', dest='sizes', default='1,10,100,1000',
+                   help='comma-separated numbers of devices to benchmark '
+                   '(default: 1,10,100,1000)')
+    p.add_argument('-r', '--repeat', dest='repeat', type=int, default=20,
+                   help='number of timed runs of each benchmark')
+    p.add_argument('-l', '--latency', dest='latency', type=float,
+                   default=0.0, help='seconds of latency to add to every '
+                   'OWFS file open')
+    p.add_argument('-t', '--read-threads', dest='read_threads', type=int,
+                   default=1, help='OWFS read_threads setting')
+    p.add_argument('--simultaneous', dest='simultaneous',
+                   action='store_true', default=False,
+                   help='enable the OWFS simultaneous conversion mode')
+    p.add_argument('--simulate', dest='simulate', action='store_true',
+                   default=False, help='benchmark against a simulated OWFS '
+                   'bus (owfs_sim.py) instead of plain files')
+    p.add_argument('--conversion-delay', dest='conversion_delay',
+                   type=float, default=0.75, help='with --simulate, seconds '
+                   'per temperature conversion; also passed to OWFS for '
+                   '--simultaneous (default: 0.75)')
+    p.add_argument('--error-rate', dest='error_rate', type=float,
+                   default=0.0, help='with --simulate, probability of a '
+                   'failed temperature read')
+    p.add_argument('--engine-delay', dest='engine_delay', type=float,
+                   default=0.0, help='seconds the stub Engine waits before '
+                   'responding')
+    p.add_argument('--tree-dir', dest='tree_dir', default=None,
+                   help='directory to create synthetic trees in (default: '
+                   '/dev/shm if available)')
+    p.add_argument('--skip-daemon', dest='skip_daemon', action='store_true',
+                   default=False, help='only run the OWFS benchmarks')
+    p.add_argument('-o', '--output', dest='output', default=None,
+                   help='write JSON results to this file instead of STDOUT')
+    p.add_argument('-c', '--compare', dest='compare', default=None,
+                   help='baseline JSON results file to compare against; '
+                   'exit 1 if any benchmark regressed')
+    p.add_argument('--threshold', dest='threshold', type=float, default=1.2,
+                   help='p50 slowdown ratio counted as a regression with '
+                   '--compare (default: 1.2)')
+    p.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                   default=False, help='log progress to STDERR')
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s %(levelname)s %(message)s'
+    )
+    # keep the daemon's per-request logging out of the timings
+    logging.getLogger('rpymostat_sensor').setLevel(logging.WARNING)
+    engine = StubEngine(delay=args.engine_delay)
+    engine.start()
+    results = []
+    try:
+        for count in [int(x) for x in args.sizes.split(',')]:
+            results.extend(run_size(count, args, engine))
+    finally:
+        engine.stop()
+    output = {
+        'version': VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results
+    }
+    s = json.dumps(output, indent=2, sort_keys=True)
+    if args.output is None:
+        print(s)
+    else:
+        with open(args.output, 'w') as fh:
+            fh.write(s + '\n')
+    if args.compare is not None:
+        with open(args.compare, 'r') as fh:
+            baseline = json.load(fh)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            sys.stderr.write('REGRESSION: %s\n' % r)
+        if len(regressions) > 0:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
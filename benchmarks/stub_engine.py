@@ -0,0 +1,123 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import threading
+from time import sleep
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubEngine(object):
+    """
+    Minimal local stand-in for the RPyMostat Engine API, for benchmarking
+    the sensor daemon's HTTP sends. Accepts any PUT with HTTP/1.1 keep-alive,
+    optionally waits ``delay`` seconds, and responds with ``status``.
+    """
+
+    def __init__(self, delay=0.0, status=201):
+        """
+        :param delay: seconds to wait before responding to each request
+        :type delay: float
+        :param status: HTTP status code to respond with
+        :type status: int
+        """
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def port(self):
+        """
+        Port the stub is listening on.
+
+        :rtype: int
+        """
+        return self.server.server_port
+
+    def start(self):
+        """
+        Start the stub on a free localhost port, in a daemon thread.
+        """
+        self.server = _ThreadingHTTPServer(
+            ('127.0.0.1', 0), self._make_handler()
+        )
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+
+    def stop(self):
+        """
+        Stop the stub.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        stub = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_PUT(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(length)
+                with stub._lock:
+                    stub.requests += 1
+                    stub.bytes_received += length
+                if stub.delay > 0:
+                    sleep(stub.delay)
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return StubHandler
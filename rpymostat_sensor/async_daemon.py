@@ -0,0 +1,217 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import time
+from functools import partial
+
+from rpymostat_sensor.sensor_daemon import SensorDaemon
+
+try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    asyncio = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSensorDaemon(SensorDaemon):
+    """
+    Alternative :py:class:`~.SensorDaemon` run engine built on an
+    :py:mod:`asyncio` event loop. Sensor reads and Engine PUTs each run in
+    their own single-thread executor, so the PUT for one interval overlaps
+    the sensor reads for the next one, and a slow Engine response never
+    delays the next sensor sample. PUTs are sent one at a time, in order, so
+    that an older update never arrives after a newer one. At most one update
+    waits behind the PUT in progress; a newer sample replaces it, or is
+    stored in the send buffer if one is configured. Requires Python 3.4 or
+    newer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the Sensor Daemon. Takes the same arguments as
+        :py:class:`~.SensorDaemon`.
+        """
+        if asyncio is None:
+            raise RuntimeError('The asyncio run mode requires Python 3.4 or '
+                               'newer.')
+        super(AsyncSensorDaemon, self).__init__(*args, **kwargs)
+        self.loop = None
+        self._read_executor = None
+        self._send_executor = None
+        self._read_future = None
+        self._send_futures = set()
+        self._pending_send = None
+
+    def run(self):
+        """
+        Run the Sensor Daemon loop on an asyncio event loop.
+        """
+        logger.info("Running asyncio sensor daemon loop...")
+        self.loop = asyncio.new_event_loop()
+        # a single read thread; the sensors for one interval are read
+        # one class at a time, and never overlap with the previous read
+        self._read_executor = ThreadPoolExecutor(max_workers=1)
+        # a single send thread, too; updates carry no timestamp, so they
+        # must reach the Engine in order, and delta mode state is updated
+        # after each send
+        self._send_executor = ThreadPoolExecutor(max_workers=1)
+        if self.metrics is not None:
+            self.metrics.start()
+        self.start_rediscovery()
+        try:
+            if self.scheduler is not None:
+                self.loop.call_at(self.scheduler.next_deadline(), self._tick)
+            else:
+                self.loop.call_soon(self._tick)
+            self.loop.run_forever()
+        finally:
+            self._read_executor.shutdown(wait=False)
+            self._send_executor.shutdown(wait=True)
+            if self._pending_send is not None:
+                data, timestamp = self._pending_send
+                self._pending_send = None
+                self.send_data(data, timestamp=timestamp)
+            self.loop.close()
+            self.stop_rediscovery()
+            self.flush_batch()
+            if self.metrics is not None:
+                self.metrics.stop()
+
+    def _tick(self):
+        """
+        Schedule the next interval (using the fixed-rate scheduler if
+        enabled), then start reading sensors in the read executor. If the
+        previous interval's read is still running, skip this one.
+        """
+        if self.scheduler is not None:
+            # asyncio's loop.time() is the same monotonic clock
+            self.loop.call_at(self.scheduler.next_deadline(), self._tick)
+        else:
+            self.loop.call_later(self.next_interval(), self._tick)
+        if self._read_future is not None and not self._read_future.done():
+            logger.warning('Sensor read from previous interval still '
+                           'running; skipping this interval')
+            return
+        logger.debug('Starting sensor read')
+        timestamp = time.time()
+        self._read_future = self.loop.run_in_executor(
+            self._read_executor, self.read_sensors
+        )
+        self._read_future.add_done_callback(
+            partial(self._read_done, timestamp=timestamp)
+        )
+
+    def _read_done(self, future, timestamp=None):
+        """
+        Callback for completion of a sensor read; start sending the data to
+        the Engine in the send executor. If a PUT is already in progress,
+        store the data in the send buffer if one is configured; otherwise
+        hold it to be sent once the PUT finishes, replacing any older update
+        already waiting.
+
+        :param future: the completed read future
+        :type future: :py:class:`asyncio.Future`
+        :param timestamp: time the read started, as returned by
+          :py:func:`time.time`
+        :type timestamp: float
+        """
+        try:
+            data = future.result()
+        except Exception:
+            logger.exception('Exception reading sensors')
+            return
+        if data is None:
+            # no sensor class was due for polling
+            return
+        if self.adaptive is not None:
+            self.adaptive.update(data['sensors'])
+        if len(self._send_futures) > 0:
+            if self.buffer is not None:
+                self.buffer.push(timestamp or time.time(), data['sensors'])
+                logger.warning('PUT to the Engine already in progress; '
+                               'stored sensor data in send buffer (%d '
+                               'entries)', len(self.buffer))
+            elif self._pending_send is not None:
+                logger.warning('PUT to the Engine already in progress; '
+                               'replacing queued update with newer data')
+                self._pending_send = (data, timestamp)
+            else:
+                logger.warning('PUT to the Engine already in progress; '
+                               'queueing this update')
+                self._pending_send = (data, timestamp)
+            return
+        self._start_send(data, timestamp)
+
+    def _start_send(self, data, timestamp):
+        """
+        Start sending data to the Engine in the send executor.
+
+        :param data: sensor update data, as returned by
+          :py:meth:`~.read_sensors`
+        :type data: dict
+        :param timestamp: time the data was read
+        :type timestamp: float
+        """
+        f = self.loop.run_in_executor(
+            self._send_executor,
+            partial(self.send_data, data, timestamp=timestamp)
+        )
+        self._send_futures.add(f)
+        f.add_done_callback(self._send_done)
+
+    def _send_done(self, future):
+        """
+        Callback for completion of a PUT to the Engine; start sending the
+        update waiting behind it, if any.
+
+        :param future: the completed send future
+        :type future: :py:class:`asyncio.Future`
+        """
+        self._send_futures.discard(future)
+        try:
+            future.result()
+        except Exception:
+            logger.exception('Exception sending data to Engine')
+        if self._pending_send is not None:
+            data, timestamp = self._pending_send
+            self._pending_send = None
+            self._start_send(data, timestamp)
+        self.log_timings()
+        self.update_metrics()
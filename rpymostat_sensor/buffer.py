@@ -0,0 +1,181 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SendBuffer(object):
+    """
+    Bounded, crash-safe on-disk queue of sensor data that could not be sent
+    to the Engine, backed by a SQLite database. Each entry is a timestamped
+    sensor data dict (the ``sensors`` value of an Engine update). When the
+    queue exceeds ``max_entries`` entries or ``max_bytes`` bytes of sensor
+    data, the oldest entries are evicted.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, path, max_entries=10000, max_bytes=None):
+        """
+        Open (creating if needed) the buffer database.
+
+        :param path: path to the SQLite database file
+        :type path: str
+        :param max_entries: maximum number of entries to keep; None for no
+          limit
+        :type max_entries: int
+        :param max_bytes: maximum total size in bytes of the serialized sensor
+          data to keep; None for no limit
+        :type max_bytes: int
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # auto_vacuum must be set before the table is created; it makes the
+        # file shrink again as entries are removed
+        self._conn.execute('PRAGMA auto_vacuum = FULL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS queue ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'timestamp REAL NOT NULL, '
+            'sensors TEXT NOT NULL)'
+        )
+        self._conn.commit()
+        logger.debug('Opened send buffer at %s with %d entries', path,
+                     len(self))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM queue'
+            ).fetchone()[0]
+
+    def push(self, timestamp, sensors):
+        """
+        Add an entry to the end of the queue, then evict the oldest entries
+        if the queue is over its size limits.
+
+        :param timestamp: time the data was read, as a float Unix timestamp
+        :type timestamp: float
+        :param sensors: sensor data dict
+        :type sensors: dict
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO queue (timestamp, sensors) VALUES (?, ?)',
+                (timestamp, json.dumps(sensors))
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Delete the oldest entries until the queue is within ``max_entries``
+        and ``max_bytes``. Must be called with ``self._lock`` held.
+        """
+        if self.max_entries is not None:
+            cur = self._conn.execute(
+                'DELETE FROM queue WHERE id NOT IN '
+                '(SELECT id FROM queue ORDER BY id DESC LIMIT ?)',
+                (self.max_entries, )
+            )
+            if cur.rowcount > 0:
+                logger.warning('Send buffer full; evicted %d oldest entries',
+                               cur.rowcount)
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute(
+            'SELECT COALESCE(SUM(LENGTH(sensors)), 0) FROM queue'
+        ).fetchone()[0]
+        evicted = 0
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                'SELECT id, LENGTH(sensors) FROM queue ORDER BY id LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute('DELETE FROM queue WHERE id = ?', (row[0], ))
+            total -= row[1]
+            evicted += 1
+        if evicted > 0:
+            logger.warning('Send buffer over %d bytes; evicted %d oldest '
+                           'entries', self.max_bytes, evicted)
+
+    def peek(self, limit):
+        """
+        Return up to ``limit`` of the oldest entries in the queue, without
+        removing them.
+
+        :param limit: maximum number of entries to return
+        :type limit: int
+        :return: list of (id, timestamp, sensors) tuples, oldest first
+        :rtype: list
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, timestamp, sensors FROM queue ORDER BY id LIMIT ?',
+                (limit, )
+            ).fetchall()
+        return [(r[0], r[1], json.loads(r[2])) for r in rows]
+
+    def remove(self, ids):
+        """
+        Remove the entries with the given IDs (as returned by
+        :py:meth:`~.peek`) from the queue.
+
+        :param ids: list of entry IDs
+        :type ids: list
+        """
+        with self._lock:
+            self._conn.executemany(
+                'DELETE FROM queue WHERE id = ?', [(i, ) for i in ids]
+            )
+            self._conn.commit()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,247 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def _escape(value):
+    """
+    Escape a label value for the OpenMetrics text format.
+
+    :param value: label value
+    :type value: str
+    :rtype: str
+    """
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**kwargs):
+    """
+    Format keyword arguments as an OpenMetrics label set, omitting any
+    whose value is None.
+
+    :rtype: str
+    """
+    parts = [
+        '%s="%s"' % (k, _escape(v)) for k, v in sorted(kwargs.items())
+        if v is not None
+    ]
+    if len(parts) < 1:
+        return ''
+    return '{%s}' % ','.join(parts)
+
+
+class MetricsExporter(object):
+    """
+    Embedded HTTP server that serves the latest sensor readings and daemon
+    health metrics in OpenMetrics text format. The daemon calls
+    :py:meth:`~.update` once per cycle; each scrape just returns the text
+    rendered by the most recent update, so scrapes never cause any sensor
+    I/O no matter how often they happen.
+    """
+
+    def __init__(self, port, addr=''):
+        """
+        Initialize the exporter. The server isn't started until
+        :py:meth:`~.start` is called.
+
+        :param port: TCP port to listen on
+        :type port: int
+        :param addr: address to listen on; defaults to all addresses
+        :type addr: str
+        """
+        self.port = port
+        self.addr = addr
+        self.server = None
+        self._thread = None
+        self.body = b'# EOF\n'
+
+    def start(self):
+        """
+        Start serving metrics in a daemon thread.
+        """
+        # imported here, as the HTTP server modules are slow to import and
+        # only needed when metrics are enabled
+        try:
+            from http.server import HTTPServer
+        except ImportError:  # python 2
+            from BaseHTTPServer import HTTPServer
+        self.server = HTTPServer((self.addr, self.port), self._make_handler())
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name='metrics-exporter'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info('Serving metrics on port %d', self.server.server_port)
+
+    def stop(self):
+        """
+        Stop the metrics server, if running.
+        """
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+
+    def _make_handler(self):
+        """
+        Return a request handler class bound to this exporter.
+
+        :rtype: type
+        """
+        try:
+            from http.server import BaseHTTPRequestHandler
+        except ImportError:  # python 2
+            from BaseHTTPServer import BaseHTTPRequestHandler
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ['/', '/metrics']:
+                    self.send_error(404)
+                    return
+                body = exporter.body
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                logger.debug('Metrics request from %s: ' + fmt,
+                             self.address_string(), *args)
+
+        return MetricsHandler
+
+    def update(self, readings, read_errors, class_read_errors, timings,
+               queue_depth, batch_depth):
+        """
+        Render a new metrics snapshot, to be served until the next update.
+
+        :param readings: latest sensor readings, in the format of the
+          ``sensors`` dict sent to the Engine
+        :type readings: dict
+        :param read_errors: count of failed reads (None values) per sensor ID
+        :type read_errors: dict
+        :param class_read_errors: count of exceptions raised by each sensor
+          class's ``read()`` method, by class name
+        :type class_read_errors: dict
+        :param timings: timing summaries, as returned by
+          :py:meth:`rpymostat_sensor.timing.TimingStats.summaries`
+        :type timings: dict
+        :param queue_depth: number of samples in the on-disk send buffer
+        :type queue_depth: int
+        :param batch_depth: number of samples in the in-memory upload batch
+        :type batch_depth: int
+        """
+        self.body = self.render(
+            readings, read_errors, class_read_errors, timings, queue_depth,
+            batch_depth
+        ).encode('utf-8')
+
+    def render(self, readings, read_errors, class_read_errors, timings,
+               queue_depth, batch_depth):
+        """
+        Return the OpenMetrics text for the given data. Parameters are the
+        same as for :py:meth:`~.update`.
+
+        :rtype: str
+        """
+        lines = [
+            '# TYPE rpymostat_sensor_temperature_celsius gauge',
+            '# UNIT rpymostat_sensor_temperature_celsius celsius',
+            '# HELP rpymostat_sensor_temperature_celsius Latest sensor '
+            'reading.'
+        ]
+        for s_id in sorted(readings.keys()):
+            data = readings[s_id]
+            if data.get('value', None) is None:
+                continue
+            lines.append('rpymostat_sensor_temperature_celsius%s %s' % (
+                _labels(sensor=s_id, type=data.get('type', None),
+                        alias=data.get('alias', None)),
+                repr(float(data['value']))
+            ))
+        lines.extend([
+            '# TYPE rpymostat_sensor_read_errors counter',
+            '# HELP rpymostat_sensor_read_errors Failed reads of each sensor.'
+        ])
+        for s_id in sorted(read_errors.keys()):
+            lines.append('rpymostat_sensor_read_errors_total%s %d' % (
+                _labels(sensor=s_id), read_errors[s_id]
+            ))
+        lines.extend([
+            '# TYPE rpymostat_sensor_class_read_errors counter',
+            '# HELP rpymostat_sensor_class_read_errors Exceptions raised '
+            'reading each sensor class.'
+        ])
+        for name in sorted(class_read_errors.keys()):
+            lines.append('rpymostat_sensor_class_read_errors_total%s %d' % (
+                _labels(sensor_class=name), class_read_errors[name]
+            ))
+        lines.extend([
+            '# TYPE rpymostat_sensor_duration_seconds gauge',
+            '# UNIT rpymostat_sensor_duration_seconds seconds',
+            '# HELP rpymostat_sensor_duration_seconds Recent durations of '
+            'daemon operations (cycle, sensor reads, HTTP requests).'
+        ])
+        for name in sorted(timings.keys()):
+            for key in ['p50', 'p95', 'max']:
+                lines.append('rpymostat_sensor_duration_seconds%s %s' % (
+                    _labels(operation=name, stat=key),
+                    repr(float(timings[name][key]))
+                ))
+        lines.extend([
+            '# TYPE rpymostat_sensor_queue_depth gauge',
+            '# HELP rpymostat_sensor_queue_depth Samples waiting in the '
+            'on-disk send buffer.',
+            'rpymostat_sensor_queue_depth %d' % queue_depth,
+            '# TYPE rpymostat_sensor_batch_depth gauge',
+            '# HELP rpymostat_sensor_batch_depth Samples waiting in the '
+            'upload batch.',
+            'rpymostat_sensor_batch_depth %d' % batch_depth,
+            '# EOF'
+        ])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,294 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+from importlib import import_module
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_path():
+    """
+    Return the default path of the entrypoint cache file, under
+    ``$XDG_CACHE_HOME`` (or ``~/.cache``).
+
+    :rtype: str
+    """
+    base = os.environ.get(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')
+    )
+    return os.path.join(base, 'rpymostat-sensor', 'entrypoints.json')
+
+
+def distributions_key(path=None):
+    """
+    Return a key identifying the installed distributions, built from the
+    names (which include the version) of the ``.dist-info`` and
+    ``.egg-info`` metadata in each directory on ``path`` and the mtime of
+    their ``entry_points.txt``. Installing, upgrading or removing a package,
+    or regenerating the metadata of a development install, changes the key.
+    This only lists directories, so it is much cheaper than scanning
+    entrypoints.
+
+    :param path: list of directories to check; defaults to ``sys.path``
+    :type path: list
+    :return: hex digest
+    :rtype: str
+    """
+    if path is None:
+        path = sys.path
+    h = hashlib.sha1()
+    for entry in path:
+        try:
+            names = sorted(os.listdir(entry or '.'))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith(('.dist-info', '.egg-info')):
+                continue
+            meta = os.path.join(entry, name)
+            try:
+                mtime = os.stat(os.path.join(meta, 'entry_points.txt')).st_mtime
+            except OSError:
+                mtime = None
+            h.update(('%s %s %s\n' % (entry, name, mtime)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def scan_entry_points(group):
+    """
+    Scan installed distributions for the entrypoints in ``group``, without
+    importing them.
+
+    :param group: entrypoint group name
+    :type group: str
+    :return: list of [name, 'module:attr'] pairs, sorted by name
+    :rtype: list
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # python < 3.8
+        from pkg_resources import iter_entry_points
+        found = [
+            [ep.name, '%s:%s' % (ep.module_name, '.'.join(ep.attrs))]
+            for ep in iter_entry_points(group)
+        ]
+    else:
+        eps = entry_points()
+        if hasattr(eps, 'select'):
+            eps = eps.select(group=group)
+        else:  # python < 3.10
+            eps = eps.get(group, [])
+        found = [[ep.name, ep.value] for ep in eps]
+    # a distribution may be found more than once on sys.path
+    res = []
+    for ep in sorted(found):
+        if ep not in res:
+            res.append(ep)
+    return res
+
+
+class EntryPointCache(object):
+    """
+    Cache of the entrypoints in one group, stored as JSON and keyed on
+    :py:func:`~.distributions_key`, so that the (slow) entrypoint scan only
+    happens when the installed distributions change.
+    """
+
+    def __init__(self, group, path=None):
+        """
+        :param group: entrypoint group name
+        :type group: str
+        :param path: path to the cache file; defaults to
+          :py:func:`~.default_cache_path`
+        :type path: str
+        """
+        self.group = group
+        if path is None:
+            path = default_cache_path()
+        self.path = path
+
+    def entry_points(self):
+        """
+        Return the entrypoints in the group, from the cache if it is current
+        or else from :py:func:`~.scan_entry_points`, updating the cache.
+
+        :return: list of [name, 'module:attr'] pairs
+        :rtype: list
+        """
+        key = distributions_key()
+        cache = self._read()
+        entry = cache.get(self.group)
+        if entry is not None and entry.get('key') == key:
+            logger.debug('Using cached entrypoints for %s from %s',
+                         self.group, self.path)
+            return entry['entry_points']
+        logger.debug('Scanning distributions for %s entrypoints', self.group)
+        eps = scan_entry_points(self.group)
+        cache[self.group] = {'key': key, 'entry_points': eps}
+        self._write(cache)
+        return eps
+
+    def _read(self):
+        """
+        Read the cache file.
+
+        :return: cache contents, or an empty dict if it can't be read
+        :rtype: dict
+        """
+        try:
+            with open(self.path) as fh:
+                cache = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def _write(self, cache):
+        """
+        Write the cache file, via a temporary file that is renamed over it.
+        Errors are logged and otherwise ignored; the cache is only an
+        optimization.
+
+        :param cache: cache contents
+        :type cache: dict
+        """
+        tmp = '%s.%d' % (self.path, os.getpid())
+        try:
+            d = os.path.dirname(self.path)
+            if d and not os.path.isdir(d):
+                os.makedirs(d)
+            with open(tmp, 'w') as fh:
+                json.dump(cache, fh)
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            logger.debug('Unable to write entrypoint cache to %s',
+                         self.path, exc_info=1)
+
+
+class LazyClass(object):
+    """
+    Stand-in for a class named by an entrypoint, which only imports it when
+    it is first called (instantiated) or :py:meth:`~.load` is called.
+    ``__name__`` is available without importing.
+    """
+
+    def __init__(self, name, value, superclass=None):
+        """
+        :param name: entrypoint name
+        :type name: str
+        :param value: entrypoint value, ``module:attr``
+        :type value: str
+        :param superclass: if set, the loaded class must be a subclass of
+          this
+        :type superclass: class
+        """
+        self.name = name
+        self.module_name, _, self.attr = value.partition(':')
+        self.__name__ = self.attr.split('.')[-1]
+        self.superclass = superclass
+        self._class = None
+
+    def load(self):
+        """
+        Import and return the class.
+
+        :raises: ImportError, AttributeError, or TypeError if it is not a
+          subclass of ``superclass``
+        :rtype: class
+        """
+        if self._class is None:
+            obj = import_module(self.module_name)
+            for part in self.attr.split('.'):
+                obj = getattr(obj, part)
+            if self.superclass is not None and not (
+                isinstance(obj, type) and issubclass(obj, self.superclass)
+            ):
+                raise TypeError('%s:%s is not a subclass of %s' % (
+                    self.module_name, self.attr, self.superclass.__name__))
+            self._class = obj
+        return self._class
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        return '<LazyClass %s = %s:%s>' % (
+            self.name, self.module_name, self.attr)
+
+
+def lazy_classes(group, superclass=None, cache_path=None):
+    """
+    Return a :py:class:`~.LazyClass` for each entrypoint in ``group``, using
+    :py:class:`~.EntryPointCache`. Nothing is imported.
+
+    :param group: entrypoint group name
+    :type group: str
+    :param superclass: if set, classes must be a subclass of this
+    :type superclass: class
+    :param cache_path: path to the cache file
+    :type cache_path: str
+    :rtype: list
+    """
+    return [
+        LazyClass(name, value, superclass=superclass)
+        for name, value in EntryPointCache(group, cache_path).entry_points()
+    ]
+
+
+def import_classes(classes):
+    """
+    Import the classes behind a list of :py:class:`~.LazyClass`, skipping
+    (and logging) any that can't be loaded.
+
+    :param classes: list of :py:class:`~.LazyClass`
+    :type classes: list
+    :return: list of classes
+    :rtype: list
+    """
+    res = []
+    for c in classes:
+        try:
+            res.append(c.load())
+        except Exception:
+            logger.debug('Unable to load %r', c, exc_info=1)
+    return res
@@ -40,6 +40,8 @@ import logging
 import argparse
 
 from rpymostat_sensor.sensor_daemon import SensorDaemon
+from rpymostat_sensor.timing import profile_imports
+from rpymostat_sensor.utils import monotonic_time
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger()
@@ -116,7 +118,113 @@ class Runner(object):
                        action=StoreKeySubKeyValue, help='Provide an argument '
                        'for a specific sensor class, in the form '
                        'ClassName=arg_name=value; see -l for list of classes '
-                       'and their arguments')
+                       'and their arguments. ClassName=interval=N sets a '
+                       'polling interval for just that class; '
+                       'ClassName=cache_ttl=N and ClassName=cache_max_age=N '
+                       'cache its readings.')
+        p.add_argument('--connect-timeout', dest='connect_timeout',
+                       default=10.0, type=float, help='Float number of '
+                       'seconds to wait when connecting to the Engine API')
+        p.add_argument('--read-timeout', dest='read_timeout', default=30.0,
+                       type=float, help='Float number of seconds to wait for '
+                       'the Engine API to respond')
+        p.add_argument('--http-pool-size', dest='http_pool_size', default=2,
+                       type=int, help='Maximum number of keep-alive '
+                       'connections to the Engine API')
+        p.add_argument('--asyncio', dest='use_asyncio', action='store_true',
+                       default=False, help='Use the asyncio run loop, which '
+                       'overlaps sensor reads with PUTs to the Engine '
+                       '(Python 3.4+ only)')
+        p.add_argument('--fixed-rate', dest='fixed_rate', action='store_true',
+                       default=False, help='Start poll/PUT cycles at a fixed '
+                       'rate of once per interval, aligned to the wall clock, '
+                       'instead of sleeping for interval between cycles')
+        p.add_argument('--overrun', dest='overrun', default='skip',
+                       choices=['skip', 'coalesce'], help='With --fixed-rate, '
+                       'how to handle cycles missed because a cycle took '
+                       'longer than interval; skip them (default) or run one '
+                       'cycle immediately in their place')
+        p.add_argument('--buffer-path', dest='buffer_path', default=None,
+                       type=str, help='Path to a local SQLite database to '
+                       'buffer sensor data in when it cannot be sent to the '
+                       'Engine; buffered data is sent once the Engine is '
+                       'reachable again')
+        p.add_argument('--buffer-max-entries', dest='buffer_max_entries',
+                       default=10000, type=int, help='Maximum number of '
+                       'entries to keep in the buffer; oldest are dropped '
+                       'first')
+        p.add_argument('--buffer-max-bytes', dest='buffer_max_bytes',
+                       default=None, type=int, help='Maximum size in bytes '
+                       'of sensor data to keep in the buffer; oldest are '
+                       'dropped first')
+        p.add_argument('--backfill-batch-size', dest='backfill_batch_size',
+                       default=100, type=int, help='Maximum number of '
+                       'buffered entries to send to the Engine per request')
+        p.add_argument('--batch-size', dest='batch_size', default=None,
+                       type=int, help='Batching mode; send readings to the '
+                       'Engine in one request per this many samples')
+        p.add_argument('--batch-age', dest='batch_age', default=None,
+                       type=float, help='Batching mode; send readings to the '
+                       'Engine in one request once the oldest unsent sample '
+                       'is this many seconds old')
+        p.add_argument('--compress', dest='compression', default=None,
+                       choices=['gzip', 'deflate'], help='Compress request '
+                       'bodies sent to the Engine with this Content-Encoding')
+        p.add_argument('--compress-min-bytes', dest='compress_min_bytes',
+                       default=1024, type=int, help='With --compress, only '
+                       'compress request bodies at least this many bytes '
+                       'long')
+        p.add_argument('--delta', dest='delta', action='store_true',
+                       default=False, help='Only send full sensor '
+                       'information when it changes (or every --heartbeat '
+                       'seconds); otherwise send only sensor values')
+        p.add_argument('--deadband', dest='deadband', default=None,
+                       type=float, help='With --delta, do not send sensor '
+                       'values that changed by less than this amount since '
+                       'they were last sent')
+        p.add_argument('--heartbeat', dest='heartbeat', default=300.0,
+                       type=float, help='With --delta, send full information '
+                       'for every sensor at least this often (seconds)')
+        p.add_argument('--timing-interval', dest='timing_interval',
+                       default=None, type=float, help='Log a summary of '
+                       'sensor read, serialization and HTTP request timings '
+                       'every this many seconds')
+        p.add_argument('--metrics-port', dest='metrics_port', default=None,
+                       type=int, help='Serve the latest readings and daemon '
+                       'health metrics in OpenMetrics format on this port')
+        p.add_argument('--adaptive', dest='adaptive', action='store_true',
+                       default=False, help='Poll faster while readings are '
+                       'changing quickly and slower while they are stable, '
+                       'between --min-interval and --max-interval')
+        p.add_argument('--min-interval', dest='min_interval', default=None,
+                       type=float, help='With --adaptive, shortest polling '
+                       'interval in seconds (default: --interval)')
+        p.add_argument('--max-interval', dest='max_interval', default=None,
+                       type=float, help='With --adaptive, longest polling '
+                       'interval in seconds (default: 10x --min-interval)')
+        p.add_argument('--adaptive-rate', dest='adaptive_rate', default=0.1,
+                       type=float, help='With --adaptive, poll at '
+                       '--min-interval while any sensor is changing faster '
+                       'than this many degrees per minute')
+        p.add_argument('--parallel-reads', dest='parallel_reads',
+                       action='store_true', default=False, help='Read all '
+                       'sensor classes concurrently instead of one after '
+                       'another')
+        p.add_argument('--class-timeout', dest='class_timeout', default=None,
+                       type=float, help='With --parallel-reads, wait at most '
+                       'this many seconds for each sensor class; sensors of '
+                       'classes that miss the deadline are sent with no '
+                       'value')
+        p.add_argument('--rediscover-interval', dest='rediscover_interval',
+                       default=None, type=float, help='Look for sensors that '
+                       'were added or removed every this many seconds, '
+                       'without restarting; also keep running if no sensors '
+                       'are found at startup')
+        p.add_argument('--startup-profile', dest='startup_profile',
+                       default=False, action='store_true',
+                       help='start up (including Engine and sensor '
+                       'discovery), print a report of where the time went, '
+                       'then exit')
         args = p.parse_args(argv)
         return args
 
@@ -138,16 +246,82 @@ class Runner(object):
         if args.list_classes is True:
             d = SensorDaemon(list_classes=True)
             raise SystemExit()
-        d = SensorDaemon(
+        klass = SensorDaemon
+        if args.use_asyncio:
+            # asyncio is slow to import; only do so when it's used
+            from rpymostat_sensor.async_daemon import AsyncSensorDaemon
+            klass = AsyncSensorDaemon
+        start = monotonic_time()
+        d = klass(
             dry_run=args.dry_run,
             dummy_data=args.dummy,
             engine_port=args.engine_port,
             engine_addr=args.engine_addr,
             interval=args.interval,
-            class_args=args.class_args
+            class_args=args.class_args,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            http_pool_size=args.http_pool_size,
+            fixed_rate=args.fixed_rate,
+            overrun=args.overrun,
+            buffer_path=args.buffer_path,
+            buffer_max_entries=args.buffer_max_entries,
+            buffer_max_bytes=args.buffer_max_bytes,
+            backfill_batch_size=args.backfill_batch_size,
+            batch_size=args.batch_size,
+            batch_age=args.batch_age,
+            compression=args.compression,
+            compress_min_bytes=args.compress_min_bytes,
+            delta=args.delta,
+            deadband=args.deadband,
+            heartbeat=args.heartbeat,
+            timing_interval=args.timing_interval,
+            metrics_port=args.metrics_port,
+            adaptive=args.adaptive,
+            min_interval=args.min_interval,
+            max_interval=args.max_interval,
+            adaptive_rate=args.adaptive_rate,
+            parallel_reads=args.parallel_reads,
+            class_timeout=args.class_timeout,
+            rediscover_interval=args.rediscover_interval
         )
+        if args.startup_profile:
+            self.report_startup(d, monotonic_time() - start)
+            raise SystemExit()
         d.run()
 
+    def report_startup(self, daemon, init_time, limit=15):
+        """
+        Print a report of where startup time went: the daemon's startup phases
+        (from ``daemon.startup_times``) and the slowest module imports, as
+        measured by :py:func:`~rpymostat_sensor.timing.profile_imports`. The
+        sensor class modules are imported lazily, so they are profiled along
+        with this module.
+
+        :param daemon: the initialized daemon
+        :type daemon: :py:class:`~.SensorDaemon`
+        :param init_time: time taken to initialize the daemon, in seconds
+        :type init_time: float
+        :param limit: number of slowest imports to show
+        :type limit: int
+        """
+        print("Daemon init: %.3fs" % init_time)
+        for name in sorted(daemon.startup_times.keys()):
+            print("  %s: %.3fs" % (name, daemon.startup_times[name]))
+        modules = ['rpymostat_sensor.runner']
+        for klass in daemon._get_sensor_classes():
+            if klass.module_name not in modules:
+                modules.append(klass.module_name)
+        res = profile_imports(modules, limit=limit)
+        if res is None:
+            print("\nImport profiling requires Python 3.7 or newer.")
+            return
+        total, slowest = res
+        print("\nImports of %s: %.3fs; slowest modules (self, "
+              "cumulative):" % (', '.join(modules), total))
+        for name, self_time, cumulative in slowest:
+            print("  %.3fs %.3fs %s" % (self_time, cumulative, name))
+
 
 def console_entry_point():
     """
@@ -0,0 +1,217 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import time
+from time import sleep
+
+from rpymostat_sensor.utils import monotonic_time
+
+logger = logging.getLogger(__name__)
+
+
+class FixedRateScheduler(object):
+    """
+    Fixed-rate scheduler for the daemon loop. Unlike sleeping for
+    ``interval`` after each cycle, ticks are spaced exactly ``interval``
+    seconds apart on the monotonic clock regardless of how long each cycle
+    takes, and (optionally) aligned to wall-clock multiples of ``interval``.
+
+    If a cycle runs past the next tick, the overrun is logged and counted,
+    and the missed ticks are handled according to ``overrun``:
+
+    - ``skip`` - wait for the next tick that is still in the future.
+    - ``coalesce`` - run one cycle immediately in place of all the missed
+      ticks, then resume on the original schedule.
+    """
+
+    OVERRUN_POLICIES = ['skip', 'coalesce']
+
+    def __init__(self, interval, align=True, overrun='skip'):
+        """
+        Initialize the scheduler.
+
+        :param interval: number of seconds between ticks
+        :type interval: float
+        :param align: whether to align ticks to wall-clock multiples of
+          ``interval`` (i.e. an interval of 60 ticks at the top of each
+          minute)
+        :type align: bool
+        :param overrun: how to handle missed ticks; ``skip`` or ``coalesce``
+        :type overrun: str
+        """
+        if overrun not in self.OVERRUN_POLICIES:
+            raise RuntimeError('overrun must be one of: %s' %
+                               self.OVERRUN_POLICIES)
+        self.interval = interval
+        self.align = align
+        self.overrun = overrun
+        self.overruns = 0
+        self.missed_ticks = 0
+        self._next = None
+
+    def _first_deadline(self, now):
+        """
+        Return the monotonic time of the first tick.
+
+        :param now: current monotonic time
+        :type now: float
+        :return: monotonic time of the first tick
+        :rtype: float
+        """
+        if not self.align:
+            return now
+        offset = self.interval - (time.time() % self.interval)
+        if offset >= self.interval:
+            offset = 0.0
+        return now + offset
+
+    def next_deadline(self):
+        """
+        Advance the schedule and return the monotonic time (as returned by
+        :py:func:`~rpymostat_sensor.utils.monotonic_time`) of the next tick.
+
+        :return: monotonic time of the next tick
+        :rtype: float
+        """
+        now = monotonic_time()
+        if self._next is None:
+            self._next = self._first_deadline(now)
+            return self._next
+        self._next += self.interval
+        if now <= self._next:
+            return self._next
+        missed = int((now - self._next) // self.interval) + 1
+        self.overruns += 1
+        self.missed_ticks += missed
+        logger.warning('Cycle overran interval of %ss by %.3fs; %s %d '
+                       'missed tick(s)', self.interval, now - self._next,
+                       'skipping' if self.overrun == 'skip' else
+                       'coalescing', missed)
+        if self.overrun == 'skip':
+            self._next += missed * self.interval
+        else:
+            self._next += (missed - 1) * self.interval
+        return self._next
+
+    def wait(self):
+        """
+        Sleep until the next tick.
+        """
+        deadline = self.next_deadline()
+        delay = deadline - monotonic_time()
+        if delay > 0:
+            logger.debug('Sleeping %ss until next tick', delay)
+            sleep(delay)
+
+
+class AdaptiveInterval(object):
+    """
+    Adaptive polling interval. After each cycle's readings are passed to
+    :py:meth:`~.update`, the fastest rate of change of any sensor since the
+    previous cycle is compared to ``rate`` (degrees per minute):
+
+    - faster than ``rate`` - drop straight to ``min_interval``, so the
+      Engine sees transitions (i.e. the HVAC starting or stopping) quickly.
+    - slower than half of ``rate`` - lengthen the interval by ``factor``,
+      up to ``max_interval``.
+    - otherwise, keep the current interval.
+    """
+
+    def __init__(self, min_interval, max_interval, rate, factor=2.0):
+        """
+        Initialize the adaptive interval; it starts at ``min_interval``.
+
+        :param min_interval: shortest interval, in seconds
+        :type min_interval: float
+        :param max_interval: longest interval, in seconds
+        :type max_interval: float
+        :param rate: rate of change (degrees per minute) above which to poll
+          at ``min_interval``
+        :type rate: float
+        :param factor: factor to lengthen the interval by when readings are
+          stable
+        :type factor: float
+        """
+        if min_interval <= 0 or max_interval < min_interval:
+            raise RuntimeError('adaptive intervals must satisfy '
+                               '0 < min_interval <= max_interval')
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate = rate
+        self.factor = factor
+        self.interval = min_interval
+        self._last_time = None
+        self._last_values = {}
+
+    def update(self, readings):
+        """
+        Update the interval from a cycle's readings, and return it.
+
+        :param readings: sensor data, in the format of the ``sensors`` dict
+          sent to the Engine
+        :type readings: dict
+        :return: the new interval, in seconds
+        :rtype: float
+        """
+        now = monotonic_time()
+        values = dict(
+            (s_id, d['value']) for s_id, d in readings.items()
+            if d.get('value', None) is not None
+        )
+        last_time = self._last_time
+        last_values = self._last_values
+        self._last_time = now
+        self._last_values = values
+        if last_time is None or now <= last_time:
+            return self.interval
+        minutes = (now - last_time) / 60.0
+        rates = [
+            abs(v - last_values[s_id]) / minutes
+            for s_id, v in values.items() if s_id in last_values
+        ]
+        max_rate = max(rates) if len(rates) > 0 else 0.0
+        old = self.interval
+        if max_rate > self.rate:
+            self.interval = self.min_interval
+        elif max_rate < self.rate / 2.0:
+            self.interval = min(self.max_interval, old * self.factor)
+        if self.interval != old:
+            logger.info('Max rate of change %.3f/min; polling interval '
+                        'changed from %ss to %ss', max_rate, old,
+                        self.interval)
+        return self.interval
@@ -36,14 +36,24 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
+import json
+import zlib
+import threading
+import time
 from time import sleep
 import requests
+from requests.adapters import HTTPAdapter
 
 from rpymostat_sensor.sensors.dummy import DummySensor
 from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.scheduler import FixedRateScheduler, AdaptiveInterval
+from rpymostat_sensor.buffer import SendBuffer
+from rpymostat_sensor.timing import TimingStats
+from rpymostat_sensor.metrics import MetricsExporter
+from rpymostat_sensor.utils import monotonic_time
+from rpymostat_sensor.plugins import lazy_classes, import_classes
 from rpymostat_common.unique_ids import SystemID
 from rpymostat_common.discovery import discover_engine as utils_discover_engine
-from rpymostat_common.loader import load_classes
 from rpymostat_common.loader import list_classes as _list_classes
 
 
@@ -52,9 +62,21 @@ logger = logging.getLogger(__name__)
 
 class SensorDaemon(object):
 
+    # supported request body Content-Encodings
+    COMPRESSION_TYPES = [None, 'gzip', 'deflate']
+
     def __init__(self, dry_run=False, dummy_data=False, engine_port=8088,
                  engine_addr=None, interval=60.0, list_classes=False,
-                 class_args={}):
+                 class_args={}, connect_timeout=10.0, read_timeout=30.0,
+                 http_pool_size=2, fixed_rate=False, overrun='skip',
+                 buffer_path=None, buffer_max_entries=10000,
+                 buffer_max_bytes=None, backfill_batch_size=100,
+                 batch_size=None, batch_age=None, compression=None,
+                 compress_min_bytes=1024, delta=False, deadband=None,
+                 heartbeat=300.0, timing_interval=None, metrics_port=None,
+                 adaptive=False, min_interval=None, max_interval=None,
+                 adaptive_rate=0.1, parallel_reads=False,
+                 class_timeout=None, rediscover_interval=None):
         """
         Initialize the Sensor Daemon, to read temperatures and send them
         to the Engine API.
@@ -75,68 +97,927 @@ class SensorDaemon(object):
           args, then raise SystemExit()
         :type list_classes: bool
         :param class_args: dict of optional arguments to pass to sensor classes
-          init method; of the form {'ClassName': {'arg_name': 'value'}}
+          init method; of the form {'ClassName': {'arg_name': 'value'}}. The
+          special ``interval`` argument is not passed to the class; it sets a
+          polling interval for that class that overrides ``interval``.
         :type class_args: dict
+        :param connect_timeout: timeout in seconds for establishing a
+          connection to the Engine API
+        :type connect_timeout: float
+        :param read_timeout: timeout in seconds for the Engine API to respond
+          once connected
+        :type read_timeout: float
+        :param http_pool_size: maximum number of keep-alive connections to
+          the Engine API to keep in the HTTP connection pool
+        :type http_pool_size: int
+        :param fixed_rate: If True, start each poll/PUT cycle exactly
+          ``interval`` seconds after the start of the previous one, aligned to
+          wall-clock multiples of ``interval``, instead of sleeping for
+          ``interval`` after each cycle completes.
+        :type fixed_rate: bool
+        :param overrun: when ``fixed_rate`` is True, how to handle ticks
+          missed because a cycle took longer than ``interval``; ``skip`` or
+          ``coalesce``. See :py:class:`~.FixedRateScheduler`.
+        :type overrun: str
+        :param buffer_path: If set, path to a :py:class:`~.SendBuffer`
+          database to store sensor data that could not be sent to the Engine
+          in; buffered data is sent in batches once the Engine is reachable
+          again.
+        :type buffer_path: str
+        :param buffer_max_entries: maximum number of entries to keep in the
+          send buffer; the oldest are evicted first.
+        :type buffer_max_entries: int
+        :param buffer_max_bytes: maximum total size of sensor data to keep in
+          the send buffer; the oldest entries are evicted first.
+        :type buffer_max_bytes: int
+        :param backfill_batch_size: maximum number of buffered entries to send
+          to the Engine in each batch request
+        :type backfill_batch_size: int
+        :param batch_size: If set, enable batching mode; accumulate sensor
+          data and send it to the Engine in a single batch request once this
+          many samples have been read.
+        :type batch_size: int
+        :param batch_age: If set, enable batching mode; accumulate sensor data
+          and send it to the Engine in a single batch request once the oldest
+          pending sample is this many seconds old.
+        :type batch_age: float
+        :param compression: If set, compress request bodies sent to the Engine
+          with this Content-Encoding; ``gzip`` or ``deflate``. If the Engine
+          responds with HTTP 415 (Unsupported Media Type) to a compressed
+          request, compression is disabled and the request is retried
+          uncompressed.
+        :type compression: str
+        :param compress_min_bytes: only compress request bodies at least this
+          many bytes long; smaller bodies are sent uncompressed.
+        :type compress_min_bytes: int
+        :param delta: If True, only send full sensor information (type, alias,
+          etc.) the first time a sensor is seen, when it changes, or at least
+          every ``heartbeat`` seconds; otherwise only send each sensor's
+          value. Does not apply to batched or buffered data.
+        :type delta: bool
+        :param deadband: In delta mode, don't send a sensor's value if it
+          differs from the last value sent by less than this amount, unless
+          ``heartbeat`` seconds have passed since full information for the
+          sensor was last sent.
+        :type deadband: float
+        :param heartbeat: In delta mode, the maximum number of seconds between
+          sending full information for each sensor.
+        :type heartbeat: float
+        :param timing_interval: if set, log a summary of how long sensor
+          reads, serialization and HTTP requests have been taking every this
+          many seconds.
+        :type timing_interval: float
+        :param metrics_port: if set, serve the latest readings and daemon
+          health metrics in OpenMetrics format on this TCP port.
+        :type metrics_port: int
+        :param adaptive: If True, vary the polling interval between
+          ``min_interval`` and ``max_interval`` based on how fast readings
+          are changing. See :py:class:`~.AdaptiveInterval`.
+        :type adaptive: bool
+        :param min_interval: in adaptive mode, the shortest polling interval;
+          defaults to ``interval``
+        :type min_interval: float
+        :param max_interval: in adaptive mode, the longest polling interval;
+          defaults to 10 times ``min_interval``
+        :type max_interval: float
+        :param adaptive_rate: in adaptive mode, the rate of change (degrees
+          per minute) of any sensor above which to poll at ``min_interval``
+        :type adaptive_rate: float
+        :param parallel_reads: If True, read all sensor classes concurrently,
+          each in its own thread, instead of one after another.
+        :type parallel_reads: bool
+        :param class_timeout: with ``parallel_reads``, wait at most this many
+          seconds for each sensor class to return its readings. Sensors of a
+          class that misses the deadline are sent with the readings the class
+          yielded before it, or a value of None, and the class is not read
+          again until its previous read finishes.
+        :type class_timeout: float
+        :param rediscover_interval: If set, look for sensor classes that have
+          gained or lost sensors every this many seconds, adding and
+          removing them without restarting the daemon. New classes are probed
+          in a background thread; active ones are re-checked between reads.
+          The daemon also keeps running (instead of exiting) if no sensors
+          are found at startup.
+        :type rediscover_interval: float
         """
         if list_classes:
             print("Sensor Classes:\n")
-            _list_classes(SensorDaemon._sensor_classes())
+            _list_classes(import_classes(SensorDaemon._sensor_classes()))
             raise SystemExit()
+        # startup phase name to duration in seconds
+        self.startup_times = {}
         self.dry_run = dry_run
         self.dummy_data = dummy_data
         self.engine_port = engine_port
         self.engine_addr = engine_addr
         self.interval = interval
+        self.class_intervals = {}
+        self.adaptive = None
+        self.scheduler = None
+        # sensor class instances to read with cached_read()
+        self._cached_sensors = set()
+        # sensor class instance to the monotonic time its next poll is due,
+        # for classes polled on per-class intervals
+        self._class_due = {}
+        self._latest = {}
         self.host_id = self.find_host_id()
         logger.warning("This machine running with host_id %s", self.host_id)
         if self.dry_run:
             logger.warning("DRY RUN MODE - will not PUT data to Engine.")
         if self.engine_addr is None:
+            start = monotonic_time()
             self.engine_addr, self.engine_port = self.discover_engine()
+            self.startup_times['discover_engine'] = monotonic_time() - start
+        self.engine_url = 'http://%s:%s/v1/sensors/update' % (
+            self.engine_addr, self.engine_port
+        )
+        self.engine_batch_url = 'http://%s:%s/v1/sensors/update_batch' % (
+            self.engine_addr, self.engine_port
+        )
+        self.timeout = (connect_timeout, read_timeout)
+        self.http_pool_size = http_pool_size
+        self.session = self._make_session(http_pool_size)
+        self.buffer = None
+        if buffer_path is not None:
+            self.buffer = SendBuffer(
+                buffer_path, max_entries=buffer_max_entries,
+                max_bytes=buffer_max_bytes
+            )
+        self.backfill_batch_size = backfill_batch_size
+        self._drain_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.batch_age = batch_age
+        self._batch = []
+        self._batch_started = None
+        self._batch_lock = threading.Lock()
+        if compression not in self.COMPRESSION_TYPES:
+            raise RuntimeError('compression must be one of: %s' %
+                               self.COMPRESSION_TYPES)
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.delta = delta
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        # sensor ID to (info, value, last sent time, last full send time)
+        self._delta_state = {}
+        self.timings = TimingStats()
+        self.timing_interval = timing_interval
+        self._timings_logged = monotonic_time()
+        # sensor ID to count of reads that returned no value
+        self.read_errors = {}
+        # sensor class name to count of exceptions raised by read()
+        self.class_read_errors = {}
+        if class_timeout is not None and not parallel_reads:
+            raise RuntimeError('class_timeout can only be used with '
+                               'parallel_reads')
+        self.parallel_reads = parallel_reads
+        self.class_timeout = class_timeout
+        # sensor class instance to the thread of a read that missed its
+        # deadline and has not finished yet
+        self._busy = {}
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsExporter(metrics_port)
+        self.class_args = class_args
+        self.rediscover_interval = rediscover_interval
+        # sensor class (from the entrypoints) to its active instance
+        self._instances = {}
+        self._classes = None
+        self._rediscover_thread = None
+        self._rediscover_stop = threading.Event()
+        # guards the two attributes below, and ``self._instances``
+        self._rediscover_lock = threading.Lock()
+        # (sensor class, instance) tuples found by the rediscovery thread,
+        # to be added by the polling thread
+        self._discovered = []
+        # whether the polling thread should re-check active instances
+        self._recheck_due = False
+        start = monotonic_time()
         self.sensors = self.discover_sensors(class_args)
+        self.startup_times['discover_sensors'] = monotonic_time() - start
         if len(self.sensors) < 1:
-            logger.critical("ERROR - no sensors discovered.")
-            raise SystemExit(1)
+            if rediscover_interval is None:
+                logger.critical("ERROR - no sensors discovered.")
+                raise SystemExit(1)
+            logger.warning('No sensors discovered; looking for them again '
+                           'every %ss', rediscover_interval)
+        self.loop_interval = None
+        self._update_loop_interval()
+        if fixed_rate:
+            self.scheduler = FixedRateScheduler(
+                self.loop_interval, overrun=overrun
+            )
+        if adaptive:
+            if fixed_rate:
+                raise RuntimeError('adaptive and fixed_rate polling cannot '
+                                   'be used together')
+            if len(self.class_intervals) > 0:
+                logger.warning('Per-class intervals are ignored in adaptive '
+                               'mode; all sensor classes will be polled '
+                               'every cycle.')
+                self.class_intervals = {}
+            if min_interval is None:
+                min_interval = interval
+            if max_interval is None:
+                max_interval = min_interval * 10
+            self.loop_interval = min_interval
+            self.adaptive = AdaptiveInterval(
+                min_interval, max_interval, adaptive_rate
+            )
+
+    def _update_loop_interval(self):
+        """
+        Set ``self.loop_interval`` so that the loop runs often enough to poll
+        every sensor class in ``self.sensors`` on time. If it changed and the
+        fixed-rate scheduler is enabled, replace the scheduler with one for
+        the new interval.
+        """
+        intervals = [
+            self.class_intervals.get(s, self.interval) for s in self.sensors
+        ] or [self.interval]
+        loop_interval = self._common_interval(intervals)
+        if loop_interval == self.loop_interval:
+            return
+        self.loop_interval = loop_interval
+        if loop_interval < min(intervals):
+            logger.warning('Sensor class intervals are not multiples of each '
+                           'other; running the daemon loop every %ss',
+                           loop_interval)
+        old = self.scheduler
+        if old is not None:
+            self.scheduler = FixedRateScheduler(
+                loop_interval, align=old.align, overrun=old.overrun
+            )
+            self.scheduler.overruns = old.overruns
+            self.scheduler.missed_ticks = old.missed_ticks
 
     def run(self):
         """
         Run the Sensor Daemon loop.
         """
         logger.info("Running sensor daemon loop...")
-        # loop over reading the sensors, with a sleep interval in-between
-        while True:
-            self.read_and_send()
-            logger.debug("Sleeping %ss", self.interval)
-            sleep(self.interval)
+        if self.metrics is not None:
+            self.metrics.start()
+        self.start_rediscovery()
+        try:
+            if self.scheduler is not None:
+                # fixed-rate loop; the scheduler sleeps until the next tick
+                while True:
+                    self.scheduler.wait()
+                    self.read_and_send()
+            # loop over reading the sensors, with a sleep interval in-between
+            while True:
+                self.read_and_send()
+                interval = self.next_interval()
+                logger.debug("Sleeping %ss", interval)
+                sleep(interval)
+        finally:
+            self.stop_rediscovery()
+            self.flush_batch()
+            if self.metrics is not None:
+                self.metrics.stop()
+
+    def _make_session(self, pool_size):
+        """
+        Create the :py:class:`requests.Session` used for all requests to the
+        Engine API. The session keeps connections to the Engine alive and
+        re-uses them, instead of opening a new connection every interval.
+
+        :param pool_size: maximum number of connections to keep in the pool
+        :type pool_size: int
+        :return: HTTP session
+        :rtype: :py:class:`requests.Session`
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
     def read_and_send(self):
         """
         Read data from all sensors and send it to the Engine API.
         """
+        timestamp = time.time()
+        with self.timings.timer('cycle'):
+            data = self.read_sensors()
+            if data is None:
+                return
+            self.send_data(data, timestamp=timestamp)
+        if self.adaptive is not None:
+            self.adaptive.update(data['sensors'])
+        self.log_timings()
+        self.update_metrics()
+
+    def next_interval(self):
+        """
+        Return the number of seconds to sleep before the next poll/PUT cycle;
+        the current adaptive interval in adaptive mode, otherwise
+        ``self.loop_interval``.
+
+        :return: seconds until the next cycle
+        :rtype: float
+        """
+        if self.adaptive is not None:
+            return self.adaptive.interval
+        return self.loop_interval
+
+    def update_metrics(self):
+        """
+        If the metrics exporter is enabled, update it with a snapshot of the
+        latest readings and daemon health information.
+        """
+        if self.metrics is None:
+            return
+        readings = {}
+        for sensor_data in list(self._latest.values()):
+            readings.update(sensor_data)
+        queue_depth = 0
+        if self.buffer is not None:
+            queue_depth = len(self.buffer)
+        self.metrics.update(
+            readings, dict(self.read_errors), dict(self.class_read_errors),
+            self.timings.summaries(), queue_depth, len(self._batch)
+        )
+
+    def log_timings(self):
+        """
+        If ``self.timing_interval`` is set and at least that many seconds
+        have passed since the last time, log a summary of collected timing
+        information.
+        """
+        if self.timing_interval is None:
+            return
+        now = monotonic_time()
+        if now - self._timings_logged < self.timing_interval:
+            return
+        self._timings_logged = now
+        for name, s in sorted(self.timings.summaries().items()):
+            logger.info('Timing for %s over last %d: p50=%.4fs p95=%.4fs '
+                        'max=%.4fs', name, s['count'], s['p50'], s['p95'],
+                        s['max'])
+
+    def read_sensors(self):
+        """
+        Read data from all sensors and return it in the format expected by
+        the Engine API.
+
+        If per-class intervals are in use and no sensor class is due for
+        polling, return None instead; there is nothing new to send.
+
+        :return: sensor update data for the Engine API, or None
+        :rtype: dict
+        """
         logger.debug('Reading sensors')
+        self._apply_rediscovery()
         data = {'host_id': self.host_id, 'sensors': {}}
-        for sensor in self.sensors:
-            try:
-                for s_id, s_data in sensor.read().iteritems():
-                    data['sensors'][s_id] = s_data
-            except:
-                logger.exception('Exception reading sensor %s',
-                                 sensor.__class__.__name__)
-        url = 'http://%s:%s/v1/sensors/update' % (
-            self.engine_addr, self.engine_port
+        sensors = self.sensors
+        due = list(sensors)
+        if len(self.class_intervals) > 0:
+            now = monotonic_time()
+            due = [s for s in sensors if self._class_due_now(s, now)]
+            if len(due) == 0:
+                logger.debug('No sensor class due for polling')
+                return None
+        results = {}
+        partial = {}
+        if self.parallel_reads:
+            results, partial = self._read_parallel(due)
+        for sensor in sensors:
+            if sensor in due:
+                if not self.parallel_reads:
+                    self._read_into(sensor, results, {})
+                self._update_latest(sensor, results, partial)
+            else:
+                logger.debug('Sensor class %s not due for polling; using '
+                             'previous readings', sensor.__class__.__name__)
+            for s_id, s_data in self._latest.get(sensor, {}).items():
+                data['sensors'][s_id] = s_data
+        return data
+
+    def _read_class(self, sensor, readings):
+        """
+        Read one sensor class instance, storing each reading in ``readings``
+        as soon as the class yields it from
+        :py:meth:`~.BaseSensor.read_iter` (or, for classes with caching
+        enabled, from :py:meth:`~.BaseSensor.cached_read`). Log any exception
+        raised.
+
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        :param readings: dict to store readings in, keyed by sensor ID
+        :type readings: dict
+        :return: False if reading the class raised an exception, else True
+        :rtype: bool
+        """
+        try:
+            with self.timings.timer('read.%s' % sensor.__class__.__name__):
+                if sensor in self._cached_sensors:
+                    items = sensor.cached_read().items()
+                else:
+                    items = sensor.read_iter()
+                for s_id, s_data in items:
+                    readings[s_id] = s_data
+            return True
+        except:
+            logger.exception('Exception reading sensor %s',
+                             sensor.__class__.__name__)
+        return False
+
+    def _read_parallel(self, sensors):
+        """
+        Read the given sensor class instances concurrently, each in its own
+        daemon thread, waiting up to ``self.class_timeout`` seconds (if set)
+        for all of them. Classes still busy with a read that missed a
+        previous deadline are not read again.
+
+        :param sensors: sensor class instances to read
+        :type sensors: list
+        :return: 2-tuple of dict of sensor class instance to readings (or
+          None if the read raised an exception) for each class that finished
+          in time, and dict of sensor class instance to the readings received
+          before the deadline for each class that did not
+        :rtype: tuple
+        """
+        results = {}
+        partial = {}
+        threads = []
+        for sensor in sensors:
+            name = sensor.__class__.__name__
+            prev = self._busy.get(sensor, None)
+            if prev is not None and prev.is_alive():
+                logger.warning('Sensor class %s is still busy with a '
+                               'previous read; not reading it this cycle',
+                               name)
+                continue
+            self._busy.pop(sensor, None)
+            readings = {}
+            t = threading.Thread(
+                target=self._read_into, args=(sensor, results, readings),
+                name='read-%s' % name
+            )
+            t.daemon = True
+            t.start()
+            threads.append((sensor, t, readings))
+        deadline = None
+        if self.class_timeout is not None:
+            deadline = monotonic_time() + self.class_timeout
+        for sensor, t, readings in threads:
+            if deadline is None:
+                t.join()
+            else:
+                t.join(max(0, deadline - monotonic_time()))
+            if t.is_alive():
+                logger.warning('Sensor class %s did not return readings '
+                               'within %ss', sensor.__class__.__name__,
+                               self.class_timeout)
+                self._busy[sensor] = t
+                partial[sensor] = dict(readings)
+        results = dict(
+            (sensor, results[sensor]) for sensor, t, r in threads
+            if sensor in results and sensor not in self._busy
         )
+        return results, partial
+
+    def _read_into(self, sensor, results, readings):
+        """
+        Read one sensor class instance with :py:meth:`~._read_class`,
+        streaming its readings into ``readings``, then store them (or None,
+        if the read raised an exception) in ``results``. Also the thread
+        target for :py:meth:`~._read_parallel`.
+
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        :param results: dict to store the result in, keyed by ``sensor``
+        :type results: dict
+        :param readings: dict to store readings in as they are received
+        :type readings: dict
+        """
+        ok = self._read_class(sensor, readings)
+        results[sensor] = readings if ok else None
+
+    def _update_latest(self, sensor, results, partial):
+        """
+        Update ``self._latest`` and the error counters for a sensor class
+        that was due for polling this cycle. If the class has no entry in
+        ``results`` (its read missed the deadline or it was still busy), the
+        readings it returned before the deadline (from ``partial``) are
+        used, and its other previously-seen sensors are reported with a value
+        of None.
+
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        :param results: dict of sensor class instance to readings, or None
+          if the read raised an exception
+        :type results: dict
+        :param partial: dict of sensor class instance to the readings
+          received before the deadline, for classes that missed it
+        :type partial: dict
+        """
+        name = sensor.__class__.__name__
+        if sensor not in results:
+            stale = {}
+            for s_id, s_data in self._latest.get(sensor, {}).items():
+                stale[s_id] = dict(s_data)
+                stale[s_id]['value'] = None
+            stale.update(partial.get(sensor, {}))
+            self._latest[sensor] = stale
+        elif results[sensor] is None:
+            self._latest.pop(sensor, None)
+            self.class_read_errors[name] = \
+                self.class_read_errors.get(name, 0) + 1
+        else:
+            self._latest[sensor] = results[sensor]
+        self._count_read_errors(self._latest.get(sensor, {}))
+
+    def _count_read_errors(self, readings):
+        """
+        Update ``self.read_errors`` from the result of one sensor class
+        read; sensors with a value of None are counted as failed reads.
+
+        :param readings: sensor data returned by a sensor class's ``read()``
+        :type readings: dict
+        """
+        for s_id, s_data in readings.items():
+            failed = 1 if s_data.get('value', None) is None else 0
+            self.read_errors[s_id] = self.read_errors.get(s_id, 0) + failed
+
+    def _class_due_now(self, sensor, now):
+        """
+        Return whether the given sensor class instance is due to be polled,
+        based on its per-class interval (if set) or the global interval. If
+        so, schedule its next poll. A poll is considered due if it is less
+        than half a loop interval away, to allow for timing jitter; if a poll
+        is more than half a loop interval late, the class's schedule restarts
+        from now.
+
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        :param now: current monotonic time
+        :type now: float
+        :return: whether to poll the class now
+        :rtype: bool
+        """
+        slack = self.loop_interval / 2.0
+        next_due = self._class_due.get(sensor, None)
+        if next_due is not None and now < next_due - slack:
+            return False
+        if next_due is None or now - next_due >= slack:
+            next_due = now
+        self._class_due[sensor] = next_due + self.class_intervals.get(
+            sensor, self.interval
+        )
+        return True
+
+    @staticmethod
+    def _common_interval(intervals):
+        """
+        Return the longest interval (to the millisecond) that all of the
+        given intervals are multiples of.
+
+        :param intervals: intervals in seconds
+        :type intervals: list
+        :return: common interval in seconds
+        :rtype: float
+        """
+        res = 0
+        for interval in intervals:
+            a, b = int(round(interval * 1000)), res
+            while b:
+                a, b = b, a % b
+            res = a
+        return max(res, 1) / 1000.0
+
+    def _put(self, url, payload):
+        """
+        PUT a JSON payload to the Engine API using the keep-alive session,
+        compressing the request body if compression is enabled and the body
+        is at least ``self.compress_min_bytes`` long.
+
+        :param url: URL to PUT to
+        :type url: str
+        :param payload: data to send as JSON
+        :type payload: dict
+        :return: HTTP response
+        :rtype: :py:class:`requests.Response`
+        """
+        with self.timings.timer('serialize'):
+            body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if (
+            self.compression is None or
+            len(body) < self.compress_min_bytes
+        ):
+            with self.timings.timer('http'):
+                return self.session.put(
+                    url, data=body, headers=headers, timeout=self.timeout
+                )
+        with self.timings.timer('compress'):
+            compressed = self._compress(body)
+        logger.debug('Compressed %d byte request body to %d bytes with %s',
+                     len(body), len(compressed), self.compression)
+        headers['Content-Encoding'] = self.compression
+        with self.timings.timer('http'):
+            r = self.session.put(
+                url, data=compressed, headers=headers, timeout=self.timeout
+            )
+        if r.status_code == 415:
+            logger.warning('Engine does not accept %s-encoded requests; '
+                           'disabling compression', self.compression)
+            self.compression = None
+            del headers['Content-Encoding']
+            with self.timings.timer('http'):
+                r = self.session.put(
+                    url, data=body, headers=headers, timeout=self.timeout
+                )
+        return r
+
+    def _compress(self, body):
+        """
+        Compress a request body with ``self.compression``.
+
+        :param body: request body
+        :type body: bytes
+        :return: compressed request body
+        :rtype: bytes
+        """
+        if self.compression == 'gzip':
+            # wbits of 16 + MAX_WBITS produces gzip format
+            c = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            return c.compress(body) + c.flush()
+        return zlib.compress(body)
+
+    def send_data(self, data, timestamp=None):
+        """
+        PUT sensor data to the Engine API. If the PUT fails and a send buffer
+        is configured, store the data in the buffer; if it succeeds, send any
+        previously-buffered data.
+
+        In batching mode (``batch_size`` or ``batch_age`` set), the data is
+        instead added to the pending batch, which is sent by
+        :py:meth:`~.flush_batch` once it is full or old enough.
+
+        :param data: sensor update data, as returned by
+          :py:meth:`~.read_sensors`
+        :type data: dict
+        :param timestamp: time the data was read, as a float Unix timestamp;
+          defaults to the current time
+        :type timestamp: float
+        :return: whether or not the data was successfully sent; in batching
+          mode, False unless this sample caused the batch to be flushed
+          successfully
+        :rtype: bool
+        """
+        if len(data['sensors']) < 1:
+            logger.debug('No sensor data to send')
+            return True
+        if timestamp is None:
+            timestamp = time.time()
+        if self.batch_size is not None or self.batch_age is not None:
+            return self._add_to_batch(data, timestamp)
+        payload = data
+        delta_state = None
+        if self.delta:
+            payload, delta_state = self._delta_payload(data)
+            if len(payload['sensors']) < 1:
+                logger.debug('No sensor changes to send')
+                return True
+        if self.dry_run:
+            logger.warning('DRY RUN - would PUT sensor data to %s: %s',
+                           self.engine_url, payload)
+            return False
+        if not self._send_update(payload):
+            if self.buffer is not None:
+                self.buffer.push(timestamp, data['sensors'])
+                logger.warning('Stored sensor data in send buffer (%d '
+                               'entries)', len(self.buffer))
+            return False
+        if delta_state is not None:
+            self._delta_state.update(delta_state)
+        if self.buffer is not None:
+            self.drain_buffer()
+        return True
+
+    def _delta_payload(self, data):
+        """
+        Build a delta-mode update from sensor data. Sensors that have not been
+        sent before, whose information (anything other than ``value`` and
+        ``read_time``) has changed, or whose full information was last sent at
+        least ``self.heartbeat`` seconds ago are included in full. Other
+        sensors are sent as just ``{'value': value}`` (plus ``read_time``, if
+        present), or omitted entirely if ``self.deadband`` is set and the
+        value is within it of the last value sent.
+
+        Returns the update and the new per-sensor state; the state should be
+        merged into ``self._delta_state`` only once the update has been sent
+        successfully.
+
+        :param data: sensor update data, as returned by
+          :py:meth:`~.read_sensors`
+        :type data: dict
+        :return: 2-tuple of delta update data (dict), new sensor state (dict)
+        :rtype: tuple
+        """
+        now = monotonic_time()
+        sensors = {}
+        state = {}
+        for s_id, s_data in data['sensors'].items():
+            info = dict(
+                (k, v) for k, v in s_data.items()
+                if k not in ('value', 'read_time')
+            )
+            value = s_data.get('value', None)
+            prev = self._delta_state.get(s_id, None)
+            if (
+                prev is None or prev[0] != info or
+                now - prev[3] >= self.heartbeat
+            ):
+                sensors[s_id] = s_data
+                state[s_id] = (info, value, now, now)
+                continue
+            if self.deadband is not None and self._within_deadband(
+                    value, prev[1]):
+                continue
+            sensors[s_id] = {'value': value}
+            if 'read_time' in s_data:
+                sensors[s_id]['read_time'] = s_data['read_time']
+            state[s_id] = (info, value, now, prev[3])
+        return {'host_id': data['host_id'], 'sensors': sensors}, state
+
+    def _within_deadband(self, value, prev_value):
+        """
+        Return whether a sensor value is within ``self.deadband`` of the last
+        value sent for it.
+
+        :param value: current sensor value
+        :type value: float
+        :param prev_value: last value sent
+        :type prev_value: float
+        :rtype: bool
+        """
+        if value == prev_value:
+            return True
+        if value is None or prev_value is None:
+            return False
+        return abs(value - prev_value) < self.deadband
+
+    def _add_to_batch(self, data, timestamp):
+        """
+        Add a sample to the pending batch, and flush the batch if it has
+        reached ``self.batch_size`` samples or its oldest sample is at least
+        ``self.batch_age`` seconds old.
+
+        :param data: sensor update data, as returned by
+          :py:meth:`~.read_sensors`
+        :type data: dict
+        :param timestamp: time the data was read, as a float Unix timestamp
+        :type timestamp: float
+        :return: whether or not the batch was flushed successfully
+        :rtype: bool
+        """
+        with self._batch_lock:
+            if self._batch_started is None:
+                self._batch_started = monotonic_time()
+            self._batch.append(
+                {'timestamp': timestamp, 'sensors': data['sensors']}
+            )
+            count = len(self._batch)
+            age = monotonic_time() - self._batch_started
+        if self.batch_size is not None and count >= self.batch_size:
+            logger.debug('Batch has %d samples; flushing', count)
+            return self.flush_batch()
+        if self.batch_age is not None and age >= self.batch_age:
+            logger.debug('Batch is %ss old; flushing', age)
+            return self.flush_batch()
+        return False
+
+    def flush_batch(self):
+        """
+        Send all pending batched samples to the Engine in one request. If
+        that fails and a send buffer is configured, store the samples in the
+        buffer; if it succeeds, send any previously-buffered data.
+
+        :return: whether or not the batch was successfully sent (True if there
+          was nothing to send)
+        :rtype: bool
+        """
+        with self._batch_lock:
+            samples = self._batch
+            self._batch = []
+            self._batch_started = None
+        if len(samples) < 1:
+            return True
+        if self.dry_run:
+            logger.warning('DRY RUN - would PUT batch of %d samples to %s: '
+                           '%s', len(samples), self.engine_batch_url, samples)
+            return False
+        if self.send_batch(samples):
+            if self.buffer is not None:
+                self.drain_buffer()
+            return True
+        if self.buffer is not None:
+            for sample in samples:
+                self.buffer.push(sample['timestamp'], sample['sensors'])
+            logger.warning('Stored %d samples in send buffer (%d entries)',
+                           len(samples), len(self.buffer))
+        return False
+
+    def _send_update(self, data):
+        """
+        PUT a single sensor update to the Engine API.
+
+        :param data: sensor update data, as returned by
+          :py:meth:`~.read_sensors`
+        :type data: dict
+        :return: whether or not the data was successfully sent
+        :rtype: bool
+        """
         try:
-            logger.debug('PUTting sensor data to %s: %s', url, data)
-            r = requests.put(url, json=data)
+            logger.debug('PUTting sensor data to %s: %s', self.engine_url,
+                         data)
+            r = self._put(self.engine_url, data)
             if r.status_code != 202 and r.status_code != 201:
                 logger.error('Error PUTting sensor data; got status code %s: '
                              '%s', r.status_code, r.text)
-                return
+                return False
         except:
             logger.exception('Exception caught when trying to PUT data to '
                              'Engine; will try again at next interval.')
-            return None
+            return False
         logger.info('PUT sensor data to Engine')
+        return True
+
+    def send_batch(self, samples):
+        """
+        PUT a batch of timestamped sensor data samples to the Engine API.
+
+        Batch format:
+
+        .. code-block:: python
+
+            {
+                'host_id': 'host_id',
+                'samples': [
+                    {
+                        'timestamp': 1234567890.123,
+                        'sensors': {<sensor data dict, as in read_sensors()>}
+                    },
+                    ...
+                ]
+            }
+
+        :param samples: list of sample dicts, each with ``timestamp`` and
+          ``sensors`` keys
+        :type samples: list
+        :return: whether or not the batch was successfully sent
+        :rtype: bool
+        """
+        payload = {'host_id': self.host_id, 'samples': samples}
+        try:
+            logger.debug('PUTting batch of %d samples to %s', len(samples),
+                         self.engine_batch_url)
+            r = self._put(self.engine_batch_url, payload)
+            if r.status_code != 202 and r.status_code != 201:
+                logger.error('Error PUTting sensor data batch; got status '
+                             'code %s: %s', r.status_code, r.text)
+                return False
+        except:
+            logger.exception('Exception caught when trying to PUT data batch '
+                             'to Engine')
+            return False
+        logger.info('PUT batch of %d samples to Engine', len(samples))
+        return True
+
+    def drain_buffer(self, max_batches=10):
+        """
+        Send buffered sensor data to the Engine in batches of
+        ``self.backfill_batch_size``, removing each batch from the buffer once
+        it has been sent. Stops on the first failure, when the buffer is
+        empty, or after ``max_batches`` batches (so a large backlog does not
+        delay the next interval). Does nothing if another thread is already
+        draining the buffer.
+
+        :param max_batches: maximum number of batches to send
+        :type max_batches: int
+        """
+        if not self._drain_lock.acquire(False):
+            return
+        try:
+            for _ in range(max_batches):
+                entries = self.buffer.peek(self.backfill_batch_size)
+                if len(entries) < 1:
+                    return
+                samples = [
+                    {'timestamp': ts, 'sensors': sensors}
+                    for _id, ts, sensors in entries
+                ]
+                if not self.send_batch(samples):
+                    return
+                self.buffer.remove([e[0] for e in entries])
+                logger.info('Sent %d buffered samples to Engine; %d '
+                            'remaining', len(entries), len(self.buffer))
+        finally:
+            self._drain_lock.release()
 
     def discover_engine(self):
         """
@@ -164,14 +1045,15 @@ class SensorDaemon(object):
     def _sensor_classes():
         """
         Find all :py:class:`~.BaseSensor` classes from the rpymostat.sensors
-        entrypoint.
+        entrypoint. The entrypoints are cached until the installed
+        distributions change, and each class is only imported when it is
+        first instantiated; see :py:mod:`~rpymostat_sensor.plugins`.
 
-        :return: list of :py:class:`~.BaseSensor` instances
+        :return: list of :py:class:`~.LazyClass` for BaseSensor subclasses
         :rtype: list
         """
-        # from rpymostat_common
-        classes = load_classes('rpymostat.sensors', superclass=BaseSensor)
-        logger.debug("%s Sensor classes loaded successfully: %s", len(classes),
+        classes = lazy_classes('rpymostat.sensors', superclass=BaseSensor)
+        logger.debug("%s Sensor classes found: %s", len(classes),
                      [c.__name__ for c in classes])
         return classes
 
@@ -181,7 +1063,12 @@ class SensorDaemon(object):
         reported sensors present.
 
         :param class_args: dict of optional arguments to pass to sensor classes
-          init method; of the form {'ClassName': {'arg_name': 'value'}}
+          init method; of the form {'ClassName': {'arg_name': 'value'}}. If
+          present, the ``interval`` argument is removed and stored in
+          ``self.class_intervals`` for the class instance, and the
+          ``cache_ttl`` and ``cache_max_age`` arguments are removed and set on
+          the class instance, which is then read with
+          :py:meth:`~.BaseSensor.cached_read`.
         :type class_args: dict
         :return: list of :py:class:`~.BaseSensor` class instances
         :rtype: list
@@ -189,30 +1076,278 @@ class SensorDaemon(object):
         if self.dummy_data:
             logger.warning('Running with --dummy - only DummySensor() will '
                            'be loaded')
-            return [DummySensor(self.host_id)]
+            dummy = DummySensor(self.host_id)
+            dummy.timings = self.timings
+            return [dummy]
         have_sensors = []
         logger.debug("Checking sensor classes for sensors...")
-        for klass in self._sensor_classes():
-            kwargs = {}
-            if klass.__class__.__name__ in class_args:
-                kwargs = class_args[klass.__class__.__name__]
+        for klass in self._get_sensor_classes():
+            cls = self._probe_class(klass, class_args)
+            if cls is not None:
+                have_sensors.append(cls)
+        logger.debug("Discovered %d sensor classes with sensors present",
+                     len(have_sensors))
+        return have_sensors
+
+    def _get_sensor_classes(self):
+        """
+        Return the list of sensor classes from :py:meth:`~._sensor_classes`,
+        caching it so that rediscovery doesn't repeat the entrypoint scan.
+
+        :return: list of :py:class:`~.BaseSensor` subclasses
+        :rtype: list
+        """
+        if self._classes is None:
+            start = monotonic_time()
+            self._classes = self._sensor_classes()
+            self.startup_times['sensor_classes'] = monotonic_time() - start
+        return self._classes
+
+    def _probe_class(self, klass, class_args):
+        """
+        Instantiate one sensor class and check whether it has sensors
+        present. If so, set it up for polling (timings, per-class interval and
+        caching from ``class_args``) and return the instance; otherwise
+        return None.
+
+        :param klass: sensor class
+        :type klass: class
+        :param class_args: class arguments; see :py:meth:`~.discover_sensors`
+        :type class_args: dict
+        :return: sensor class instance, or None
+        :rtype: :py:class:`~.BaseSensor`
+        """
+        cls = self._new_instance(klass, class_args)
+        if cls is not None:
+            self._add_instance(klass, cls, class_args)
+        return cls
+
+    def _new_instance(self, klass, class_args):
+        """
+        Instantiate one sensor class and check whether it has sensors
+        present. If so, return the instance; otherwise close it and return
+        None.
+
+        :param klass: sensor class
+        :type klass: class
+        :param class_args: class arguments; see :py:meth:`~.discover_sensors`
+        :type class_args: dict
+        :return: sensor class instance, or None
+        :rtype: :py:class:`~.BaseSensor`
+        """
+        kwargs = dict(class_args.get(klass.__name__, {}))
+        for k in ['interval', 'cache_ttl', 'cache_max_age']:
+            kwargs.pop(k, None)
+        try:
+            cls = klass(**kwargs)
+        except:
+            logger.debug('Exception while instantiating sensor class %s '
+                         'with kwargs=%s', klass.__name__, kwargs,
+                         exc_info=1)
+            return None
+        try:
+            present = cls.sensors_present()
+        except:
+            logger.debug('Exception while discovering sensors via '
+                         '%s.%s', cls.__class__.__module__,
+                         cls.__class__.__name__, exc_info=1)
+            present = False
+        if not present:
+            self._close_sensor(cls)
+            return None
+        logger.info("Sensor class %s.%s reports sensors present",
+                    cls.__class__.__module__, cls.__class__.__name__)
+        return cls
+
+    def _add_instance(self, klass, cls, class_args):
+        """
+        Set up a sensor class instance with sensors present for polling:
+        timings, and the per-class interval and caching from ``class_args``.
+
+        :param klass: sensor class
+        :type klass: class
+        :param cls: sensor class instance
+        :type cls: :py:class:`~.BaseSensor`
+        :param class_args: class arguments; see :py:meth:`~.discover_sensors`
+        :type class_args: dict
+        """
+        kwargs = class_args.get(klass.__name__, {})
+        interval = kwargs.get('interval', None)
+        cache_ttl = kwargs.get('cache_ttl', None)
+        cache_max_age = kwargs.get('cache_max_age', None)
+        cls.timings = self.timings
+        # per-class intervals are ignored in adaptive mode
+        if interval is not None and self.adaptive is None:
+            self.class_intervals[cls] = float(interval)
+        if cache_ttl is not None or cache_max_age is not None:
+            self._enable_cache(cls, cache_ttl, cache_max_age)
+        self._instances[klass] = cls
+
+    def rediscover(self):
+        """
+        Look for sensor classes without an active instance that now report
+        sensors present; called every ``self.rediscover_interval`` seconds by
+        the background rediscovery thread. Each such class is instantiated
+        and probed here, and queued to be added to ``self.sensors``.
+
+        Active instances may be being read at the same time, and sensor
+        classes are not thread-safe, so they are not touched here; this only
+        flags that they are due to be re-checked. That, and adding the queued
+        classes, is done on the polling thread by
+        :py:meth:`~._apply_rediscovery`. The cached list of sensor classes is
+        re-used.
+        """
+        logger.debug('Rediscovering sensors')
+        with self._rediscover_lock:
+            skip = set(self._instances.keys())
+            skip.update(k for k, _ in self._discovered)
+        found = []
+        for klass in self._get_sensor_classes():
+            if klass in skip:
+                continue
+            sensor = self._new_instance(klass, self.class_args)
+            if sensor is not None:
+                found.append((klass, sensor))
+        with self._rediscover_lock:
+            self._discovered.extend(found)
+            self._recheck_due = True
+
+    def _apply_rediscovery(self):
+        """
+        If :py:meth:`~.rediscover` has run since the last call, re-check
+        active sensor class instances for sensors present, removing those that
+        no longer report any, and add the classes it found. Called from
+        :py:meth:`~.read_sensors`, so that checking an instance never overlaps
+        with reading it. Instances still busy with a read that missed its
+        deadline are not checked.
+        """
+        with self._rediscover_lock:
+            if not self._recheck_due:
+                return
+            self._recheck_due = False
+            found = self._discovered
+            self._discovered = []
+            instances = list(self._instances.items())
+        sensors = []
+        removed = []
+        for klass, sensor in instances:
+            name = sensor.__class__.__name__
+            busy = self._busy.get(sensor, None)
+            if busy is not None and busy.is_alive():
+                sensors.append(sensor)
+                continue
             try:
-                cls = klass(**kwargs)
+                present = sensor.sensors_present()
             except:
-                logger.debug('Exception while instantiating sensor class %s '
-                             'with kwargs=%s', klass.__class__.__name__, kwargs,
-                             exc_info=1)
+                logger.debug('Exception while rediscovering sensors via %s',
+                             name, exc_info=1)
+                present = False
+            if present:
+                sensors.append(sensor)
                 continue
+            logger.warning('Sensor class %s no longer reports sensors '
+                           'present; removing it', name)
+            removed.append((klass, sensor))
+        with self._rediscover_lock:
+            for klass, sensor in removed:
+                self._forget(klass, sensor)
+            for klass, sensor in found:
+                logger.warning('Sensor class %s now reports sensors present; '
+                               'adding it', klass.__name__)
+                self._add_instance(klass, sensor, self.class_args)
+                sensors.append(sensor)
+        # keep the existing order for classes that are still present
+        order = dict((s, i) for i, s in enumerate(self.sensors))
+        sensors.sort(key=lambda s: order.get(s, len(order)))
+        self.sensors = sensors
+        if (len(removed) > 0 or len(found) > 0) and self.adaptive is None:
+            self._update_loop_interval()
+
+    def _forget(self, klass, sensor):
+        """
+        Remove all state kept for a sensor class instance that is no longer
+        present, and close it.
+
+        :param klass: sensor class
+        :type klass: class
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        """
+        self._instances.pop(klass, None)
+        self._latest.pop(sensor, None)
+        self.class_intervals.pop(sensor, None)
+        self._class_due.pop(sensor, None)
+        self._cached_sensors.discard(sensor)
+        self._busy.pop(sensor, None)
+        self._close_sensor(sensor)
+
+    def _close_sensor(self, sensor):
+        """
+        Call :py:meth:`~.BaseSensor.close` on a sensor class instance that is
+        being discarded, logging (and otherwise ignoring) any exception.
+
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        """
+        try:
+            sensor.close()
+        except:
+            logger.debug('Exception while closing sensor class %s',
+                         sensor.__class__.__name__, exc_info=1)
+
+    def start_rediscovery(self):
+        """
+        If ``self.rediscover_interval`` is set, start the background thread
+        that calls :py:meth:`~.rediscover` every that many seconds.
+        """
+        if self.rediscover_interval is None or self.dummy_data:
+            return
+        self._rediscover_stop.clear()
+        self._rediscover_thread = threading.Thread(
+            target=self._rediscover_loop, name='rediscover'
+        )
+        self._rediscover_thread.daemon = True
+        self._rediscover_thread.start()
+
+    def stop_rediscovery(self):
+        """
+        Stop the background rediscovery thread, if it is running.
+        """
+        if self._rediscover_thread is None:
+            return
+        self._rediscover_stop.set()
+        self._rediscover_thread.join()
+        self._rediscover_thread = None
+
+    def _rediscover_loop(self):
+        """
+        Target of the background rediscovery thread; call
+        :py:meth:`~.rediscover` every ``self.rediscover_interval`` seconds
+        until :py:meth:`~.stop_rediscovery` is called.
+        """
+        while not self._rediscover_stop.wait(self.rediscover_interval):
             try:
-                if cls.sensors_present():
-                    logger.info("Sensor class %s.%s reports sensors present",
-                                cls.__class__.__module__,
-                                cls.__class__.__name__)
-                    have_sensors.append(cls)
+                self.rediscover()
             except:
-                logger.debug('Exception while discovering sensors via '
-                             '%s.%s', cls.__class__.__module__,
-                             cls.__class__.__name__, exc_info=1)
-        logger.debug("Discovered %d sensor classes with sensors present",
-                     len(have_sensors))
-        return have_sensors
+                logger.exception('Exception rediscovering sensors')
+
+    def _enable_cache(self, sensor, cache_ttl, cache_max_age):
+        """
+        Enable read caching for a sensor class instance; it will be read with
+        :py:meth:`~.BaseSensor.cached_read` instead of ``read()``.
+
+        :param sensor: sensor class instance
+        :type sensor: :py:class:`~.BaseSensor`
+        :param cache_ttl: ``cache_ttl`` class argument, or None
+        :type cache_ttl: str
+        :param cache_max_age: ``cache_max_age`` class argument, or None
+        :type cache_max_age: str
+        """
+        if cache_ttl is not None:
+            sensor.cache_ttl = float(cache_ttl)
+        if cache_max_age is not None:
+            sensor.cache_max_age = float(cache_max_age)
+        self._cached_sensors.add(sensor)
+        logger.info('Caching readings for sensor class %s (ttl=%s, '
+                    'max_age=%s)', sensor.__class__.__name__,
+                    sensor.cache_ttl, sensor.cache_max_age)
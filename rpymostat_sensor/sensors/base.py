@@ -37,9 +37,17 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import abc
 import logging
+import threading
+import time
+
+from rpymostat_sensor.timing import null_timer
+from rpymostat_sensor.utils import monotonic_time
 
 logger = logging.getLogger(__name__)
 
+# guards lazy creation of per-instance cache locks
+_cache_lock_lock = threading.Lock()
+
 
 class BaseSensor(object):
     """
@@ -58,6 +66,19 @@ class BaseSensor(object):
     # for use in generated documentation.
     _description = "Unknown"
 
+    # :py:class:`~rpymostat_sensor.timing.TimingStats` instance to record
+    # timing information to; set by the daemon after the class is discovered.
+    timings = None
+
+    # Caching for :py:meth:`~.cached_read`; set by the daemon from the
+    # ``cache_ttl`` and ``cache_max_age`` class arguments. See
+    # :py:meth:`~.cached_read`.
+    cache_ttl = None
+    cache_max_age = None
+    _cache = None
+    _cache_time = None
+    _cache_lock = None
+
     def get_description(self):
         """
         Return the sensor class's _description attribute.
@@ -67,6 +88,114 @@ class BaseSensor(object):
         """
         return self._description
 
+    def _timer(self, name):
+        """
+        Return a context manager that records the duration of its body to
+        ``self.timings`` under ``ClassName.name``, or does nothing if
+        ``self.timings`` is not set.
+
+        :param name: name of the thing being timed
+        :type name: str
+        :return: timing context manager
+        """
+        if self.timings is None:
+            return null_timer()
+        return self.timings.timer(
+            '%s.%s' % (self.__class__.__name__, name)
+        )
+
+    def cached_read(self):
+        """
+        Return readings in the same format as :py:meth:`~.read`, touching the
+        hardware at most once every ``self.cache_ttl`` seconds; callers within
+        the TTL of the last read get that read's results. Each sensor's dict
+        has an added ``read_time`` key, the epoch time that its value was
+        read from the hardware.
+
+        If ``self.cache_max_age`` is set, a sensor whose fresh read fails
+        (its value is None, or :py:meth:`~.read` raises an exception) gets
+        its last good value instead, as long as that value is no older than
+        ``cache_max_age`` seconds. If :py:meth:`~.read` raises an exception
+        and there are no such values, the exception is re-raised.
+
+        :return: dict of sensor values and information.
+        :rtype: dict
+        """
+        if self._cache_lock is None:
+            with _cache_lock_lock:
+                if self._cache_lock is None:
+                    self._cache_lock = threading.Lock()
+        with self._cache_lock:
+            now = monotonic_time()
+            if (
+                self._cache is not None and self.cache_ttl is not None and
+                now - self._cache_time < self.cache_ttl
+            ):
+                logger.debug('Returning cached readings from %.3fs ago for '
+                             '%s', now - self._cache_time,
+                             self.__class__.__name__)
+                return self._copy_cache()
+            try:
+                readings = self._merge_cache(self.read(), time.time())
+            except:
+                if not self._have_max_age_cache():
+                    raise
+                readings = self._merge_cache({}, time.time())
+                if len(readings) == 0:
+                    raise
+                logger.warning('Exception reading %s; using cached readings',
+                               self.__class__.__name__, exc_info=1)
+            self._cache = readings
+            self._cache_time = now
+            return self._copy_cache()
+
+    def _have_max_age_cache(self):
+        """
+        Return whether cached readings may be used in place of failed reads.
+
+        :rtype: bool
+        """
+        return self.cache_max_age is not None and self._cache is not None
+
+    def _merge_cache(self, readings, read_time):
+        """
+        Add ``read_time`` to each of a fresh read's sensor dicts, replacing
+        sensors whose read failed with their cached readings if those are
+        within ``self.cache_max_age``.
+
+        :param readings: readings returned by :py:meth:`~.read`
+        :type readings: dict
+        :param read_time: epoch time of the read
+        :type read_time: float
+        :return: new readings to cache
+        :rtype: dict
+        """
+        result = {}
+        for s_id, s_data in readings.items():
+            result[s_id] = dict(s_data)
+            result[s_id]['read_time'] = read_time
+        if not self._have_max_age_cache():
+            return result
+        for s_id, s_data in self._cache.items():
+            if result.get(s_id, {}).get('value', None) is not None:
+                continue
+            if s_data.get('value', None) is None:
+                continue
+            if read_time - s_data['read_time'] > self.cache_max_age:
+                continue
+            logger.debug('Using cached value for sensor %s from %.3fs ago',
+                         s_id, read_time - s_data['read_time'])
+            result[s_id] = dict(s_data)
+        return result
+
+    def _copy_cache(self):
+        """
+        Return a copy of the cached readings, so callers can't modify them.
+
+        :rtype: dict
+        """
+        return dict((k, dict(v)) for k, v in self._cache.items())
+
     @abc.abstractmethod
     def sensors_present(self):
         """
@@ -79,6 +208,14 @@ class BaseSensor(object):
         """
         raise NotImplementedError()
 
+    def close(self):
+        """
+        Release any resources (open files, connections, threads) held by the
+        class. Called by the daemon when it discards an instance, i.e. one
+        that has no sensors present. The default implementation does nothing.
+        """
+        pass
+
     @abc.abstractmethod
     def read(self):
         """
@@ -112,3 +249,21 @@ class BaseSensor(object):
         :rtype: dict
         """
         raise NotImplementedError()
+
+    def read_iter(self):
+        """
+        Read all present temperature sensors, yielding a 2-tuple of
+        ``(sensor_id, sensor_data)`` for each one as soon as its reading is
+        available, where ``sensor_data`` is in the same format as the values
+        of the dict returned by :py:meth:`~.read`.
+
+        This default implementation just iterates over the result of
+        :py:meth:`~.read`; classes that read sensors one at a time should
+        override it to yield each reading as it completes, and implement
+        :py:meth:`~.read` as ``return dict(self.read_iter())``.
+
+        :return: generator of (sensor ID, sensor data) tuples
+        :rtype: generator
+        """
+        for s_id, s_data in self.read().items():
+            yield s_id, s_data
@@ -38,11 +38,28 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import os
 import logging
 import re
+import threading
+from functools import partial
+from time import sleep
+from multiprocessing.pool import ThreadPool
 from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.utils import str2bool, monotonic_time
+from rpymostat_sensor.watcher import DirWatcher
 
 logger = logging.getLogger(__name__)
 
 
+class _ReadTimeout(Exception):
+    """
+    Raised when reading a sensor's temperature file takes longer than
+    ``OWFS.read_timeout``; ``thread`` is the still-blocked reader thread.
+    """
+
+    def __init__(self, thread):
+        super(_ReadTimeout, self).__init__()
+        self.thread = thread
+
+
 class OWFS(BaseSensor):
     """
     Sensor class to read OWFS sensors. Currently only tested with DS18S20.
@@ -64,13 +81,59 @@ class OWFS(BaseSensor):
 
     sensor_dir_re = re.compile(r'^[0-9a-fA-F]+\.[0-9a-fA-F]+$')
 
-    def __init__(self, owfs_path=None):
+    def __init__(self, owfs_path=None, rescan_interval=300, check_mtime=False,
+                 read_threads=1, simultaneous=False, conversion_delay=0.75,
+                 read_timeout=None, quarantine_interval=30,
+                 quarantine_max=3600, watch=False):
         """
         Initialize sensor class to read OWFS sensors.
 
+        The list of sensors present on the bus is found by
+        :py:meth:`~.sensors_present` and cached; :py:meth:`~.read` only
+        re-scans the bus when the cache is older than ``rescan_interval``
+        or, if ``check_mtime`` is True, when the modification time of the
+        OWFS mountpoint changes.
+
         :param owfs_path: Absolute path to the OWFS mountpoint. If not
           specified, some common defaults will be tried.
         :type owfs_path: str
+        :param rescan_interval: Number of seconds to cache the list of sensors
+          present on the bus before re-scanning it. Set to 0 to re-scan the
+          bus on every read.
+        :type rescan_interval: float
+        :param check_mtime: If True, also re-scan the bus when the modification
+          time of the OWFS mountpoint directory changes.
+        :type check_mtime: bool
+        :param read_threads: Number of threads to use for reading sensors
+          concurrently. The default of 1 reads each sensor in turn.
+        :type read_threads: int
+        :param simultaneous: If True, start a temperature conversion on all
+          sensors at once by writing to OWFS's ``simultaneous/temperature``
+          file, wait ``conversion_delay`` seconds, and then read each sensor's
+          ``latesttemp``. If the ``simultaneous/temperature`` file is not
+          present, each sensor's ``temperature`` file is read as usual.
+        :type simultaneous: bool
+        :param conversion_delay: Number of seconds to wait after triggering a
+          simultaneous conversion before reading sensors. The default is the
+          DS18B20 12-bit conversion time.
+        :type conversion_delay: float
+        :param read_timeout: If set, the maximum number of seconds to wait
+          for each sensor's temperature file to be read. A sensor that misses
+          the deadline is reported with a value of None and quarantined (not
+          read) for ``quarantine_interval`` seconds, doubling after each
+          further timeout up to ``quarantine_max``.
+        :type read_timeout: float
+        :param quarantine_interval: Number of seconds to quarantine a sensor
+          for after its first read timeout.
+        :type quarantine_interval: float
+        :param quarantine_max: Maximum number of seconds to quarantine a
+          sensor for.
+        :type quarantine_max: float
+        :param watch: If True, watch the OWFS mountpoint for devices being
+          added or removed (see :py:class:`~.DirWatcher`) and re-scan the bus
+          only when it changes, or every ``rescan_interval`` seconds as a
+          fallback.
+        :type watch: bool
         """
         super(OWFS)
         if owfs_path is None:
@@ -82,6 +145,28 @@ class OWFS(BaseSensor):
             raise RuntimeError('Could not discover OWFS mountpoint and '
                                'owfs_path class argument not specified.')
         self.owfs_path = owfs_path
+        self.rescan_interval = float(rescan_interval)
+        self.check_mtime = str2bool(check_mtime)
+        self._sensors = None
+        self._scan_time = None
+        self._scan_mtime = None
+        self.read_threads = int(read_threads)
+        if self.read_threads < 1:
+            raise RuntimeError('read_threads must be at least 1')
+        self._pool = None
+        self.simultaneous = str2bool(simultaneous)
+        self.conversion_delay = float(conversion_delay)
+        self.read_timeout = None
+        if read_timeout is not None:
+            self.read_timeout = float(read_timeout)
+        self.quarantine_interval = float(quarantine_interval)
+        self.quarantine_max = float(quarantine_max)
+        # sensor address to dict of consecutive timeouts ('failures'),
+        # quarantine end time ('until') and blocked reader thread ('thread')
+        self._quarantine = {}
+        self._watcher = None
+        if str2bool(watch):
+            self._watcher = DirWatcher(self.owfs_path)
         self.temp_scale = self._get_temp_scale(self.owfs_path)
         logger.debug('Found OWFS path as %s (temperature scale: %s)',
                      self.owfs_path, self.temp_scale)
@@ -135,12 +220,68 @@ class OWFS(BaseSensor):
         :return: True because it's always here
         :rtype: bool
         """
-        sensors = self._find_sensors()
+        sensors = self._scan_sensors()
         logger.debug('Found %d sensors present: %s', len(sensors), sensors)
         if len(sensors) > 0:
             return True
         return False
 
+    def _scan_sensors(self):
+        """
+        Scan the bus with :py:meth:`~._find_sensors` and cache the result,
+        along with the time of the scan and (if ``check_mtime`` is enabled)
+        the modification time of the OWFS mountpoint.
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        if self.check_mtime:
+            self._scan_mtime = self._get_mtime()
+        self._sensors = self._find_sensors()
+        self._scan_time = monotonic_time()
+        return self._sensors
+
+    def _get_mtime(self):
+        """
+        Return the modification time of the OWFS mountpoint, or None if it
+        cannot be determined.
+
+        :return: mtime of ``self.owfs_path``
+        :rtype: float
+        """
+        try:
+            return os.stat(self.owfs_path).st_mtime
+        except Exception:
+            logger.debug('Exception getting mtime of %s', self.owfs_path,
+                         exc_info=1)
+            return None
+
+    def _get_sensors(self):
+        """
+        Return the cached list of sensors present, re-scanning the bus first
+        if there is no cache, if the cache is older than
+        ``self.rescan_interval``, if ``check_mtime`` is enabled and the
+        mtime of the OWFS mountpoint has changed since the last scan, or if
+        ``watch`` is enabled and devices have been added or removed.
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        if self._sensors is None:
+            logger.debug('No cached sensor list; scanning bus')
+            return self._scan_sensors()
+        if monotonic_time() - self._scan_time >= self.rescan_interval:
+            logger.debug('Cached sensor list is older than %ss; re-scanning '
+                         'bus', self.rescan_interval)
+            return self._scan_sensors()
+        if self.check_mtime and self._get_mtime() != self._scan_mtime:
+            logger.debug('OWFS mtime changed; re-scanning bus')
+            return self._scan_sensors()
+        if self._watcher is not None and self._watcher.changed():
+            logger.debug('OWFS devices added or removed; re-scanning bus')
+            return self._scan_sensors()
+        return self._sensors
+
     def _find_sensors(self):
         """
         Find all OWFS temperature sensors present. Return a list of dicts of
@@ -247,23 +388,215 @@ class OWFS(BaseSensor):
         :return: dict of sensor values and information.
         :rtype: dict
         """
-        res = {}
-        sensors = self._find_sensors()
-        for sensor in sensors:
-            data = {'type': sensor.get('type', None)}
-            if 'alias' in sensor and sensor['alias'] is not None:
-                data['alias'] = sensor['alias']
+        return dict(self.read_iter())
+
+    def read_iter(self):
+        """
+        Read all present temperature sensors, yielding a 2-tuple of sensor
+        unique ID and sensor information dict (in the format of the values
+        returned by :py:meth:`~.read`) as each sensor is read. With
+        ``read_threads`` greater than 1, readings are yielded in the order
+        they complete, not the order of the sensors on the bus.
+
+        :return: generator of (sensor ID, sensor data) tuples
+        :rtype: generator
+        """
+        sensors = self._get_sensors()
+        fname = 'temperature'
+        if self.simultaneous and self._trigger_conversion():
+            fname = 'latesttemp'
+        reader = partial(self._read_sensor, fname=fname)
+        if self.read_threads > 1 and len(sensors) > 1:
+            logger.debug('Reading %d sensors with %d threads', len(sensors),
+                         self.read_threads)
+            for result in self._get_pool().imap_unordered(reader, sensors):
+                yield result
+        else:
+            for sensor in sensors:
+                yield reader(sensor)
+
+    def close(self):
+        """
+        Stop watching ``owfs_path`` for changes, if doing so, and shut down
+        the read thread pool, if any. Pool workers exit once they finish any
+        read in progress; this does not wait for them.
+        """
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def _trigger_conversion(self):
+        """
+        Trigger a simultaneous temperature conversion on all sensors on the
+        bus by writing to OWFS's ``simultaneous/temperature`` file, then sleep
+        for ``self.conversion_delay`` seconds while the conversion completes.
+
+        :return: True if the conversion was triggered, False if the trigger
+          file is not present or could not be written.
+        :rtype: bool
+        """
+        path = os.path.join(self.owfs_path, 'simultaneous', 'temperature')
+        if not os.path.exists(path):
+            logger.debug('%s does not exist; falling back to per-sensor '
+                         'conversion', path)
+            return False
+        try:
+            with open(path, 'w') as fh:
+                fh.write('1')
+        except Exception:
+            logger.debug('Exception writing to %s; falling back to '
+                         'per-sensor conversion', path, exc_info=1)
+            return False
+        logger.debug('Triggered simultaneous conversion; sleeping %ss',
+                     self.conversion_delay)
+        sleep(self.conversion_delay)
+        return True
+
+    def _get_pool(self):
+        """
+        Return the thread pool used for concurrent reads, creating it on the
+        first call.
+
+        :return: thread pool of ``self.read_threads`` workers
+        :rtype: :py:class:`multiprocessing.pool.ThreadPool`
+        """
+        if self._pool is None:
+            self._pool = ThreadPool(self.read_threads)
+        return self._pool
+
+    def _read_sensor(self, sensor, fname='temperature'):
+        """
+        Read the temperature from a single sensor, as described by one of the
+        dicts returned by :py:meth:`~._find_sensors`.
+
+        :param sensor: sensor information dict
+        :type sensor: dict
+        :param fname: name of the file in the sensor's directory to read the
+          temperature from; ``temperature`` or ``latesttemp``
+        :type fname: str
+        :return: 2-tuple of sensor address (str), sensor data dict (in the
+          format of the values returned by :py:meth:`~.read`)
+        :rtype: tuple
+        """
+        data = {'type': sensor.get('type', None)}
+        if 'alias' in sensor and sensor['alias'] is not None:
+            data['alias'] = sensor['alias']
+        path = sensor['temp_path']
+        if fname != 'temperature':
+            path = os.path.join(os.path.dirname(path), fname)
+        if self._is_quarantined(sensor['address']):
+            data['value'] = None
+            return sensor['address'], data
+        try:
+            logger.debug('Reading temperature from sensor %s at %s',
+                         sensor['address'], path)
+            with self._timer('read_file'):
+                temp = self._read_temp_file(path).strip()
+            data['value'] = float(temp)
+            logger.debug('Got temperature of %s from %s', data['value'],
+                         sensor['address'])
+            if self._quarantine.pop(sensor['address'], None) is not None:
+                logger.info('Sensor %s responded; releasing it from '
+                            'quarantine', sensor['address'])
+        except _ReadTimeout as ex:
+            logger.warning('Read from sensor %s timed out after %ss',
+                           sensor['address'], self.read_timeout)
+            self._quarantine_sensor(sensor['address'], ex.thread)
+            data['value'] = None
+        except:
+            logger.debug('Exception reading from sensor %s',
+                         sensor['address'], exc_info=1)
+            data['value'] = None
+        return sensor['address'], data
+
+    def _read_temp_file(self, path):
+        """
+        Read and return the contents of a sensor's temperature file. If
+        ``self.read_timeout`` is set, the read is done in a daemon thread and
+        :py:class:`~._ReadTimeout` is raised if it does not finish in time.
+
+        :param path: path to the file to read
+        :type path: str
+        :return: file contents
+        :rtype: str
+        """
+        if self.read_timeout is None:
+            with open(path, 'r') as fh:
+                return fh.read()
+        result = {}
+
+        def _reader():
             try:
-                logger.debug('Reading temperature from sensor %s at %s',
-                             sensor['address'], sensor['temp_path'])
-                with open(sensor['temp_path'], 'r') as fh:
-                    temp = fh.read().strip()
-                data['value'] = float(temp)
-                logger.debug('Got temperature of %s from %s', data['value'],
-                             sensor['address'])
-            except:
-                logger.debug('Exception reading from sensor %s',
-                             sensor['address'], exc_info=1)
-                data['value'] = None
-            res[sensor['address']] = data
-        return res
+                with open(path, 'r') as fh:
+                    result['content'] = fh.read()
+            except Exception as ex:
+                result['exception'] = ex
+
+        t = threading.Thread(target=_reader, name='owfs-read-%s' % path)
+        t.daemon = True
+        t.start()
+        t.join(self.read_timeout)
+        if t.is_alive():
+            raise _ReadTimeout(t)
+        if 'exception' in result:
+            raise result['exception']
+        return result['content']
+
+    def _is_quarantined(self, address):
+        """
+        Return whether or not the sensor with the given address is currently
+        quarantined after read timeouts. If its quarantine has expired but
+        the reader thread from its last timeout is still blocked, it is
+        quarantined again instead of starting another read.
+
+        :param address: sensor address
+        :type address: str
+        :return: whether the sensor should not be read
+        :rtype: bool
+        """
+        q = self._quarantine.get(address, None)
+        if q is None:
+            return False
+        now = monotonic_time()
+        if now < q['until']:
+            logger.debug('Sensor %s is quarantined for another %.1fs; not '
+                         'reading it', address, q['until'] - now)
+            return True
+        if q['thread'] is not None and q['thread'].is_alive():
+            logger.warning('Previous read from sensor %s is still blocked',
+                           address)
+            self._quarantine_sensor(address, q['thread'])
+            return True
+        return False
+
+    def _quarantine_sensor(self, address, thread):
+        """
+        Quarantine the sensor with the given address after a read timeout,
+        for ``self.quarantine_interval`` seconds doubled for each previous
+        consecutive timeout, up to ``self.quarantine_max`` seconds.
+
+        :param address: sensor address
+        :type address: str
+        :param thread: the blocked reader thread
+        :type thread: :py:class:`threading.Thread`
+        """
+        failures = self._quarantine.get(address, {}).get('failures', 0) + 1
+        # double once per previous timeout, stopping at the maximum; a
+        # permanently blocked sensor keeps counting failures, and 2 ** failures
+        # would eventually be too large to convert to a float
+        backoff = self.quarantine_interval
+        for _ in range(failures - 1):
+            if backoff >= self.quarantine_max:
+                break
+            backoff *= 2
+        backoff = min(self.quarantine_max, backoff)
+        self._quarantine[address] = {
+            'failures': failures,
+            'until': monotonic_time() + backoff,
+            'thread': thread
+        }
+        logger.warning('Quarantining sensor %s for %ss after %d consecutive '
+                       'read timeouts', address, backoff, failures)
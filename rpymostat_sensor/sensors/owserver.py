@@ -0,0 +1,458 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import re
+import socket
+import struct
+import threading
+from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.utils import str2bool, monotonic_time
+
+logger = logging.getLogger(__name__)
+
+# owserver protocol message types
+MSG_READ = 2
+MSG_PRESENCE = 6
+MSG_DIRALL = 7
+
+# owserver protocol flags
+FLG_PERSISTENCE = 0x00000004
+FLG_OWNET = 0x00000100
+# temperature scale is bits 16-17; always ask for Celsius regardless of the
+# owserver's configured scale
+FLG_TEMP_C = 0x00000000
+
+# maximum number of bytes to request for a READ
+READ_SIZE = 8192
+
+# message header; version, payload length, type (request) or return value
+# (response), flags, size, offset; all network-order signed 32-bit ints
+_HEADER = struct.Struct('>iiiiii')
+
+
+class OWServerError(Exception):
+    """
+    Raised when owserver returns a protocol-level error, or the connection
+    to it fails in a way that loses responses.
+    """
+    pass
+
+
+class OWServer(BaseSensor):
+    """
+    Sensor class to read 1-Wire temperature sensors directly from owserver
+    using its TCP network protocol, bypassing the OWFS FUSE mount.
+    """
+
+    _description = 'Dallas Semi 1-Wire Sensors via owserver network protocol'
+
+    sensor_dir_re = re.compile(r'^[0-9a-fA-F]+\.[0-9a-fA-F]+$')
+
+    def __init__(self, host='localhost', port=4304, timeout=5.0,
+                 rescan_interval=300, uncached=False):
+        """
+        Initialize sensor class to read sensors from owserver.
+
+        A single connection to owserver is kept open and re-used between
+        reads (if owserver grants a persistent connection), and all of the
+        requests needed to read every sensor are pipelined over it: sent
+        all at once, then the responses read in order. Like
+        :py:class:`~rpymostat_sensor.sensors.owfs.OWFS`, the list of sensors
+        present is cached and only re-scanned every ``rescan_interval``
+        seconds.
+
+        :param host: owserver hostname or IP address
+        :type host: str
+        :param port: owserver TCP port
+        :type port: int
+        :param timeout: socket timeout, in seconds
+        :type timeout: float
+        :param rescan_interval: Number of seconds to cache the list of sensors
+          present on the bus before re-scanning it. Set to 0 to re-scan the
+          bus on every read.
+        :type rescan_interval: float
+        :param uncached: If True, read temperatures from owserver's
+          ``/uncached`` tree, bypassing its value cache.
+        :type uncached: bool
+        """
+        super(OWServer)
+        self.host = host
+        self.port = int(port)
+        self.timeout = float(timeout)
+        self.rescan_interval = float(rescan_interval)
+        self.uncached = str2bool(uncached)
+        self._sock = None
+        # serializes use of the connection; requests are pipelined over it,
+        # so concurrent callers would otherwise get each other's responses
+        self._lock = threading.Lock()
+        # whether owserver has granted us a persistent connection
+        self._persistent = True
+        self._sensors = None
+        self._scan_time = None
+
+    def sensors_present(self):
+        """
+        Determine whether there are temperature sensors present on owserver
+        or not.
+
+        :return: whether or not any temperature sensors are present
+        :rtype: bool
+        """
+        try:
+            sensors = self._scan_sensors()
+        except Exception:
+            logger.debug('Exception scanning owserver at %s:%s', self.host,
+                         self.port, exc_info=1)
+            return False
+        logger.debug('Found %d sensors present: %s', len(sensors), sensors)
+        return len(sensors) > 0
+
+    def _scan_sensors(self):
+        """
+        Scan the bus with :py:meth:`~._find_sensors` and cache the result
+        along with the time of the scan.
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        self._sensors = self._find_sensors()
+        self._scan_time = monotonic_time()
+        return self._sensors
+
+    def _get_sensors(self):
+        """
+        Return the cached list of sensors present, re-scanning the bus first
+        if there is no cache or if it is older than ``self.rescan_interval``.
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        if self._sensors is None:
+            logger.debug('No cached sensor list; scanning bus')
+            return self._scan_sensors()
+        if monotonic_time() - self._scan_time >= self.rescan_interval:
+            logger.debug('Cached sensor list is older than %ss; re-scanning '
+                         'bus', self.rescan_interval)
+            return self._scan_sensors()
+        return self._sensors
+
+    def _find_sensors(self):
+        """
+        Find all temperature sensors present on owserver. Lists the root
+        directory, then in one pipelined round trip checks each device for a
+        ``temperature`` property and reads its ``address``, ``alias`` and
+        ``type``.
+
+        Return dict format:
+
+        .. code-block:: python
+
+            {
+                'path': '/28.0123456789AB',
+                'alias': 'sensor alias, if set',
+                'address': 'sensor address',
+                'type': 'sensor type'
+            }
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        ret, data = self._request([(MSG_DIRALL, '/')])[0]
+        if ret < 0:
+            raise OWServerError('DIRALL / failed with error %d' % ret)
+        paths = [
+            p for p in data.decode('utf-8').strip('\x00').split(',')
+            if self.sensor_dir_re.match(p.strip('/'))
+        ]
+        reqs = []
+        for path in paths:
+            reqs.extend([
+                (MSG_PRESENCE, path + '/temperature'),
+                (MSG_READ, path + '/address'),
+                (MSG_READ, path + '/alias'),
+                (MSG_READ, path + '/type')
+            ])
+        results = self._request(reqs)
+        sensors = []
+        for idx, path in enumerate(paths):
+            presence, address, alias, _type = results[idx * 4:(idx + 1) * 4]
+            if presence[0] < 0:
+                continue
+            logger.debug('found temperature sensor at: %s', path)
+            d = {
+                'path': path,
+                'address': self._result_str(address) or path.strip('/')
+            }
+            alias = self._result_str(alias)
+            if alias is not None:
+                d['alias'] = alias
+            _type = self._result_str(_type)
+            if _type is not None:
+                d['type'] = _type
+            sensors.append(d)
+        return sensors
+
+    @staticmethod
+    def _result_str(result):
+        """
+        Return the stripped string data of a successful READ result, or None
+        if the read failed or returned nothing.
+
+        :param result: 2-tuple of return value, data
+        :type result: tuple
+        :rtype: str
+        """
+        ret, data = result
+        if ret < 0:
+            return None
+        s = data.decode('utf-8').strip('\x00').strip()
+        if s == '':
+            return None
+        return s
+
+    def read(self):
+        """
+        Read all present temperature sensors, in one pipelined round trip to
+        owserver.
+
+        Returns a dict of sensor unique IDs (keys) to dicts of sensor
+        information.
+
+        Return dict format:
+
+        .. code-block:: python
+
+            {
+                'unique_id_1': {
+                    'type': 'sensor_type_string',
+                    'value': 1.234,
+                    'alias': 'str',
+                    'extra': ''
+                },
+                ...
+            }
+
+        Each dict key is a globally-unique sensor ID. Each value is a dict
+        with the following keys:
+
+        - type: (str) sensor type
+        - value: (float) current temperature in degress Celsius, or None if
+           there is an error reading it.
+        - alias: (str) a human-readable alias/name for the sensor, if present
+        - extra: (str) any extra information about the sensor
+
+        :return: dict of sensor values and information.
+        :rtype: dict
+        """
+        sensors = self._get_sensors()
+        prefix = '/uncached' if self.uncached else ''
+        reqs = [(MSG_READ, prefix + s['path'] + '/temperature')
+                for s in sensors]
+        try:
+            with self._timer('read'):
+                results = self._request(reqs)
+        except Exception:
+            logger.debug('Exception reading from owserver', exc_info=1)
+            results = [(-1, b'')] * len(sensors)
+        res = {}
+        for sensor, result in zip(sensors, results):
+            data = {'type': sensor.get('type', None)}
+            if 'alias' in sensor:
+                data['alias'] = sensor['alias']
+            try:
+                data['value'] = float(self._result_str(result))
+            except Exception:
+                logger.debug('Error reading sensor %s: %s',
+                             sensor['address'], result[0])
+                data['value'] = None
+            res[sensor['address']] = data
+        return res
+
+    def _connect(self):
+        """
+        Return the open connection to owserver, opening one if needed.
+
+        :rtype: :py:class:`socket.socket`
+        """
+        if self._sock is None:
+            logger.debug('Connecting to owserver at %s:%s', self.host,
+                         self.port)
+            self._sock = socket.create_connection(
+                (self.host, self.port), self.timeout
+            )
+        return self._sock
+
+    def _close(self):
+        """
+        Close the connection to owserver, if open.
+        """
+        if self._sock is None:
+            return
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+        self._sock = None
+
+    def close(self):
+        """
+        Close the connection to owserver, if open.
+        """
+        with self._lock:
+            self._close()
+
+    def _request(self, reqs, retry=True):
+        """
+        Send a list of requests to owserver and return their results, in
+        order. While owserver grants persistent connections, all requests are
+        pipelined over the one open connection; otherwise, one request is sent
+        per connection. If the connection fails, it is re-opened and the
+        outstanding requests retried once. Only one caller at a time uses the
+        connection.
+
+        :param reqs: list of 2-tuples of message type (int), path (str)
+        :type reqs: list
+        :param retry: whether to retry on connection failure
+        :type retry: bool
+        :return: list of 2-tuples of return value (int), data (bytes)
+        :rtype: list
+        """
+        results = []
+        with self._lock:
+            while len(results) < len(reqs):
+                pending = reqs[len(results):]
+                if not self._persistent:
+                    pending = pending[:1]
+                try:
+                    got = self._send_batch(pending)
+                except (socket.error, OWServerError):
+                    self._close()
+                    if not retry:
+                        raise
+                    logger.debug('owserver connection failed; retrying',
+                                 exc_info=1)
+                    retry = False
+                    continue
+                results.extend(got)
+        return results
+
+    def _send_batch(self, reqs):
+        """
+        Send a batch of requests over the connection, then read responses.
+        If owserver does not grant persistence on a response, it closes the
+        connection after it; stop there and return the responses read so far
+        (the rest will be re-sent on new connections).
+
+        :param reqs: list of 2-tuples of message type (int), path (str)
+        :type reqs: list
+        :return: list of 2-tuples of return value (int), data (bytes)
+        :rtype: list
+        """
+        sock = self._connect()
+        sock.sendall(b''.join(self._message(t, p) for t, p in reqs))
+        results = []
+        for _ in reqs:
+            ret, flags, data = self._recv_response(sock)
+            results.append((ret, data))
+            if not flags & FLG_PERSISTENCE:
+                if self._persistent:
+                    logger.debug('owserver did not grant a persistent '
+                                 'connection')
+                self._persistent = False
+                self._close()
+                break
+        return results
+
+    @staticmethod
+    def _message(msg_type, path):
+        """
+        Build an owserver request message.
+
+        :param msg_type: message type
+        :type msg_type: int
+        :param path: owserver path
+        :type path: str
+        :rtype: bytes
+        """
+        payload = path.encode('utf-8') + b'\x00'
+        size = READ_SIZE if msg_type == MSG_READ else 0
+        flags = FLG_OWNET | FLG_PERSISTENCE | FLG_TEMP_C
+        return _HEADER.pack(0, len(payload), msg_type, flags, size, 0) + \
+            payload
+
+    def _recv_response(self, sock):
+        """
+        Read one response from owserver, skipping any keepalive "ping"
+        messages (payload length of -1) sent during long operations.
+
+        :param sock: connection to read from
+        :type sock: :py:class:`socket.socket`
+        :return: 3-tuple of return value (int), flags (int), data (bytes)
+        :rtype: tuple
+        """
+        while True:
+            _, plen, ret, flags, size, _ = _HEADER.unpack(
+                self._recv_exact(sock, _HEADER.size)
+            )
+            if plen == -1:
+                continue
+            payload = b''
+            if plen > 0:
+                payload = self._recv_exact(sock, plen)
+            if 0 <= size < len(payload):
+                payload = payload[:size]
+            return ret, flags, payload
+
+    @staticmethod
+    def _recv_exact(sock, length):
+        """
+        Read exactly ``length`` bytes from a socket.
+
+        :param sock: connection to read from
+        :type sock: :py:class:`socket.socket`
+        :param length: number of bytes to read
+        :type length: int
+        :rtype: bytes
+        """
+        buf = b''
+        while len(buf) < length:
+            chunk = sock.recv(length - len(buf))
+            if not chunk:
+                raise OWServerError('owserver closed the connection')
+            buf += chunk
+        return buf
@@ -0,0 +1,383 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import logging
+import re
+from time import sleep
+from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.utils import str2bool, monotonic_time
+from rpymostat_sensor.watcher import DirWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class W1Therm(BaseSensor):
+    """
+    Sensor class to read 1-Wire temperature sensors via the Linux kernel
+    ``w1_therm`` driver's sysfs interface.
+    """
+
+    _description = 'Dallas Semi 1-Wire Sensors via Linux kernel w1_therm'
+
+    # w1_therm-supported family codes, to sensor type
+    families = {
+        '10': 'DS18S20',
+        '22': 'DS1822',
+        '28': 'DS18B20',
+        '3b': 'DS1825',
+        '42': 'DS28EA00'
+    }
+
+    sensor_dir_re = re.compile(r'^([0-9a-f]{2})-[0-9a-f]{12}$')
+
+    bus_master_re = re.compile(r'^w1_bus_master\d+$')
+
+    def __init__(self, devices_path='/sys/bus/w1/devices',
+                 rescan_interval=300, bulk_read=False, bulk_timeout=1.5,
+                 watch=False):
+        """
+        Initialize sensor class to read sensors via the kernel w1_therm
+        driver.
+
+        The list of sensors present is found by :py:meth:`~.sensors_present`
+        and cached; :py:meth:`~.read` only re-scans when the cache is older
+        than ``rescan_interval``.
+
+        :param devices_path: path to the w1 sysfs devices directory
+        :type devices_path: str
+        :param rescan_interval: Number of seconds to cache the list of sensors
+          present on the bus before re-scanning it. Set to 0 to re-scan the
+          bus on every read.
+        :type rescan_interval: float
+        :param bulk_read: If True, start a temperature conversion on all
+          sensors at once by writing ``trigger`` to each bus master's
+          ``therm_bulk_read`` file, wait for it to finish, then read each
+          sensor's ``temperature``. Bus masters without ``therm_bulk_read``
+          (kernels before 5.10) are read one sensor at a time as usual.
+        :type bulk_read: bool
+        :param bulk_timeout: Maximum number of seconds to wait for a bulk
+          conversion to finish.
+        :type bulk_timeout: float
+        :param watch: If True, watch ``devices_path`` for devices being added
+          or removed (see :py:class:`~.DirWatcher`) and re-scan only when it
+          changes, or every ``rescan_interval`` seconds as a fallback.
+        :type watch: bool
+        """
+        super(W1Therm)
+        self.devices_path = devices_path
+        self.rescan_interval = float(rescan_interval)
+        self.bulk_read = str2bool(bulk_read)
+        self.bulk_timeout = float(bulk_timeout)
+        self._sensors = None
+        self._scan_time = None
+        self._watcher = None
+        if str2bool(watch):
+            self._watcher = DirWatcher(self.devices_path)
+
+    def sensors_present(self):
+        """
+        Determine whether there are w1_therm temperature sensors present.
+
+        :return: whether or not any temperature sensors are present
+        :rtype: bool
+        """
+        sensors = self._scan_sensors()
+        logger.debug('Found %d sensors present: %s', len(sensors), sensors)
+        return len(sensors) > 0
+
+    def _scan_sensors(self):
+        """
+        Scan the bus with :py:meth:`~._find_sensors` and cache the result
+        along with the time of the scan.
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        self._sensors = self._find_sensors()
+        self._scan_time = monotonic_time()
+        return self._sensors
+
+    def _get_sensors(self):
+        """
+        Return the cached list of sensors present, re-scanning the bus first
+        if there is no cache, if it is older than ``self.rescan_interval``, or
+        if ``watch`` is enabled and devices have been added or removed.
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        if self._sensors is None:
+            logger.debug('No cached sensor list; scanning bus')
+            return self._scan_sensors()
+        if monotonic_time() - self._scan_time >= self.rescan_interval:
+            logger.debug('Cached sensor list is older than %ss; re-scanning '
+                         'bus', self.rescan_interval)
+            return self._scan_sensors()
+        if self._watcher is not None and self._watcher.changed():
+            logger.debug('w1 devices added or removed; re-scanning bus')
+            return self._scan_sensors()
+        return self._sensors
+
+    def _find_sensors(self):
+        """
+        Find all w1_therm temperature sensors present. Return a list of dicts
+        of information about them.
+
+        Return dict format:
+
+        .. code-block:: python
+
+            {
+                'path': 'absolute path to the sensor's sysfs directory',
+                'address': 'sensor ID, i.e. 28-0123456789ab',
+                'type': 'sensor type',
+                'temperature': True if the sensor has a ``temperature`` file
+            }
+
+        :return: list of dicts describing present temperature sensors.
+        :rtype: list
+        """
+        try:
+            names = os.listdir(self.devices_path)
+        except OSError:
+            logger.debug('Could not list %s', self.devices_path, exc_info=1)
+            return []
+        sensors = []
+        for name in sorted(names):
+            m = self.sensor_dir_re.match(name)
+            if m is None or m.group(1) not in self.families:
+                continue
+            path = os.path.join(self.devices_path, name)
+            has_temp = os.path.exists(os.path.join(path, 'temperature'))
+            if not has_temp and not os.path.exists(
+                    os.path.join(path, 'w1_slave')):
+                continue
+            logger.debug('found temperature sensor at: %s', path)
+            sensors.append({
+                'path': path,
+                'address': name,
+                'type': self.families[m.group(1)],
+                'temperature': has_temp
+            })
+        return sensors
+
+    def _bus_masters(self):
+        """
+        Return the paths to the ``therm_bulk_read`` files of all bus masters
+        that have one.
+
+        :rtype: list
+        """
+        try:
+            names = os.listdir(self.devices_path)
+        except OSError:
+            return []
+        paths = []
+        for name in sorted(names):
+            if not self.bus_master_re.match(name):
+                continue
+            path = os.path.join(self.devices_path, name, 'therm_bulk_read')
+            if os.path.exists(path):
+                paths.append(path)
+        return paths
+
+    def _bulk_convert(self):
+        """
+        Trigger a bulk conversion on every bus master that supports it and
+        wait (up to ``self.bulk_timeout`` seconds) for it to finish. Return
+        True if a conversion was triggered on at least one bus master.
+
+        :rtype: bool
+        """
+        paths = self._bus_masters()
+        triggered = []
+        for path in paths:
+            try:
+                with open(path, 'w') as fh:
+                    fh.write('trigger\n')
+                triggered.append(path)
+            except Exception:
+                logger.debug('Exception triggering bulk read via %s', path,
+                             exc_info=1)
+        if len(triggered) < 1:
+            return False
+        deadline = monotonic_time() + self.bulk_timeout
+        with self._timer('bulk_conversion'):
+            for path in triggered:
+                # -1 while any sensor is still converting
+                while self._read_file(path) == '-1':
+                    if monotonic_time() >= deadline:
+                        logger.warning('Bulk conversion via %s did not '
+                                       'finish within %ss', path,
+                                       self.bulk_timeout)
+                        break
+                    sleep(0.05)
+        return True
+
+    def _read_file(self, path):
+        """
+        Return the stripped contents of a file, or None on error.
+
+        :param path: path to read
+        :type path: str
+        :rtype: str
+        """
+        try:
+            with self._timer('read_file'):
+                with open(path, 'r') as fh:
+                    return fh.read().strip()
+        except Exception:
+            logger.debug('Exception reading %s', path, exc_info=1)
+            return None
+
+    def read(self):
+        """
+        Read all present temperature sensors.
+
+        Returns a dict of sensor unique IDs (keys) to dicts of sensor
+        information.
+
+        Return dict format:
+
+        .. code-block:: python
+
+            {
+                'unique_id_1': {
+                    'type': 'sensor_type_string',
+                    'value': 1.234,
+                    'alias': 'str',
+                    'extra': ''
+                },
+                ...
+            }
+
+        Each dict key is a globally-unique sensor ID. Each value is a dict
+        with the following keys:
+
+        - type: (str) sensor type
+        - value: (float) current temperature in degress Celsius, or None if
+           there is an error reading it.
+        - alias: (str) a human-readable alias/name for the sensor, if present
+        - extra: (str) any extra information about the sensor
+
+        :return: dict of sensor values and information.
+        :rtype: dict
+        """
+        return dict(self.read_iter())
+
+    def read_iter(self):
+        """
+        Read all present temperature sensors, yielding a 2-tuple of sensor
+        unique ID and sensor information dict (in the format of the values
+        returned by :py:meth:`~.read`) as each sensor is read.
+
+        :return: generator of (sensor ID, sensor data) tuples
+        :rtype: generator
+        """
+        sensors = self._get_sensors()
+        if self.bulk_read:
+            self._bulk_convert()
+        for sensor in sensors:
+            yield sensor['address'], {
+                'type': sensor['type'],
+                'value': self._read_sensor(sensor)
+            }
+
+    def close(self):
+        """
+        Stop watching ``devices_path`` for changes, if doing so.
+        """
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def _read_sensor(self, sensor):
+        """
+        Read the temperature from a single sensor, as described by one of the
+        dicts returned by :py:meth:`~._find_sensors`. Uses the ``temperature``
+        file if present, otherwise ``w1_slave``.
+
+        :param sensor: sensor information dict
+        :type sensor: dict
+        :return: temperature in degrees Celsius, or None on error
+        :rtype: float
+        """
+        if sensor['temperature']:
+            content = self._read_file(
+                os.path.join(sensor['path'], 'temperature')
+            )
+            try:
+                return int(content) / 1000.0
+            except (TypeError, ValueError):
+                logger.debug('Bad temperature from sensor %s: %s',
+                             sensor['address'], content)
+                return None
+        content = self._read_file(os.path.join(sensor['path'], 'w1_slave'))
+        return self._parse_w1_slave(sensor['address'], content)
+
+    @staticmethod
+    def _parse_w1_slave(address, content):
+        """
+        Parse the contents of a ``w1_slave`` file; return the temperature in
+        degrees Celsius, or None if the CRC check failed or the content is
+        otherwise invalid. The format is:
+
+        .. code-block:: none
+
+            72 01 4b 46 7f ff 0e 10 57 : crc=57 YES
+            72 01 4b 46 7f ff 0e 10 57 t=23125
+
+        :param address: sensor address, for logging
+        :type address: str
+        :param content: file content
+        :type content: str
+        :rtype: float
+        """
+        if content is None:
+            return None
+        lines = content.split('\n')
+        if len(lines) < 2 or not lines[0].strip().endswith('YES'):
+            logger.debug('CRC check failed reading sensor %s: %s', address,
+                         content)
+            return None
+        m = re.search(r't=(-?\d+)', lines[1])
+        if m is None:
+            logger.debug('No temperature in w1_slave for sensor %s: %s',
+                         address, content)
+            return None
+        return int(m.group(1)) / 1000.0
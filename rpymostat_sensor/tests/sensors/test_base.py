@@ -37,8 +37,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import sys
 import pkg_resources
+import pytest
 
 from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.timing import TimingStats
 
 # https://code.google.com/p/mock/issues/detail?id=249
 # py>=3.4 should use unittest.mock not the mock package on pypi
@@ -92,6 +94,114 @@ class TestBaseSensor(object):
     def test_get_description(self):
         assert self.cls.get_description() == 'foo desc'
 
+    def test_timer_no_timings(self):
+        assert self.cls.timings is None
+        with self.cls._timer('foo'):
+            pass
+
+    def test_timer(self):
+        self.cls.timings = TimingStats()
+        with self.cls._timer('foo'):
+            pass
+        assert self.cls.timings.names() == ['TestSensor.foo']
+
+    def test_close(self):
+        assert self.cls.close() is None
+
+    def test_read_iter(self):
+        with patch.object(self.cls, 'read') as mock_read:
+            mock_read.return_value = {
+                's1': {'value': 1.0},
+                's2': {'value': 2.0}
+            }
+            res = list(self.cls.read_iter())
+        assert sorted(res) == [('s1', {'value': 1.0}), ('s2', {'value': 2.0})]
+
+    def test_cached_read_no_ttl(self):
+        with patch.object(self.cls, 'read') as mock_read:
+            with patch('rpymostat_sensor.sensors.base.time.time') as mock_t:
+                mock_read.side_effect = [
+                    {'s1': {'value': 1.0}},
+                    {'s1': {'value': 2.0}}
+                ]
+                mock_t.side_effect = [1000.0, 1001.0]
+                res1 = self.cls.cached_read()
+                res2 = self.cls.cached_read()
+        assert res1 == {'s1': {'value': 1.0, 'read_time': 1000.0}}
+        assert res2 == {'s1': {'value': 2.0, 'read_time': 1001.0}}
+
+    def test_cached_read_ttl(self):
+        self.cls.cache_ttl = 10.0
+        with patch.object(self.cls, 'read') as mock_read:
+            with patch('rpymostat_sensor.sensors.base.time.time') as mock_t:
+                with patch('rpymostat_sensor.sensors.base.'
+                           'monotonic_time') as mock_mono:
+                    mock_read.side_effect = [
+                        {'s1': {'value': 1.0}},
+                        {'s1': {'value': 2.0}}
+                    ]
+                    mock_t.side_effect = [1000.0, 1012.0]
+                    mock_mono.side_effect = [100.0, 105.0, 112.0]
+                    res1 = self.cls.cached_read()
+                    res1['s1']['value'] = 99.0
+                    res2 = self.cls.cached_read()
+                    res3 = self.cls.cached_read()
+        assert res2 == {'s1': {'value': 1.0, 'read_time': 1000.0}}
+        assert res3 == {'s1': {'value': 2.0, 'read_time': 1012.0}}
+        assert len(mock_read.mock_calls) == 2
+
+    def test_cached_read_max_age(self):
+        self.cls.cache_max_age = 60.0
+        with patch.object(self.cls, 'read') as mock_read:
+            with patch('rpymostat_sensor.sensors.base.time.time') as mock_t:
+                mock_read.side_effect = [
+                    {'s1': {'value': 1.0}, 's2': {'value': 2.0}},
+                    {'s1': {'value': None}, 's2': {'value': None}},
+                    {'s1': {'value': 3.0}, 's2': {'value': None}},
+                ]
+                mock_t.side_effect = [1000.0, 1030.0, 1070.0]
+                self.cls.cached_read()
+                res2 = self.cls.cached_read()
+                res3 = self.cls.cached_read()
+        assert res2 == {
+            's1': {'value': 1.0, 'read_time': 1000.0},
+            's2': {'value': 2.0, 'read_time': 1000.0}
+        }
+        assert res3 == {
+            's1': {'value': 3.0, 'read_time': 1070.0},
+            's2': {'value': None, 'read_time': 1070.0}
+        }
+
+    def test_cached_read_exception(self):
+        self.cls.cache_max_age = 60.0
+        with patch.object(self.cls, 'read') as mock_read:
+            with patch('rpymostat_sensor.sensors.base.time.time') as mock_t:
+                mock_read.side_effect = [
+                    {'s1': {'value': 1.0}},
+                    RuntimeError('foo'),
+                    RuntimeError('bar')
+                ]
+                with patch('rpymostat_sensor.sensors.base.logger',
+                           autospec=True) as mock_logger:
+                    mock_t.side_effect = [1000.0, 1030.0, 1100.0]
+                    self.cls.cached_read()
+                    res2 = self.cls.cached_read()
+                    with pytest.raises(RuntimeError):
+                        self.cls.cached_read()
+        assert res2 == {'s1': {'value': 1.0, 'read_time': 1000.0}}
+        assert mock_logger.mock_calls == [
+            call.debug('Using cached value for sensor %s from %.3fs ago',
+                       's1', 30.0),
+            call.warning('Exception reading %s; using cached readings',
+                         'TestSensor', exc_info=1)
+        ]
+
+    def test_cached_read_exception_no_max_age(self):
+        with patch.object(self.cls, 'read') as mock_read:
+            mock_read.side_effect = RuntimeError('foo')
+            with pytest.raises(RuntimeError):
+                self.cls.cached_read()
+
 
 class TestAllSensorClasses(object):
 
@@ -36,9 +36,12 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import sys
+import threading
 import pytest
 
 from rpymostat_sensor.sensors.owfs import OWFS
+from rpymostat_sensor.timing import TimingStats
+from rpymostat_sensor.watcher import DirWatcher
 
 # https://code.google.com/p/mock/issues/detail?id=249
 # py>=3.4 should use unittest.mock not the mock package on pypi
@@ -84,6 +87,87 @@ class TestOWFS(object):
         ]
         assert cls.owfs_path == '/foo/bar'
         assert cls.temp_scale == 'F'
+        assert cls.rescan_interval == 300.0
+        assert cls.check_mtime is False
+        assert cls._sensors is None
+
+    def test_init_rescan_args(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _discover_owfs=DEFAULT,
+            _get_temp_scale=DEFAULT,
+        ) as mocks:
+            mocks['_get_temp_scale'].return_value = 'C'
+            cls = OWFS(owfs_path='/foo/bar', rescan_interval='12.5',
+                       check_mtime='true')
+        assert cls.rescan_interval == 12.5
+        assert cls.check_mtime is True
+
+    def test_init_read_threads(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _discover_owfs=DEFAULT,
+            _get_temp_scale=DEFAULT,
+        ):
+            cls = OWFS(owfs_path='/foo/bar', read_threads='4')
+        assert cls.read_threads == 4
+        assert cls._pool is None
+        assert cls.simultaneous is False
+        assert cls.conversion_delay == 0.75
+        assert cls.read_timeout is None
+        assert cls.quarantine_interval == 30.0
+        assert cls.quarantine_max == 3600.0
+        assert cls._quarantine == {}
+        assert cls._watcher is None
+
+    def test_init_simultaneous(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _discover_owfs=DEFAULT,
+            _get_temp_scale=DEFAULT,
+        ):
+            cls = OWFS(owfs_path='/foo/bar', simultaneous='true',
+                       conversion_delay='0.1')
+        assert cls.simultaneous is True
+        assert cls.conversion_delay == 0.1
+
+    def test_init_read_timeout(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _discover_owfs=DEFAULT,
+            _get_temp_scale=DEFAULT,
+        ):
+            cls = OWFS(owfs_path='/foo/bar', read_timeout='2.5',
+                       quarantine_interval='10', quarantine_max='60')
+        assert cls.read_timeout == 2.5
+        assert cls.quarantine_interval == 10.0
+        assert cls.quarantine_max == 60.0
+
+    def test_init_watch(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _discover_owfs=DEFAULT,
+            _get_temp_scale=DEFAULT,
+        ):
+            with patch('%s.DirWatcher' % pbm, autospec=True) as mock_watch:
+                cls = OWFS(owfs_path='/foo/bar', watch='true')
+        assert mock_watch.mock_calls == [call('/foo/bar')]
+        assert cls._watcher == mock_watch.return_value
+
+    def test_init_read_threads_invalid(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _discover_owfs=DEFAULT,
+            _get_temp_scale=DEFAULT,
+        ):
+            with pytest.raises(RuntimeError):
+                OWFS(owfs_path='/foo/bar', read_threads=0)
 
     def test_init_discover(self):
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
@@ -201,6 +285,7 @@ class TestOWFS(object):
                 res = self.cls.sensors_present()
         assert res is True
         assert mock_find.mock_calls == [call(self.cls)]
+        assert self.cls._sensors == ['A', 'B']
         assert mock_logger.mock_calls == [
             call.debug('Found %d sensors present: %s', 2, ['A', 'B'])
         ]
@@ -216,6 +301,166 @@ class TestOWFS(object):
             call.debug('Found %d sensors present: %s', 0, [])
         ]
 
+    def test_scan_sensors(self):
+        with patch('%s._find_sensors' % pb, autospec=True) as mock_find:
+            with patch('%s._get_mtime' % pb, autospec=True) as mock_mtime:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_find.return_value = ['A']
+                    mock_time.return_value = 123.4
+                    res = self.cls._scan_sensors()
+        assert res == ['A']
+        assert self.cls._sensors == ['A']
+        assert self.cls._scan_time == 123.4
+        assert self.cls._scan_mtime is None
+        assert mock_find.mock_calls == [call(self.cls)]
+        assert mock_mtime.mock_calls == []
+
+    def test_scan_sensors_mtime(self):
+        self.cls.check_mtime = True
+        with patch('%s._find_sensors' % pb, autospec=True) as mock_find:
+            with patch('%s._get_mtime' % pb, autospec=True) as mock_mtime:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_find.return_value = ['A']
+                    mock_time.return_value = 123.4
+                    mock_mtime.return_value = 5678
+                    res = self.cls._scan_sensors()
+        assert res == ['A']
+        assert self.cls._scan_mtime == 5678
+        assert mock_mtime.mock_calls == [call(self.cls)]
+
+    def test_get_mtime(self):
+        with patch('%s.os.stat' % pbm, autospec=True) as mock_stat:
+            mock_stat.return_value.st_mtime = 1234.5
+            res = self.cls._get_mtime()
+        assert res == 1234.5
+        assert mock_stat.mock_calls == [call('/my/path')]
+
+    def test_get_mtime_exception(self):
+        with patch('%s.os.stat' % pbm, autospec=True) as mock_stat:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_stat.side_effect = OSError()
+                res = self.cls._get_mtime()
+        assert res is None
+        assert mock_logger.mock_calls == [
+            call.debug('Exception getting mtime of %s', '/my/path',
+                       exc_info=1)
+        ]
+
+    def test_get_sensors_no_cache(self):
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            mock_scan.return_value = ['A']
+            res = self.cls._get_sensors()
+        assert res == ['A']
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_get_sensors_cached(self):
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s._get_mtime' % pb, autospec=True) as mock_mtime:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_time.return_value = 399.9
+                    res = self.cls._get_sensors()
+        assert res == ['B']
+        assert mock_scan.mock_calls == []
+        assert mock_mtime.mock_calls == []
+
+    def test_get_sensors_watch_unchanged(self):
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        self.cls._watcher = Mock(spec_set=DirWatcher)
+        self.cls._watcher.changed.return_value = False
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s.monotonic_time' % pbm) as mock_time:
+                mock_time.return_value = 399.9
+                res = self.cls._get_sensors()
+        assert res == ['B']
+        assert mock_scan.mock_calls == []
+        assert self.cls._watcher.mock_calls == [call.changed()]
+
+    def test_get_sensors_watch_changed(self):
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        self.cls._watcher = Mock(spec_set=DirWatcher)
+        self.cls._watcher.changed.return_value = True
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s.monotonic_time' % pbm) as mock_time:
+                mock_time.return_value = 399.9
+                mock_scan.return_value = ['A']
+                res = self.cls._get_sensors()
+        assert res == ['A']
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_close(self):
+        watcher = Mock(spec_set=DirWatcher)
+        self.cls._watcher = watcher
+        self.cls.close()
+        assert watcher.mock_calls == [call.close()]
+        assert self.cls._watcher is None
+        self.cls.close()
+        assert watcher.mock_calls == [call.close()]
+
+    def test_close_pool(self):
+        self.cls.read_threads = 2
+        pool = self.cls._get_pool()
+        self.cls.close()
+        assert self.cls._pool is None
+        pool.join()
+        self.cls.close()
+
+    def test_get_sensors_expired(self):
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s.monotonic_time' % pbm) as mock_time:
+                mock_time.return_value = 400.0
+                mock_scan.return_value = ['A']
+                res = self.cls._get_sensors()
+        assert res == ['A']
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_get_sensors_rescan_always(self):
+        self.cls.rescan_interval = 0.0
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s.monotonic_time' % pbm) as mock_time:
+                mock_time.return_value = 100
+                mock_scan.return_value = ['A']
+                res = self.cls._get_sensors()
+        assert res == ['A']
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_get_sensors_mtime_unchanged(self):
+        self.cls.check_mtime = True
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        self.cls._scan_mtime = 1234
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s._get_mtime' % pb, autospec=True) as mock_mtime:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_time.return_value = 101
+                    mock_mtime.return_value = 1234
+                    res = self.cls._get_sensors()
+        assert res == ['B']
+        assert mock_scan.mock_calls == []
+        assert mock_mtime.mock_calls == [call(self.cls)]
+
+    def test_get_sensors_mtime_changed(self):
+        self.cls.check_mtime = True
+        self.cls._sensors = ['B']
+        self.cls._scan_time = 100
+        self.cls._scan_mtime = 1234
+        with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+            with patch('%s._get_mtime' % pb, autospec=True) as mock_mtime:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_time.return_value = 101
+                    mock_mtime.return_value = 5678
+                    mock_scan.return_value = ['A']
+                    res = self.cls._get_sensors()
+        assert res == ['A']
+        assert mock_scan.mock_calls == [call(self.cls)]
+
     def test_find_sensors(self):
         self.cls.owfs_path = '/my/path'
 
@@ -471,6 +716,7 @@ class TestOWFS(object):
         assert m_three.mock_calls[2][1][1] == exc
         assert m_other.mock_calls == []
         assert mock_logger.mock_calls == [
+            call.debug('No cached sensor list; scanning bus'),
             call.debug('Reading temperature from sensor %s at %s', 'sensor1',
                        '/foo/bar/one'),
             call.debug('Got temperature of %s from %s', 11.234, 'sensor1'),
@@ -497,3 +743,352 @@ class TestOWFS(object):
                 'value': None
             }
         }
+
+    def test_read_threaded(self):
+        sensors = [
+            {'address': 'sensor1', 'temp_path': '/foo/bar/one'},
+            {'address': 'sensor2', 'temp_path': '/foo/bar/two'}
+        ]
+        self.cls.read_threads = 4
+        self.cls._sensors = sensors
+        self.cls._scan_time = 0
+        self.cls.rescan_interval = 1000000000000.0
+        mock_pool = Mock()
+        mock_pool.imap_unordered.return_value = [
+            ('sensor1', {'type': None, 'value': 1.0}),
+            ('sensor2', {'type': None, 'value': None})
+        ]
+        with patch('%s._get_pool' % pb, autospec=True) as mock_get_pool:
+            mock_get_pool.return_value = mock_pool
+            res = self.cls.read()
+        assert mock_get_pool.mock_calls == [call(self.cls)]
+        assert len(mock_pool.mock_calls) == 1
+        assert mock_pool.mock_calls[0][0] == 'imap_unordered'
+        reader = mock_pool.mock_calls[0][1][0]
+        assert reader.func == self.cls._read_sensor
+        assert reader.keywords == {'fname': 'temperature'}
+        assert mock_pool.mock_calls[0][1][1] == sensors
+        assert res == {
+            'sensor1': {'type': None, 'value': 1.0},
+            'sensor2': {'type': None, 'value': None}
+        }
+
+    def test_read_threaded_one_sensor(self):
+        sensors = [{'address': 'sensor1', 'temp_path': '/foo/bar/one'}]
+        self.cls.read_threads = 4
+        with patch('%s._get_sensors' % pb, autospec=True) as mock_get:
+            with patch('%s._get_pool' % pb, autospec=True) as mock_get_pool:
+                with patch('%s._read_sensor' % pb, autospec=True) as mock_rs:
+                    mock_get.return_value = sensors
+                    mock_rs.return_value = ('sensor1', {'value': 1.0})
+                    res = self.cls.read()
+        assert mock_get_pool.mock_calls == []
+        assert mock_rs.mock_calls == [
+            call(self.cls, sensors[0], fname='temperature')
+        ]
+        assert res == {'sensor1': {'value': 1.0}}
+
+    def test_read_threaded_real_pool(self):
+        sensors = [
+            {'address': 'sensor%d' % x, 'temp_path': '/foo/%d' % x}
+            for x in range(10)
+        ]
+
+        def se_read(sensor, fname=None):
+            return sensor['address'], {'value': float(sensor['temp_path'][5:])}
+
+        self.cls.read_threads = 3
+        with patch('%s._get_sensors' % pb, autospec=True) as mock_get:
+            with patch.object(self.cls, '_read_sensor') as mock_rs:
+                mock_get.return_value = sensors
+                mock_rs.side_effect = se_read
+                res = self.cls.read()
+        assert res == dict(
+            ('sensor%d' % x, {'value': float(x)}) for x in range(10)
+        )
+        assert self.cls._pool is not None
+        self.cls._pool.terminate()
+
+    def test_read_iter(self):
+        sensors = [
+            {'address': 'sensor1', 'temp_path': '/foo/bar/one'},
+            {'address': 'sensor2', 'temp_path': '/foo/bar/two'}
+        ]
+        with patch('%s._get_sensors' % pb, autospec=True) as mock_get:
+            with patch('%s._read_sensor' % pb, autospec=True) as mock_rs:
+                mock_get.return_value = sensors
+                mock_rs.side_effect = [
+                    ('sensor1', {'value': 1.0}),
+                    ('sensor2', {'value': 2.0})
+                ]
+                gen = self.cls.read_iter()
+                assert mock_rs.mock_calls == []
+                assert next(gen) == ('sensor1', {'value': 1.0})
+                assert len(mock_rs.mock_calls) == 1
+                assert list(gen) == [('sensor2', {'value': 2.0})]
+        assert mock_rs.mock_calls == [
+            call(self.cls, sensors[0], fname='temperature'),
+            call(self.cls, sensors[1], fname='temperature')
+        ]
+
+    def test_get_pool(self):
+        self.cls.read_threads = 3
+        with patch('%s.ThreadPool' % pbm) as mock_tp:
+            res = self.cls._get_pool()
+            res2 = self.cls._get_pool()
+        assert mock_tp.mock_calls == [call(3)]
+        assert res is mock_tp.return_value
+        assert res2 is mock_tp.return_value
+
+    def test_read_simultaneous(self):
+        sensors = [
+            {'address': 'sensor1', 'temp_path': '/foo/bar/one/temperature'},
+            {'address': 'sensor2', 'temp_path': '/foo/bar/two/temperature'}
+        ]
+        self.cls.simultaneous = True
+        with patch('%s._get_sensors' % pb, autospec=True) as mock_get:
+            with patch('%s._trigger_conversion' % pb,
+                       autospec=True) as mock_trigger:
+                with patch('%s._read_sensor' % pb, autospec=True) as mock_rs:
+                    mock_get.return_value = sensors
+                    mock_trigger.return_value = True
+                    mock_rs.side_effect = [
+                        ('sensor1', {'value': 1.0}),
+                        ('sensor2', {'value': 2.0})
+                    ]
+                    res = self.cls.read()
+        assert mock_trigger.mock_calls == [call(self.cls)]
+        assert mock_rs.mock_calls == [
+            call(self.cls, sensors[0], fname='latesttemp'),
+            call(self.cls, sensors[1], fname='latesttemp')
+        ]
+        assert res == {'sensor1': {'value': 1.0}, 'sensor2': {'value': 2.0}}
+
+    def test_read_simultaneous_fallback(self):
+        sensors = [
+            {'address': 'sensor1', 'temp_path': '/foo/bar/one/temperature'}
+        ]
+        self.cls.simultaneous = True
+        with patch('%s._get_sensors' % pb, autospec=True) as mock_get:
+            with patch('%s._trigger_conversion' % pb,
+                       autospec=True) as mock_trigger:
+                with patch('%s._read_sensor' % pb, autospec=True) as mock_rs:
+                    mock_get.return_value = sensors
+                    mock_trigger.return_value = False
+                    mock_rs.return_value = ('sensor1', {'value': 1.0})
+                    self.cls.read()
+        assert mock_trigger.mock_calls == [call(self.cls)]
+        assert mock_rs.mock_calls == [
+            call(self.cls, sensors[0], fname='temperature')
+        ]
+
+    def test_read_sensor_latesttemp(self):
+        sensor = {
+            'address': 'sensor1',
+            'temp_path': '/foo/bar/one/temperature',
+            'type': 'DS18B20'
+        }
+        with patch('%s.open' % pbm, mock_open(read_data=' 21.5 '),
+                   create=True) as mock_opn:
+            res = self.cls._read_sensor(sensor, fname='latesttemp')
+        assert mock_opn.mock_calls[0] == call(
+            '/foo/bar/one/latesttemp', 'r'
+        )
+        assert res == ('sensor1', {'type': 'DS18B20', 'value': 21.5})
+
+    def test_read_sensor_timings(self):
+        sensor = {
+            'address': 'sensor1',
+            'temp_path': '/foo/bar/one/temperature',
+            'type': 'DS18B20'
+        }
+        self.cls.timings = TimingStats()
+        with patch('%s.open' % pbm, mock_open(read_data='21.5'), create=True):
+            self.cls._read_sensor(sensor)
+        assert self.cls.timings.summary('OWFS.read_file')['count'] == 1
+
+    def test_trigger_conversion(self):
+        with patch('%s.os.path.exists' % pbm, autospec=True) as mock_exists:
+            with patch('%s.open' % pbm, mock_open(), create=True) as mock_opn:
+                with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                    mock_exists.return_value = True
+                    res = self.cls._trigger_conversion()
+        assert res is True
+        assert mock_exists.mock_calls == [
+            call('/my/path/simultaneous/temperature')
+        ]
+        assert mock_opn.mock_calls == [
+            call('/my/path/simultaneous/temperature', 'w'),
+            call().__enter__(),
+            call().write('1'),
+            call().__exit__(None, None, None)
+        ]
+        assert mock_sleep.mock_calls == [call(0.75)]
+
+    def test_trigger_conversion_no_file(self):
+        with patch('%s.os.path.exists' % pbm, autospec=True) as mock_exists:
+            with patch('%s.open' % pbm, mock_open(), create=True) as mock_opn:
+                with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                    mock_exists.return_value = False
+                    res = self.cls._trigger_conversion()
+        assert res is False
+        assert mock_opn.mock_calls == []
+        assert mock_sleep.mock_calls == []
+
+    def test_trigger_conversion_exception(self):
+        with patch('%s.os.path.exists' % pbm, autospec=True) as mock_exists:
+            with patch('%s.open' % pbm, mock_open(), create=True) as mock_opn:
+                with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                    mock_exists.return_value = True
+                    mock_opn.side_effect = IOError()
+                    res = self.cls._trigger_conversion()
+        assert res is False
+        assert mock_sleep.mock_calls == []
+
+    def test_read_temp_file_timeout_ok(self):
+        self.cls.read_timeout = 5.0
+        with patch('%s.open' % pbm, mock_open(read_data='21.5'),
+                   create=True) as mock_opn:
+            res = self.cls._read_temp_file('/foo/temperature')
+        assert res == '21.5'
+        assert mock_opn.mock_calls[0] == call('/foo/temperature', 'r')
+
+    def test_read_temp_file_timeout_exception(self):
+        self.cls.read_timeout = 5.0
+        with patch('%s.open' % pbm, create=True) as mock_opn:
+            mock_opn.side_effect = IOError('foo')
+            with pytest.raises(IOError):
+                self.cls._read_temp_file('/foo/temperature')
+
+    def test_read_sensor_timeout(self):
+        release = threading.Event()
+
+        def se_open(path, mode):
+            release.wait(5.0)
+            raise IOError()
+
+        sensor = {
+            'address': 'sensor1',
+            'temp_path': '/foo/bar/one/temperature',
+            'type': 'DS18B20'
+        }
+        self.cls.read_timeout = 0.05
+        try:
+            with patch('%s.open' % pbm, create=True) as mock_opn:
+                with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                    with patch('%s.monotonic_time' % pbm) as mock_time:
+                        mock_opn.side_effect = se_open
+                        mock_time.return_value = 100.0
+                        res = self.cls._read_sensor(sensor)
+        finally:
+            release.set()
+        assert res == ('sensor1', {'type': 'DS18B20', 'value': None})
+        assert mock_logger.mock_calls == [
+            call.debug('Reading temperature from sensor %s at %s', 'sensor1',
+                       '/foo/bar/one/temperature'),
+            call.warning('Read from sensor %s timed out after %ss',
+                         'sensor1', 0.05),
+            call.warning('Quarantining sensor %s for %ss after %d '
+                         'consecutive read timeouts', 'sensor1', 30.0, 1)
+        ]
+        assert self.cls._quarantine['sensor1']['failures'] == 1
+        assert self.cls._quarantine['sensor1']['until'] == 130.0
+
+    def test_read_sensor_quarantined(self):
+        sensor = {
+            'address': 'sensor1',
+            'temp_path': '/foo/bar/one/temperature',
+            'type': 'DS18B20'
+        }
+        self.cls._quarantine['sensor1'] = {
+            'failures': 1, 'until': 130.0, 'thread': None
+        }
+        with patch('%s.open' % pbm, create=True) as mock_opn:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_time.return_value = 110.0
+                    res = self.cls._read_sensor(sensor)
+        assert res == ('sensor1', {'type': 'DS18B20', 'value': None})
+        assert mock_opn.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.debug('Sensor %s is quarantined for another %.1fs; not '
+                       'reading it', 'sensor1', 20.0)
+        ]
+
+    def test_read_sensor_quarantine_released(self):
+        sensor = {
+            'address': 'sensor1',
+            'temp_path': '/foo/bar/one/temperature',
+            'type': 'DS18B20'
+        }
+        thread = Mock(spec_set=threading.Thread)
+        thread.is_alive.return_value = False
+        self.cls._quarantine['sensor1'] = {
+            'failures': 1, 'until': 130.0, 'thread': thread
+        }
+        with patch('%s.open' % pbm, mock_open(read_data='21.5'),
+                   create=True):
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_time.return_value = 140.0
+                    res = self.cls._read_sensor(sensor)
+        assert res == ('sensor1', {'type': 'DS18B20', 'value': 21.5})
+        assert self.cls._quarantine == {}
+        assert mock_logger.mock_calls[-1] == call.info(
+            'Sensor %s responded; releasing it from quarantine', 'sensor1'
+        )
+
+    def test_read_sensor_still_blocked(self):
+        sensor = {
+            'address': 'sensor1',
+            'temp_path': '/foo/bar/one/temperature',
+            'type': 'DS18B20'
+        }
+        thread = Mock(spec_set=threading.Thread)
+        thread.is_alive.return_value = True
+        self.cls.quarantine_max = 100.0
+        self.cls._quarantine['sensor1'] = {
+            'failures': 2, 'until': 130.0, 'thread': thread
+        }
+        with patch('%s.open' % pbm, create=True) as mock_opn:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                with patch('%s.monotonic_time' % pbm) as mock_time:
+                    mock_time.return_value = 140.0
+                    res = self.cls._read_sensor(sensor)
+        assert res == ('sensor1', {'type': 'DS18B20', 'value': None})
+        assert mock_opn.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.warning('Previous read from sensor %s is still blocked',
+                         'sensor1'),
+            call.warning('Quarantining sensor %s for %ss after %d '
+                         'consecutive read timeouts', 'sensor1', 100.0, 3)
+        ]
+        assert self.cls._quarantine['sensor1'] == {
+            'failures': 3, 'until': 240.0, 'thread': thread
+        }
+
+    def test_quarantine_sensor_many_failures(self):
+        thread = Mock(spec_set=threading.Thread)
+        self.cls._quarantine['sensor1'] = {
+            'failures': 1030, 'until': 130.0, 'thread': thread
+        }
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.monotonic_time' % pbm) as mock_time:
+                mock_time.return_value = 140.0
+                self.cls._quarantine_sensor('sensor1', thread)
+        assert self.cls._quarantine['sensor1'] == {
+            'failures': 1031, 'until': 3740.0, 'thread': thread
+        }
+
+    def test_quarantine_sensor_backoff(self):
+        thread = Mock(spec_set=threading.Thread)
+        self.cls.quarantine_interval = 30.0
+        self.cls.quarantine_max = 100.0
+        res = []
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.monotonic_time' % pbm) as mock_time:
+                mock_time.return_value = 0.0
+                for _ in range(5):
+                    self.cls._quarantine_sensor('sensor1', thread)
+                    res.append(self.cls._quarantine['sensor1']['until'])
+        assert res == [30.0, 60.0, 100.0, 100.0, 100.0]
@@ -0,0 +1,377 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import socket
+import struct
+import threading
+
+from rpymostat_sensor.sensors.owserver import (
+    OWServer, OWServerError, MSG_READ, MSG_PRESENCE, MSG_DIRALL,
+    FLG_PERSISTENCE
+)
+from rpymostat_sensor.timing import TimingStats
+
+try:
+    import socketserver
+except ImportError:  # python 2
+    import SocketServer as socketserver
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.sensors.owserver'
+pb = '%s.OWServer' % pbm
+
+HEADER = struct.Struct('>iiiiii')
+
+TREE = {
+    '/28.000000000001/temperature': b'     21.5',
+    '/28.000000000001/address': b'2800000000000100',
+    '/28.000000000001/alias': b'kitchen',
+    '/28.000000000001/type': b'DS18B20',
+    '/28.000000000002/temperature': b'    -3.25',
+    '/28.000000000002/address': b'2800000000000201',
+    '/28.000000000002/type': b'DS18B20',
+    '/uncached/28.000000000001/temperature': b'     22.5',
+    '/uncached/28.000000000002/temperature': b'    -4.25',
+    # not a temperature sensor
+    '/01.000000000003/address': b'0100000000000302',
+    '/01.000000000003/type': b'DS2401',
+    '/bus.0/interface': b'foo',
+    '/settings/units': b''
+}
+
+
+class StubOWServer(object):
+    """
+    Minimal owserver implementation serving READ, PRESENCE and DIRALL of an
+    in-memory tree.
+    """
+
+    def __init__(self, tree, persistent=True, ping=False, errors=[]):
+        self.tree = tree
+        self.persistent = persistent
+        self.ping = ping
+        self.errors = errors
+        self.connections = 0
+        self.requests = []
+        stub = self
+
+        class Handler(socketserver.BaseRequestHandler):
+
+            def handle(self):
+                stub.connections += 1
+                while stub.handle_one(self.request):
+                    pass
+
+        self.server = socketserver.ThreadingTCPServer(
+            ('127.0.0.1', 0), Handler
+        )
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        t = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.01}
+        )
+        t.daemon = True
+        t.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _recv(self, sock, length):
+        buf = b''
+        while len(buf) < length:
+            chunk = sock.recv(length - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return buf
+
+    def handle_one(self, sock):
+        hdr = self._recv(sock, HEADER.size)
+        if hdr is None:
+            return False
+        _, plen, msg_type, flags, size, offset = HEADER.unpack(hdr)
+        path = self._recv(sock, plen).rstrip(b'\x00').decode('utf-8')
+        self.requests.append((msg_type, path))
+        ret = 0
+        data = b''
+        if msg_type == MSG_DIRALL:
+            names = sorted(set(
+                '/' + p.split('/')[1] for p in self.tree
+                if not p.startswith('/uncached/')
+            ))
+            data = ','.join(names).encode('utf-8') + b'\x00'
+        elif path not in self.tree:
+            ret = -1
+        elif msg_type == MSG_READ and path in self.errors:
+            ret = -1
+        elif msg_type == MSG_READ:
+            data = self.tree[path]
+            ret = len(data)
+        if self.ping:
+            sock.sendall(HEADER.pack(0, -1, 0, flags, 0, 0))
+        rflags = flags & FLG_PERSISTENCE if self.persistent else 0
+        sock.sendall(
+            HEADER.pack(0, len(data), ret, rflags, len(data), 0) + data
+        )
+        return self.persistent
+
+
+class TestOWServer(object):
+
+    def setup(self):
+        self.stub = None
+        self.cls = OWServer(port=1)
+
+    def teardown(self):
+        self.cls._close()
+        if self.stub is not None:
+            self.stub.stop()
+
+    def start_stub(self, **kwargs):
+        self.stub = StubOWServer(TREE, **kwargs)
+        self.cls.host = '127.0.0.1'
+        self.cls.port = self.stub.port
+
+    def test_init_defaults(self):
+        cls = OWServer()
+        assert cls.host == 'localhost'
+        assert cls.port == 4304
+        assert cls.timeout == 5.0
+        assert cls.rescan_interval == 300.0
+        assert cls.uncached is False
+        assert cls._sock is None
+        assert cls._persistent is True
+        assert cls._sensors is None
+
+    def test_init_strings(self):
+        cls = OWServer(host='foo', port='1234', timeout='2',
+                       rescan_interval='10', uncached='true')
+        assert cls.host == 'foo'
+        assert cls.port == 1234
+        assert cls.timeout == 2.0
+        assert cls.rescan_interval == 10.0
+        assert cls.uncached is True
+
+    def test_sensors_present(self):
+        self.start_stub()
+        assert self.cls.sensors_present() is True
+        assert self.cls._sensors == [
+            {
+                'path': '/28.000000000001',
+                'address': '2800000000000100',
+                'alias': 'kitchen',
+                'type': 'DS18B20'
+            },
+            {
+                'path': '/28.000000000002',
+                'address': '2800000000000201',
+                'type': 'DS18B20'
+            }
+        ]
+        # one connection; DIRALL then 4 pipelined requests per device
+        assert self.stub.connections == 1
+        assert len(self.stub.requests) == 13
+        assert self.stub.requests[:2] == [
+            (MSG_DIRALL, '/'),
+            (MSG_PRESENCE, '/01.000000000003/temperature')
+        ]
+
+    def test_sensors_present_none(self):
+        self.stub = StubOWServer({'/bus.0/interface': b'foo'})
+        self.cls.host = '127.0.0.1'
+        self.cls.port = self.stub.port
+        assert self.cls.sensors_present() is False
+
+    def test_sensors_present_no_server(self):
+        s = socket.socket()
+        s.bind(('127.0.0.1', 0))
+        self.cls.host = '127.0.0.1'
+        self.cls.port = s.getsockname()[1]
+        s.close()
+        assert self.cls.sensors_present() is False
+
+    def test_read(self):
+        self.start_stub()
+        self.cls.timings = TimingStats()
+        self.cls.sensors_present()
+        res = self.cls.read()
+        assert res == {
+            '2800000000000100': {
+                'type': 'DS18B20', 'alias': 'kitchen', 'value': 21.5
+            },
+            '2800000000000201': {'type': 'DS18B20', 'value': -3.25}
+        }
+        assert self.stub.connections == 1
+        assert self.stub.requests[-2:] == [
+            (MSG_READ, '/28.000000000001/temperature'),
+            (MSG_READ, '/28.000000000002/temperature')
+        ]
+        assert self.cls.timings.summary('OWServer.read')['count'] == 1
+
+    def test_concurrent(self):
+        self.start_stub()
+        self.cls.sensors_present()
+        errors = []
+
+        def reader():
+            for _ in range(20):
+                res = self.cls.read()
+                if res['2800000000000100']['value'] != 21.5 or \
+                        res['2800000000000201']['value'] != -3.25:
+                    errors.append(res)
+
+        def checker():
+            for _ in range(20):
+                if not self.cls.sensors_present():
+                    errors.append('not present')
+
+        threads = [
+            threading.Thread(target=reader), threading.Thread(target=checker)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+
+    def test_close(self):
+        self.start_stub()
+        self.cls.sensors_present()
+        assert self.cls._sock is not None
+        self.cls.close()
+        assert self.cls._sock is None
+        self.cls.close()
+
+    def test_read_uncached(self):
+        self.start_stub()
+        self.cls.uncached = True
+        res = self.cls.read()
+        assert res['2800000000000100']['value'] == 22.5
+        assert res['2800000000000201']['value'] == -4.25
+
+    def test_read_error(self):
+        self.start_stub(errors=['/28.000000000002/temperature'])
+        res = self.cls.read()
+        assert res['2800000000000100']['value'] == 21.5
+        assert res['2800000000000201']['value'] is None
+
+    def test_read_not_persistent(self):
+        self.start_stub(persistent=False)
+        res = self.cls.read()
+        assert res['2800000000000100']['value'] == 21.5
+        assert res['2800000000000201']['value'] == -3.25
+        assert self.cls._persistent is False
+        # first connection answered only the DIRALL, then one per request
+        assert self.stub.connections == len(self.stub.requests)
+
+    def test_read_ping(self):
+        self.start_stub(ping=True)
+        res = self.cls.read()
+        assert res['2800000000000100']['value'] == 21.5
+
+    def test_read_reconnect(self):
+        self.start_stub()
+        self.cls.read()
+        # connection dropped out from under us
+        self.cls._sock.shutdown(socket.SHUT_RDWR)
+        res = self.cls.read()
+        assert res['2800000000000100']['value'] == 21.5
+        assert self.stub.connections == 2
+
+    def test_read_server_gone(self):
+        self.start_stub()
+        self.cls.sensors_present()
+        self.cls._close()
+        self.stub.stop()
+        self.cls.port = 1
+        self.stub = None
+        with patch('%s.socket.create_connection' % pbm) as mock_conn:
+            mock_conn.side_effect = socket.error()
+            res = self.cls.read()
+        assert res == {
+            '2800000000000100': {
+                'type': 'DS18B20', 'alias': 'kitchen', 'value': None
+            },
+            '2800000000000201': {'type': 'DS18B20', 'value': None}
+        }
+        assert len(mock_conn.mock_calls) == 2
+
+    def test_get_sensors_cached(self):
+        self.cls._sensors = [{'path': '/foo'}]
+        self.cls._scan_time = 100.0
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 200.0
+            with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+                res = self.cls._get_sensors()
+        assert res == [{'path': '/foo'}]
+        assert mock_scan.mock_calls == []
+
+    def test_get_sensors_expired(self):
+        self.cls._sensors = [{'path': '/foo'}]
+        self.cls._scan_time = 100.0
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 400.0
+            with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+                mock_scan.return_value = [{'path': '/bar'}]
+                res = self.cls._get_sensors()
+        assert res == [{'path': '/bar'}]
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_dirall_error(self):
+        with patch('%s._request' % pb, autospec=True) as mock_req:
+            mock_req.return_value = [(-1, b'')]
+            try:
+                self.cls._find_sensors()
+            except OWServerError:
+                pass
+            else:
+                raise AssertionError('OWServerError not raised')
+
+    def test_message(self):
+        res = OWServer._message(MSG_READ, '/foo')
+        assert res == HEADER.pack(0, 5, 2, 0x104, 8192, 0) + b'/foo\x00'
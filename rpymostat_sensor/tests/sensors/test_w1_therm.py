@@ -0,0 +1,267 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+from rpymostat_sensor.sensors.w1_therm import W1Therm
+from rpymostat_sensor.timing import TimingStats
+from rpymostat_sensor.watcher import DirWatcher
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.sensors.w1_therm'
+pb = '%s.W1Therm' % pbm
+
+W1_SLAVE = '72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n' \
+           '72 01 4b 46 7f ff 0e 10 57 t=23125\n'
+W1_SLAVE_BADCRC = '72 01 4b 46 7f ff 0e 10 57 : crc=57 NO\n' \
+                  '72 01 4b 46 7f ff 0e 10 57 t=23125\n'
+
+
+class TestW1Therm(object):
+
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+        self.cls = W1Therm(devices_path=self.path)
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, fname, content):
+        d = os.path.join(self.path, name)
+        if not os.path.exists(d):
+            os.mkdir(d)
+        with open(os.path.join(d, fname), 'w') as fh:
+            fh.write(content)
+
+    def make_tree(self):
+        self.write('28-0123456789ab', 'w1_slave', W1_SLAVE)
+        self.write('28-0123456789ab', 'temperature', '23125\n')
+        self.write('10-00000000000c', 'w1_slave', W1_SLAVE_BADCRC)
+        # not a temperature sensor family
+        self.write('01-000000000001', 'id', 'foo')
+        # no readable files
+        os.mkdir(os.path.join(self.path, '28-000000000002'))
+        self.write('w1_bus_master1', 'therm_bulk_read', '0\n')
+
+    def test_init(self):
+        cls = W1Therm()
+        assert cls.devices_path == '/sys/bus/w1/devices'
+        assert cls.rescan_interval == 300.0
+        assert cls.bulk_read is False
+        assert cls.bulk_timeout == 1.5
+        assert cls._sensors is None
+        assert cls._watcher is None
+
+    def test_init_strings(self):
+        cls = W1Therm(rescan_interval='10', bulk_read='true',
+                      bulk_timeout='2')
+        assert cls.rescan_interval == 10.0
+        assert cls.bulk_read is True
+        assert cls.bulk_timeout == 2.0
+
+    def test_init_watch(self):
+        cls = W1Therm(devices_path=self.path, watch='true')
+        assert isinstance(cls._watcher, DirWatcher)
+        assert cls._watcher.path == self.path
+        cls._watcher.close()
+
+    def test_close(self):
+        cls = W1Therm(devices_path=self.path, watch='true')
+        watcher = cls._watcher
+        cls.close()
+        assert cls._watcher is None
+        assert watcher.method == 'mtime'
+        cls.close()
+
+    def test_sensors_present(self):
+        self.make_tree()
+        assert self.cls.sensors_present() is True
+        assert self.cls._sensors == [
+            {
+                'path': os.path.join(self.path, '10-00000000000c'),
+                'address': '10-00000000000c',
+                'type': 'DS18S20',
+                'temperature': False
+            },
+            {
+                'path': os.path.join(self.path, '28-0123456789ab'),
+                'address': '28-0123456789ab',
+                'type': 'DS18B20',
+                'temperature': True
+            }
+        ]
+
+    def test_sensors_present_none(self):
+        assert self.cls.sensors_present() is False
+
+    def test_sensors_present_no_w1(self):
+        self.cls.devices_path = os.path.join(self.path, 'nonexistent')
+        assert self.cls.sensors_present() is False
+        assert self.cls._bus_masters() == []
+
+    def test_read(self):
+        self.make_tree()
+        self.cls.timings = TimingStats()
+        res = self.cls.read()
+        assert res == {
+            '28-0123456789ab': {'type': 'DS18B20', 'value': 23.125},
+            '10-00000000000c': {'type': 'DS18S20', 'value': None}
+        }
+        assert self.cls.timings.summary('W1Therm.read_file')['count'] == 2
+        # not triggered
+        with open(os.path.join(
+                self.path, 'w1_bus_master1', 'therm_bulk_read')) as fh:
+            assert fh.read() == '0\n'
+
+    def test_read_iter(self):
+        self.make_tree()
+        res = list(self.cls.read_iter())
+        assert sorted(res) == [
+            ('10-00000000000c', {'type': 'DS18S20', 'value': None}),
+            ('28-0123456789ab', {'type': 'DS18B20', 'value': 23.125})
+        ]
+
+    def test_read_bad_temperature(self):
+        self.write('28-0123456789ab', 'temperature', '\n')
+        assert self.cls.read() == {
+            '28-0123456789ab': {'type': 'DS18B20', 'value': None}
+        }
+
+    def test_read_bulk(self):
+        self.make_tree()
+        self.cls.bulk_read = True
+        with patch('%s._bulk_convert' % pb, autospec=True) as mock_bulk:
+            res = self.cls.read()
+        assert mock_bulk.mock_calls == [call(self.cls)]
+        assert res['28-0123456789ab']['value'] == 23.125
+
+    def test_bulk_convert(self):
+        self.make_tree()
+        bulk = os.path.join(self.path, 'w1_bus_master1', 'therm_bulk_read')
+        with patch('%s._read_file' % pb, autospec=True) as mock_read:
+            with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                mock_read.side_effect = ['-1', '-1', '1']
+                res = self.cls._bulk_convert()
+        assert res is True
+        with open(bulk) as fh:
+            assert fh.read() == 'trigger\n'
+        assert mock_read.mock_calls == [call(self.cls, bulk)] * 3
+        assert mock_sleep.mock_calls == [call(0.05), call(0.05)]
+
+    def test_bulk_convert_timeout(self):
+        self.make_tree()
+        with patch('%s._read_file' % pb, autospec=True) as mock_read:
+            with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                with patch('%s.monotonic_time' % pbm) as mock_mono:
+                    with patch('%s.logger' % pbm, autospec=True) as mock_log:
+                        mock_mono.side_effect = [10.0, 10.5, 11.0, 11.5]
+                        mock_read.return_value = '-1'
+                        res = self.cls._bulk_convert()
+        assert res is True
+        assert len(mock_sleep.mock_calls) == 2
+        assert mock_log.mock_calls[-1] == call.warning(
+            'Bulk conversion via %s did not finish within %ss',
+            os.path.join(self.path, 'w1_bus_master1', 'therm_bulk_read'),
+            1.5
+        )
+
+    def test_bulk_convert_unsupported(self):
+        self.write('28-0123456789ab', 'w1_slave', W1_SLAVE)
+        os.mkdir(os.path.join(self.path, 'w1_bus_master1'))
+        assert self.cls._bulk_convert() is False
+
+    def test_get_sensors_cached(self):
+        self.cls._sensors = [{'address': 'foo'}]
+        self.cls._scan_time = 100.0
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 200.0
+            with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+                res = self.cls._get_sensors()
+        assert res == [{'address': 'foo'}]
+        assert mock_scan.mock_calls == []
+
+    def test_get_sensors_watch(self):
+        self.cls._sensors = [{'address': 'foo'}]
+        self.cls._scan_time = 100.0
+        self.cls._watcher = DirWatcher(self.path)
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 200.0
+            with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+                mock_scan.return_value = [{'address': 'bar'}]
+                res1 = self.cls._get_sensors()
+                os.mkdir(os.path.join(self.path, '28-0123456789ab'))
+                os.utime(self.path, (1.0, 1.0))
+                res2 = self.cls._get_sensors()
+        self.cls._watcher.close()
+        assert res1 == [{'address': 'foo'}]
+        assert res2 == [{'address': 'bar'}]
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_get_sensors_expired(self):
+        self.cls._sensors = [{'address': 'foo'}]
+        self.cls._scan_time = 100.0
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 400.0
+            with patch('%s._scan_sensors' % pb, autospec=True) as mock_scan:
+                mock_scan.return_value = [{'address': 'bar'}]
+                res = self.cls._get_sensors()
+        assert res == [{'address': 'bar'}]
+        assert mock_scan.mock_calls == [call(self.cls)]
+
+    def test_parse_w1_slave(self):
+        assert W1Therm._parse_w1_slave('a', W1_SLAVE) == 23.125
+        assert W1Therm._parse_w1_slave(
+            'a', W1_SLAVE.replace('t=23125', 't=-1250')) == -1.25
+
+    def test_parse_w1_slave_errors(self):
+        assert W1Therm._parse_w1_slave('a', None) is None
+        assert W1Therm._parse_w1_slave('a', W1_SLAVE_BADCRC) is None
+        assert W1Therm._parse_w1_slave('a', 'foo') is None
+        assert W1Therm._parse_w1_slave(
+            'a', W1_SLAVE.replace('t=23125', '')) is None
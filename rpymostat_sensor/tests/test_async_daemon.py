@@ -0,0 +1,371 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import time
+import pytest
+
+from rpymostat_sensor.async_daemon import AsyncSensorDaemon
+from rpymostat_sensor.scheduler import FixedRateScheduler
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, MagicMock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, MagicMock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.async_daemon'
+pb = '%s.AsyncSensorDaemon' % pbm
+
+no_asyncio = pytest.mark.skipif(
+    sys.version_info < (3, 4), reason='asyncio requires Python 3.4+'
+)
+
+
+@no_asyncio
+class TestAsyncSensorDaemon(object):
+
+    def setup(self):
+        with patch.multiple(
+            'rpymostat_sensor.sensor_daemon.SensorDaemon',
+            autospec=True,
+            find_host_id=DEFAULT,
+            discover_engine=DEFAULT,
+            discover_sensors=DEFAULT,
+        ) as mocks:
+            mocks['find_host_id'].return_value = 'myhostid'
+            mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+            mocks['discover_sensors'].return_value = [Mock()]
+            self.cls = AsyncSensorDaemon(interval=0.01)
+
+    def test_init(self):
+        assert self.cls.interval == 0.01
+        assert self.cls.host_id == 'myhostid'
+        assert self.cls.loop is None
+        assert self.cls._read_future is None
+        assert self.cls._send_futures == set()
+
+    def test_init_no_asyncio(self):
+        with patch('%s.asyncio' % pbm, None):
+            with pytest.raises(RuntimeError):
+                AsyncSensorDaemon(interval=0.01)
+
+    def test_run(self):
+        sent = []
+        stamps = []
+
+        def se_send(data, timestamp=None):
+            sent.append(data)
+            stamps.append(timestamp)
+            if len(sent) == 3:
+                self.cls.loop.call_soon_threadsafe(self.cls.loop.stop)
+            return True
+
+        with patch.multiple(
+            pb,
+            read_sensors=DEFAULT,
+            send_data=DEFAULT
+        ) as mocks:
+            mocks['read_sensors'].side_effect = [
+                {'foo': 1}, {'foo': 2}, {'foo': 3}, {'foo': 4}, {'foo': 5}
+            ]
+            mocks['send_data'].side_effect = se_send
+            self.cls.run()
+        assert sent == [{'foo': 1}, {'foo': 2}, {'foo': 3}]
+        assert stamps == sorted(stamps)
+        assert None not in stamps
+        assert self.cls.loop.is_closed()
+
+    def test_run_sends_in_order(self):
+        sent = []
+        active = []
+        overlaps = []
+
+        def se_send(data, timestamp=None):
+            if active:
+                overlaps.append(data)
+            active.append(data)
+            # slower than the read interval, so sends queue up
+            time.sleep(0.03)
+            active.remove(data)
+            sent.append(data)
+            if len(sent) == 4:
+                self.cls.loop.call_soon_threadsafe(self.cls.loop.stop)
+            return True
+
+        self.cls.http_pool_size = 4
+        with patch.multiple(
+            pb,
+            read_sensors=DEFAULT,
+            send_data=DEFAULT
+        ) as mocks:
+            mocks['read_sensors'].side_effect = [
+                {'foo': x} for x in range(100)
+            ]
+            mocks['send_data'].side_effect = se_send
+            with patch('%s.logger' % pbm, autospec=True):
+                self.cls.run()
+        assert overlaps == []
+        # the update waiting behind the last PUT is sent on shutdown
+        assert len(sent) >= 5
+        assert self.cls._pending_send is None
+        # samples that arrive while a PUT is in progress are coalesced,
+        # but updates are still sent in order
+        foos = [x['foo'] for x in sent]
+        assert foos == sorted(set(foos))
+        assert foos[0] == 0
+        assert foos[-1] > len(foos)
+
+    def test_tick_previous_read_running(self):
+        self.cls.loop = Mock()
+        self.cls._read_future = Mock()
+        self.cls._read_future.done.return_value = False
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._tick()
+        assert self.cls.loop.mock_calls == [
+            call.call_later(0.01, self.cls._tick)
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning('Sensor read from previous interval still running; '
+                         'skipping this interval')
+        ]
+
+    def test_tick(self):
+        self.cls.loop = Mock()
+        self.cls._read_executor = Mock()
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1234.5
+                self.cls._tick()
+        fut = self.cls.loop.run_in_executor.return_value
+        assert self.cls.loop.mock_calls[:2] == [
+            call.call_later(0.01, self.cls._tick),
+            call.run_in_executor(self.cls._read_executor,
+                                 self.cls.read_sensors)
+        ]
+        assert self.cls._read_future == fut
+        assert len(fut.add_done_callback.mock_calls) == 1
+        cb = fut.add_done_callback.mock_calls[0][1][0]
+        assert cb.func == self.cls._read_done
+        assert cb.keywords == {'timestamp': 1234.5}
+
+    def test_tick_adaptive(self):
+        self.cls.loop = Mock()
+        self.cls._read_executor = Mock()
+        self.cls.adaptive = Mock(interval=4.0)
+        with patch('%s.logger' % pbm, autospec=True):
+            self.cls._tick()
+        assert self.cls.loop.mock_calls[0] == call.call_later(
+            4.0, self.cls._tick
+        )
+
+    def test_tick_fixed_rate(self):
+        self.cls.loop = Mock()
+        self.cls._read_executor = Mock()
+        self.cls.scheduler = Mock()
+        self.cls.scheduler.next_deadline.return_value = 1234.5
+        with patch('%s.logger' % pbm, autospec=True):
+            self.cls._tick()
+        assert self.cls.loop.mock_calls[0] == call.call_at(
+            1234.5, self.cls._tick
+        )
+        assert self.cls.scheduler.mock_calls == [call.next_deadline()]
+
+    def test_run_fixed_rate(self):
+        sent = []
+
+        def se_send(data, timestamp=None):
+            sent.append(data)
+            if len(sent) == 2:
+                self.cls.loop.call_soon_threadsafe(self.cls.loop.stop)
+            return True
+
+        self.cls.scheduler = FixedRateScheduler(0.01, align=False)
+        with patch.multiple(
+            pb,
+            read_sensors=DEFAULT,
+            send_data=DEFAULT
+        ) as mocks:
+            mocks['read_sensors'].side_effect = [
+                {'foo': 1}, {'foo': 2}, {'foo': 3}, {'foo': 4}
+            ]
+            mocks['send_data'].side_effect = se_send
+            self.cls.run()
+        assert sent == [{'foo': 1}, {'foo': 2}]
+
+    def test_read_done(self):
+        self.cls.loop = Mock()
+        self.cls._send_executor = Mock()
+        future = Mock()
+        future.result.return_value = {'foo': 'bar'}
+        self.cls._read_done(future, timestamp=1234.5)
+        send_fut = self.cls.loop.run_in_executor.return_value
+        assert len(self.cls.loop.mock_calls) == 2
+        name, args, kwargs = self.cls.loop.mock_calls[0]
+        assert name == 'run_in_executor'
+        assert args[0] == self.cls._send_executor
+        assert args[1].func == self.cls.send_data
+        assert args[1].args == ({'foo': 'bar'},)
+        assert args[1].keywords == {'timestamp': 1234.5}
+        assert self.cls.loop.mock_calls[1] == call.run_in_executor(
+        ).add_done_callback(self.cls._send_done)
+        assert self.cls._send_futures == set([send_fut])
+
+    def test_read_done_adaptive(self):
+        self.cls.loop = Mock()
+        self.cls._send_executor = Mock()
+        self.cls.adaptive = Mock()
+        future = Mock()
+        future.result.return_value = {'sensors': {'s1': {'value': 1.0}}}
+        self.cls._read_done(future)
+        assert self.cls.adaptive.mock_calls == [
+            call.update({'s1': {'value': 1.0}})
+        ]
+
+    def test_read_done_exception(self):
+        self.cls.loop = Mock()
+        future = Mock()
+        future.result.side_effect = RuntimeError()
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._read_done(future)
+        assert self.cls.loop.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.exception('Exception reading sensors')
+        ]
+
+    def test_read_done_nothing_due(self):
+        self.cls.loop = Mock()
+        self.cls.adaptive = Mock()
+        future = Mock()
+        future.result.return_value = None
+        self.cls._read_done(future)
+        assert self.cls.loop.mock_calls == []
+        assert self.cls.adaptive.mock_calls == []
+        assert self.cls._send_futures == set()
+
+    def test_read_done_send_in_progress(self):
+        self.cls.loop = Mock()
+        self.cls._send_futures = set([Mock()])
+        future = Mock()
+        future.result.return_value = {'foo': 'bar'}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._read_done(future, timestamp=1234.5)
+        assert self.cls.loop.mock_calls == []
+        assert len(self.cls._send_futures) == 1
+        assert self.cls._pending_send == ({'foo': 'bar'}, 1234.5)
+        assert mock_logger.mock_calls == [
+            call.warning('PUT to the Engine already in progress; queueing '
+                         'this update')
+        ]
+
+    def test_read_done_replaces_pending(self):
+        self.cls.loop = Mock()
+        self.cls._send_futures = set([Mock()])
+        self.cls._pending_send = ({'foo': 'old'}, 1200.0)
+        future = Mock()
+        future.result.return_value = {'foo': 'bar'}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._read_done(future, timestamp=1234.5)
+        assert self.cls.loop.mock_calls == []
+        assert len(self.cls._send_futures) == 1
+        assert self.cls._pending_send == ({'foo': 'bar'}, 1234.5)
+        assert mock_logger.mock_calls == [
+            call.warning('PUT to the Engine already in progress; replacing '
+                         'queued update with newer data')
+        ]
+
+    def test_read_done_send_in_progress_buffer(self):
+        self.cls.loop = Mock()
+        self.cls.buffer = MagicMock()
+        self.cls.buffer.__len__.return_value = 3
+        self.cls._send_futures = set([Mock()])
+        future = Mock()
+        future.result.return_value = {'sensors': {'s1': {'value': 1.0}}}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._read_done(future, timestamp=1234.5)
+        assert self.cls.loop.mock_calls == []
+        assert self.cls._pending_send is None
+        assert self.cls.buffer.push.mock_calls == [
+            call(1234.5, {'s1': {'value': 1.0}})
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning('PUT to the Engine already in progress; stored '
+                         'sensor data in send buffer (%d entries)', 3)
+        ]
+
+    def test_send_done(self):
+        future = Mock()
+        self.cls._send_futures = set([future])
+        with patch('%s.log_timings' % pb, autospec=True) as mock_log:
+            with patch('%s.update_metrics' % pb, autospec=True) as mock_upd:
+                self.cls._send_done(future)
+        assert self.cls._send_futures == set()
+        assert mock_log.mock_calls == [call(self.cls)]
+        assert mock_upd.mock_calls == [call(self.cls)]
+
+    def test_send_done_pending(self):
+        future = Mock()
+        self.cls._send_futures = set([future])
+        self.cls._pending_send = ({'foo': 'bar'}, 1234.5)
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _start_send=DEFAULT,
+            log_timings=DEFAULT,
+            update_metrics=DEFAULT
+        ) as mocks:
+            self.cls._send_done(future)
+        assert self.cls._send_futures == set()
+        assert self.cls._pending_send is None
+        assert mocks['_start_send'].mock_calls == [
+            call(self.cls, {'foo': 'bar'}, 1234.5)
+        ]
+
+    def test_send_done_exception(self):
+        future = Mock()
+        future.result.side_effect = RuntimeError()
+        self.cls._send_futures = set([future])
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._send_done(future)
+        assert self.cls._send_futures == set()
+        assert mock_logger.mock_calls == [
+            call.exception('Exception sending data to Engine')
+        ]
@@ -0,0 +1,123 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from rpymostat_sensor.buffer import SendBuffer
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.buffer'
+
+
+class TestSendBuffer(object):
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'buffer.sqlite')
+        self.cls = SendBuffer(self.path)
+
+    def teardown(self):
+        self.cls.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_init(self):
+        assert self.cls.path == self.path
+        assert self.cls.max_entries == 10000
+        assert self.cls.max_bytes is None
+        assert len(self.cls) == 0
+        assert os.path.exists(self.path)
+
+    def test_push_peek_remove(self):
+        self.cls.push(1.5, {'s1': {'value': 1.0}})
+        self.cls.push(2.5, {'s1': {'value': 2.0}})
+        self.cls.push(3.5, {'s1': {'value': 3.0}})
+        assert len(self.cls) == 3
+        res = self.cls.peek(2)
+        assert [(r[1], r[2]) for r in res] == [
+            (1.5, {'s1': {'value': 1.0}}),
+            (2.5, {'s1': {'value': 2.0}})
+        ]
+        self.cls.remove([r[0] for r in res])
+        assert len(self.cls) == 1
+        res = self.cls.peek(2)
+        assert [(r[1], r[2]) for r in res] == [(3.5, {'s1': {'value': 3.0}})]
+
+    def test_persists(self):
+        self.cls.push(1.5, {'s1': {'value': 1.0}})
+        self.cls.close()
+        self.cls = SendBuffer(self.path)
+        assert len(self.cls) == 1
+        assert self.cls.peek(10)[0][1:] == (1.5, {'s1': {'value': 1.0}})
+
+    def test_evict_max_entries(self):
+        self.cls.max_entries = 2
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            for x in range(4):
+                self.cls.push(float(x), {'s1': {'value': x}})
+        assert len(self.cls) == 2
+        assert [r[1] for r in self.cls.peek(10)] == [2.0, 3.0]
+        assert mock_logger.mock_calls == [
+            call.warning('Send buffer full; evicted %d oldest entries', 1),
+            call.warning('Send buffer full; evicted %d oldest entries', 1)
+        ]
+
+    def test_evict_max_bytes(self):
+        self.cls.max_entries = None
+        # each entry is 20 bytes of JSON
+        self.cls.max_bytes = 45
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            for x in range(4):
+                self.cls.push(float(x), {'s1': {'value': x}})
+        assert [r[1] for r in self.cls.peek(10)] == [2.0, 3.0]
+        assert mock_logger.mock_calls == [
+            call.warning('Send buffer over %d bytes; evicted %d oldest '
+                         'entries', 45, 1),
+            call.warning('Send buffer over %d bytes; evicted %d oldest '
+                         'entries', 45, 1)
+        ]
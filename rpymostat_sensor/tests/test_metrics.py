@@ -0,0 +1,171 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import socket
+
+from rpymostat_sensor.metrics import (
+    MetricsExporter, _escape, _labels, CONTENT_TYPE
+)
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.metrics'
+pb = '%s.MetricsExporter' % pbm
+
+
+class TestHelpers(object):
+
+    def test_escape(self):
+        assert _escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+    def test_labels(self):
+        assert _labels(b='2', a='1', c=None) == '{a="1",b="2"}'
+
+    def test_labels_empty(self):
+        assert _labels(a=None) == ''
+
+
+class TestMetricsExporter(object):
+
+    def setup(self):
+        self.cls = MetricsExporter(9100)
+
+    def test_init(self):
+        assert self.cls.port == 9100
+        assert self.cls.addr == ''
+        assert self.cls.server is None
+        assert self.cls.body == b'# EOF\n'
+
+    def test_render(self):
+        readings = {
+            's2': {'type': 'DS18B20', 'value': 21.5, 'alias': 'kitchen'},
+            's1': {'type': 'DS18S20', 'value': 19},
+            's3': {'type': 'DS18B20', 'value': None}
+        }
+        timings = {
+            'cycle': {'count': 3, 'p50': 0.5, 'p95': 0.75, 'max': 1.0}
+        }
+        res = self.cls.render(
+            readings, {'s1': 0, 's3': 2}, {'OWFS': 1}, timings, 4, 2
+        )
+        assert res == '\n'.join([
+            '# TYPE rpymostat_sensor_temperature_celsius gauge',
+            '# UNIT rpymostat_sensor_temperature_celsius celsius',
+            '# HELP rpymostat_sensor_temperature_celsius Latest sensor '
+            'reading.',
+            'rpymostat_sensor_temperature_celsius{sensor="s1",'
+            'type="DS18S20"} 19.0',
+            'rpymostat_sensor_temperature_celsius{alias="kitchen",'
+            'sensor="s2",type="DS18B20"} 21.5',
+            '# TYPE rpymostat_sensor_read_errors counter',
+            '# HELP rpymostat_sensor_read_errors Failed reads of each sensor.',
+            'rpymostat_sensor_read_errors_total{sensor="s1"} 0',
+            'rpymostat_sensor_read_errors_total{sensor="s3"} 2',
+            '# TYPE rpymostat_sensor_class_read_errors counter',
+            '# HELP rpymostat_sensor_class_read_errors Exceptions raised '
+            'reading each sensor class.',
+            'rpymostat_sensor_class_read_errors_total{sensor_class="OWFS"} 1',
+            '# TYPE rpymostat_sensor_duration_seconds gauge',
+            '# UNIT rpymostat_sensor_duration_seconds seconds',
+            '# HELP rpymostat_sensor_duration_seconds Recent durations of '
+            'daemon operations (cycle, sensor reads, HTTP requests).',
+            'rpymostat_sensor_duration_seconds{operation="cycle",stat="p50"} '
+            '0.5',
+            'rpymostat_sensor_duration_seconds{operation="cycle",stat="p95"} '
+            '0.75',
+            'rpymostat_sensor_duration_seconds{operation="cycle",stat="max"} '
+            '1.0',
+            '# TYPE rpymostat_sensor_queue_depth gauge',
+            '# HELP rpymostat_sensor_queue_depth Samples waiting in the '
+            'on-disk send buffer.',
+            'rpymostat_sensor_queue_depth 4',
+            '# TYPE rpymostat_sensor_batch_depth gauge',
+            '# HELP rpymostat_sensor_batch_depth Samples waiting in the '
+            'upload batch.',
+            'rpymostat_sensor_batch_depth 2',
+            '# EOF'
+        ]) + '\n'
+
+    def test_update(self):
+        with patch('%s.render' % pb, autospec=True) as mock_render:
+            mock_render.return_value = 'foo\n'
+            self.cls.update({'a': 1}, {'b': 2}, {'c': 3}, {'d': 4}, 5, 6)
+        assert mock_render.mock_calls == [
+            call(self.cls, {'a': 1}, {'b': 2}, {'c': 3}, {'d': 4}, 5, 6)
+        ]
+        assert self.cls.body == b'foo\n'
+
+    def test_stop_not_started(self):
+        self.cls.stop()
+        assert self.cls.server is None
+
+    def _get(self, port, path):
+        # raw socket rather than httplib, which pytest-blockage blocks
+        sock = socket.create_connection(('127.0.0.1', port), 5)
+        sock.sendall(('GET %s HTTP/1.0\r\n\r\n' % path).encode('ascii'))
+        resp = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            resp += chunk
+        sock.close()
+        return resp
+
+    def test_serve(self):
+        cls = MetricsExporter(0, addr='127.0.0.1')
+        cls.body = b'foo 1\n# EOF\n'
+        cls.start()
+        try:
+            port = cls.server.server_port
+            res = self._get(port, '/metrics')
+            assert res.startswith(b'HTTP/1.0 200')
+            assert ('Content-Type: %s' % CONTENT_TYPE).encode('ascii') in res
+            assert res.endswith(b'\r\n\r\nfoo 1\n# EOF\n')
+            assert self._get(port, '/foo').startswith(b'HTTP/1.0 404')
+        finally:
+            cls.stop()
+        assert cls.server is None
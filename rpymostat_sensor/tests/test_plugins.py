@@ -0,0 +1,286 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import pytest
+
+from rpymostat_sensor.plugins import (
+    default_cache_path, distributions_key, scan_entry_points,
+    EntryPointCache, LazyClass, lazy_classes, import_classes
+)
+from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.sensors.dummy import DummySensor
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.plugins'
+pb = '%s.EntryPointCache' % pbm
+
+
+class TestFunctions(object):
+
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def test_default_cache_path(self):
+        with patch.dict(os.environ, {'XDG_CACHE_HOME': '/foo'}):
+            assert default_cache_path() == os.path.join(
+                '/foo', 'rpymostat-sensor', 'entrypoints.json'
+            )
+
+    def test_default_cache_path_home(self):
+        with patch.dict(os.environ, {'HOME': '/home/bar'}):
+            os.environ.pop('XDG_CACHE_HOME', None)
+            assert default_cache_path() == os.path.join(
+                '/home/bar', '.cache', 'rpymostat-sensor', 'entrypoints.json'
+            )
+
+    def test_distributions_key(self):
+        os.mkdir(os.path.join(self.path, 'foo-1.0.dist-info'))
+        os.mkdir(os.path.join(self.path, 'somepkg'))
+        path = [self.path, os.path.join(self.path, 'missing')]
+        key = distributions_key(path)
+        # unrelated changes don't change the key
+        os.mkdir(os.path.join(self.path, 'otherpkg'))
+        assert distributions_key(path) == key
+        # installing a distribution does
+        os.mkdir(os.path.join(self.path, 'bar-2.0.egg-info'))
+        key2 = distributions_key(path)
+        assert key2 != key
+        # as does updating its entrypoints
+        fname = os.path.join(self.path, 'bar-2.0.egg-info', 'entry_points.txt')
+        with open(fname, 'w') as fh:
+            fh.write('[foo]\n')
+        os.utime(fname, (1000, 1000))
+        key3 = distributions_key(path)
+        assert key3 != key2
+        # and upgrading
+        os.rename(os.path.join(self.path, 'foo-1.0.dist-info'),
+                  os.path.join(self.path, 'foo-1.1.dist-info'))
+        assert distributions_key(path) not in [key, key2, key3]
+
+    def test_scan_entry_points(self):
+        res = scan_entry_points('console_scripts')
+        assert len(res) > 0
+        assert res == sorted(res)
+        for name, value in res:
+            assert ':' in value
+
+    def test_scan_entry_points_none(self):
+        assert scan_entry_points('rpymostat.no_such_group') == []
+
+    def test_lazy_classes(self):
+        with patch(pb, autospec=True) as mock_cache:
+            mock_cache.return_value.entry_points.return_value = [
+                ['dummy', 'rpymostat_sensor.sensors.dummy:DummySensor']
+            ]
+            res = lazy_classes('foo', superclass=BaseSensor, cache_path='/c')
+        assert mock_cache.mock_calls == [
+            call('foo', '/c'),
+            call().entry_points()
+        ]
+        assert len(res) == 1
+        assert res[0].name == 'dummy'
+        assert res[0].__name__ == 'DummySensor'
+        assert res[0].superclass == BaseSensor
+        assert res[0].load() == DummySensor
+
+    def test_import_classes(self):
+        c1 = Mock(spec_set=LazyClass)
+        c2 = Mock(spec_set=LazyClass)
+        c2.load.side_effect = ImportError()
+        c3 = Mock(spec_set=LazyClass)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = import_classes([c1, c2, c3])
+        assert res == [c1.load.return_value, c3.load.return_value]
+        assert mock_logger.mock_calls == [
+            call.debug('Unable to load %r', c2, exc_info=1)
+        ]
+
+
+class TestEntryPointCache(object):
+
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+        self.fname = os.path.join(self.path, 'a', 'b', 'cache.json')
+        self.cls = EntryPointCache('foo', self.fname)
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def test_init_default(self):
+        with patch('%s.default_cache_path' % pbm, autospec=True) as m_dcp:
+            m_dcp.return_value = '/foo/bar'
+            cls = EntryPointCache('foo')
+        assert cls.group == 'foo'
+        assert cls.path == '/foo/bar'
+
+    def test_entry_points_miss(self):
+        with patch('%s.distributions_key' % pbm, autospec=True) as m_key:
+            with patch('%s.scan_entry_points' % pbm,
+                       autospec=True) as m_scan:
+                m_key.return_value = 'k1'
+                m_scan.return_value = [['a', 'b:C']]
+                assert self.cls.entry_points() == [['a', 'b:C']]
+        assert m_scan.mock_calls == [call('foo')]
+        with open(self.fname) as fh:
+            assert json.load(fh) == {
+                'foo': {'key': 'k1', 'entry_points': [['a', 'b:C']]}
+            }
+        assert os.listdir(os.path.dirname(self.fname)) == ['cache.json']
+
+    def test_entry_points_hit(self):
+        os.makedirs(os.path.dirname(self.fname))
+        with open(self.fname, 'w') as fh:
+            json.dump({
+                'foo': {'key': 'k1', 'entry_points': [['a', 'b:C']]},
+                'bar': {'key': 'k1', 'entry_points': []}
+            }, fh)
+        with patch('%s.distributions_key' % pbm, autospec=True) as m_key:
+            with patch('%s.scan_entry_points' % pbm,
+                       autospec=True) as m_scan:
+                m_key.return_value = 'k1'
+                assert self.cls.entry_points() == [['a', 'b:C']]
+        assert m_scan.mock_calls == []
+
+    def test_entry_points_stale(self):
+        os.makedirs(os.path.dirname(self.fname))
+        with open(self.fname, 'w') as fh:
+            json.dump({
+                'foo': {'key': 'k1', 'entry_points': [['a', 'b:C']]},
+                'bar': {'key': 'k1', 'entry_points': []}
+            }, fh)
+        with patch('%s.distributions_key' % pbm, autospec=True) as m_key:
+            with patch('%s.scan_entry_points' % pbm,
+                       autospec=True) as m_scan:
+                m_key.return_value = 'k2'
+                m_scan.return_value = [['d', 'e:F']]
+                assert self.cls.entry_points() == [['d', 'e:F']]
+        assert m_scan.mock_calls == [call('foo')]
+        with open(self.fname) as fh:
+            assert json.load(fh) == {
+                'foo': {'key': 'k2', 'entry_points': [['d', 'e:F']]},
+                'bar': {'key': 'k1', 'entry_points': []}
+            }
+
+    def test_read_corrupt(self):
+        os.makedirs(os.path.dirname(self.fname))
+        with open(self.fname, 'w') as fh:
+            fh.write('{not json')
+        assert self.cls._read() == {}
+        with open(self.fname, 'w') as fh:
+            fh.write('[]')
+        assert self.cls._read() == {}
+
+    def test_write_error(self):
+        # the cache directory can't be created, as its parent is a file
+        with open(os.path.join(self.path, 'a'), 'w') as fh:
+            fh.write('x')
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._write({'foo': {}})
+        assert mock_logger.mock_calls == [
+            call.debug('Unable to write entrypoint cache to %s',
+                       self.fname, exc_info=1)
+        ]
+
+
+class TestLazyClass(object):
+
+    def test_init(self):
+        cls = LazyClass('foo', 'foo.bar:Baz.Quux', superclass=BaseSensor)
+        assert cls.name == 'foo'
+        assert cls.module_name == 'foo.bar'
+        assert cls.attr == 'Baz.Quux'
+        assert cls.__name__ == 'Quux'
+        assert cls.superclass == BaseSensor
+        assert cls._class is None
+        assert repr(cls) == '<LazyClass foo = foo.bar:Baz.Quux>'
+
+    def test_load(self):
+        cls = LazyClass('dummy', 'rpymostat_sensor.sensors.dummy:DummySensor',
+                        superclass=BaseSensor)
+        with patch('%s.import_module' % pbm, autospec=True) as mock_import:
+            mock_import.return_value.DummySensor = DummySensor
+            assert cls.load() == DummySensor
+            assert cls.load() == DummySensor
+        assert mock_import.mock_calls == [
+            call('rpymostat_sensor.sensors.dummy')
+        ]
+
+    def test_load_not_subclass(self):
+        cls = LazyClass('foo', 'rpymostat_sensor.plugins:LazyClass',
+                        superclass=BaseSensor)
+        with pytest.raises(TypeError):
+            cls.load()
+        assert cls._class is None
+
+    def test_load_not_class(self):
+        cls = LazyClass('foo', 'rpymostat_sensor.plugins:lazy_classes',
+                        superclass=BaseSensor)
+        with pytest.raises(TypeError):
+            cls.load()
+
+    def test_load_no_superclass(self):
+        cls = LazyClass('foo', 'rpymostat_sensor.plugins:lazy_classes')
+        assert cls.load() == lazy_classes
+
+    def test_load_missing(self):
+        cls = LazyClass('foo', 'rpymostat_sensor.no_such_module:Foo')
+        with pytest.raises(ImportError):
+            cls.load()
+
+    def test_call(self):
+        cls = LazyClass('dummy', 'rpymostat_sensor.sensors.dummy:DummySensor',
+                        superclass=BaseSensor)
+        res = cls('myhostid')
+        assert isinstance(res, DummySensor)
+        assert res.host_id == 'myhostid'
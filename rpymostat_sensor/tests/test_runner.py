@@ -200,7 +200,138 @@ class TestRunner(object):
                                 help='Provide an argument for a specific '
                                 'sensor class, in the form '
                                 'ClassName=arg_name=value; see -l for list '
-                                'of classes and their arguments'),
+                                'of classes and their arguments. '
+                                'ClassName=interval=N sets a polling interval '
+                                'for just that class; ClassName=cache_ttl=N '
+                                'and ClassName=cache_max_age=N cache its '
+                                'readings.'),
+            call().add_argument('--connect-timeout', dest='connect_timeout',
+                                default=10.0, type=float,
+                                help='Float number of seconds to wait when '
+                                'connecting to the Engine API'),
+            call().add_argument('--read-timeout', dest='read_timeout',
+                                default=30.0, type=float,
+                                help='Float number of seconds to wait for the '
+                                'Engine API to respond'),
+            call().add_argument('--http-pool-size', dest='http_pool_size',
+                                default=2, type=int,
+                                help='Maximum number of keep-alive '
+                                'connections to the Engine API'),
+            call().add_argument('--asyncio', dest='use_asyncio',
+                                action='store_true', default=False,
+                                help='Use the asyncio run loop, which '
+                                'overlaps sensor reads with PUTs to the '
+                                'Engine (Python 3.4+ only)'),
+            call().add_argument('--fixed-rate', dest='fixed_rate',
+                                action='store_true', default=False,
+                                help='Start poll/PUT cycles at a fixed rate '
+                                'of once per interval, aligned to the wall '
+                                'clock, instead of sleeping for interval '
+                                'between cycles'),
+            call().add_argument('--overrun', dest='overrun', default='skip',
+                                choices=['skip', 'coalesce'],
+                                help='With --fixed-rate, how to handle cycles '
+                                'missed because a cycle took longer than '
+                                'interval; skip them (default) or run one '
+                                'cycle immediately in their place'),
+            call().add_argument('--buffer-path', dest='buffer_path',
+                                default=None, type=str,
+                                help='Path to a local SQLite database to '
+                                'buffer sensor data in when it cannot be sent '
+                                'to the Engine; buffered data is sent once '
+                                'the Engine is reachable again'),
+            call().add_argument('--buffer-max-entries',
+                                dest='buffer_max_entries', default=10000,
+                                type=int, help='Maximum number of entries to '
+                                'keep in the buffer; oldest are dropped '
+                                'first'),
+            call().add_argument('--buffer-max-bytes', dest='buffer_max_bytes',
+                                default=None, type=int,
+                                help='Maximum size in bytes of sensor data to '
+                                'keep in the buffer; oldest are dropped '
+                                'first'),
+            call().add_argument('--backfill-batch-size',
+                                dest='backfill_batch_size', default=100,
+                                type=int, help='Maximum number of buffered '
+                                'entries to send to the Engine per request'),
+            call().add_argument('--batch-size', dest='batch_size',
+                                default=None, type=int,
+                                help='Batching mode; send readings to the '
+                                'Engine in one request per this many samples'),
+            call().add_argument('--batch-age', dest='batch_age', default=None,
+                                type=float, help='Batching mode; send '
+                                'readings to the Engine in one request once '
+                                'the oldest unsent sample is this many '
+                                'seconds old'),
+            call().add_argument('--compress', dest='compression',
+                                default=None, choices=['gzip', 'deflate'],
+                                help='Compress request bodies sent to the '
+                                'Engine with this Content-Encoding'),
+            call().add_argument('--compress-min-bytes',
+                                dest='compress_min_bytes', default=1024,
+                                type=int, help='With --compress, only '
+                                'compress request bodies at least this many '
+                                'bytes long'),
+            call().add_argument('--delta', dest='delta', action='store_true',
+                                default=False, help='Only send full sensor '
+                                'information when it changes (or every '
+                                '--heartbeat seconds); otherwise send only '
+                                'sensor values'),
+            call().add_argument('--deadband', dest='deadband', default=None,
+                                type=float, help='With --delta, do not send '
+                                'sensor values that changed by less than this '
+                                'amount since they were last sent'),
+            call().add_argument('--heartbeat', dest='heartbeat',
+                                default=300.0, type=float,
+                                help='With --delta, send full information for '
+                                'every sensor at least this often (seconds)'),
+            call().add_argument('--timing-interval', dest='timing_interval',
+                                default=None, type=float, help='Log a summary '
+                                'of sensor read, serialization and HTTP '
+                                'request timings every this many seconds'),
+            call().add_argument('--metrics-port', dest='metrics_port',
+                                default=None, type=int, help='Serve the latest '
+                                'readings and daemon health metrics in '
+                                'OpenMetrics format on this port'),
+            call().add_argument('--adaptive', dest='adaptive',
+                                action='store_true', default=False,
+                                help='Poll faster while readings are changing '
+                                'quickly and slower while they are stable, '
+                                'between --min-interval and --max-interval'),
+            call().add_argument('--min-interval', dest='min_interval',
+                                default=None, type=float, help='With '
+                                '--adaptive, shortest polling interval in '
+                                'seconds (default: --interval)'),
+            call().add_argument('--max-interval', dest='max_interval',
+                                default=None, type=float, help='With '
+                                '--adaptive, longest polling interval in '
+                                'seconds (default: 10x --min-interval)'),
+            call().add_argument('--adaptive-rate', dest='adaptive_rate',
+                                default=0.1, type=float, help='With '
+                                '--adaptive, poll at --min-interval while any '
+                                'sensor is changing faster than this many '
+                                'degrees per minute'),
+            call().add_argument('--parallel-reads', dest='parallel_reads',
+                                action='store_true', default=False,
+                                help='Read all sensor classes concurrently '
+                                'instead of one after another'),
+            call().add_argument('--class-timeout', dest='class_timeout',
+                                default=None, type=float, help='With '
+                                '--parallel-reads, wait at most this many '
+                                'seconds for each sensor class; sensors of '
+                                'classes that miss the deadline are sent '
+                                'with no value'),
+            call().add_argument('--rediscover-interval',
+                                dest='rediscover_interval', default=None,
+                                type=float, help='Look for sensors that were '
+                                'added or removed every this many seconds, '
+                                'without restarting; also keep running if no '
+                                'sensors are found at startup'),
+            call().add_argument('--startup-profile', dest='startup_profile',
+                                default=False, action='store_true',
+                                help='start up (including Engine and sensor '
+                                'discovery), print a report of where the '
+                                'time went, then exit'),
             call().parse_args(argv)
         ]
 
@@ -212,6 +343,33 @@ class TestRunner(object):
         assert res.engine_port == 8088
         assert res.dummy is False
         assert res.interval == 60.0
+        assert res.connect_timeout == 10.0
+        assert res.read_timeout == 30.0
+        assert res.http_pool_size == 2
+        assert res.use_asyncio is False
+        assert res.fixed_rate is False
+        assert res.overrun == 'skip'
+        assert res.buffer_path is None
+        assert res.buffer_max_entries == 10000
+        assert res.buffer_max_bytes is None
+        assert res.backfill_batch_size == 100
+        assert res.batch_size is None
+        assert res.batch_age is None
+        assert res.compression is None
+        assert res.compress_min_bytes == 1024
+        assert res.delta is False
+        assert res.deadband is None
+        assert res.heartbeat == 300.0
+        assert res.timing_interval is None
+        assert res.metrics_port is None
+        assert res.adaptive is False
+        assert res.min_interval is None
+        assert res.max_interval is None
+        assert res.adaptive_rate == 0.1
+        assert res.parallel_reads is False
+        assert res.class_timeout is None
+        assert res.rediscover_interval is None
+        assert res.startup_profile is False
 
     def test_parse_args_nondefault(self):
         res = self.cls.parse_args([
@@ -223,7 +381,34 @@ class TestRunner(object):
             '-i', '12.34',
             '-c', 'foo=bar=baz',
             '--sensor-class-arg=foo=bar2=baz2',
-            '--sensor-class-arg=blam=blarg=blamm'
+            '--sensor-class-arg=blam=blarg=blamm',
+            '--connect-timeout=1.5',
+            '--read-timeout=2.5',
+            '--http-pool-size=4',
+            '--asyncio',
+            '--fixed-rate',
+            '--overrun=coalesce',
+            '--buffer-path=/foo/buf.sqlite',
+            '--buffer-max-entries=50',
+            '--buffer-max-bytes=1024',
+            '--backfill-batch-size=10',
+            '--batch-size=20',
+            '--batch-age=30.5',
+            '--compress=gzip',
+            '--compress-min-bytes=100',
+            '--delta',
+            '--deadband=0.25',
+            '--heartbeat=600',
+            '--timing-interval=900',
+            '--metrics-port=9100',
+            '--adaptive',
+            '--min-interval=15',
+            '--max-interval=600',
+            '--adaptive-rate=0.2',
+            '--parallel-reads',
+            '--class-timeout=5',
+            '--rediscover-interval=120',
+            '--startup-profile'
         ])
         assert res.verbose == 1
         assert res.dry_run is True
@@ -238,6 +423,33 @@ class TestRunner(object):
             },
             'blam': {'blarg': 'blamm'}
         }
+        assert res.connect_timeout == 1.5
+        assert res.read_timeout == 2.5
+        assert res.http_pool_size == 4
+        assert res.use_asyncio is True
+        assert res.fixed_rate is True
+        assert res.overrun == 'coalesce'
+        assert res.buffer_path == '/foo/buf.sqlite'
+        assert res.buffer_max_entries == 50
+        assert res.buffer_max_bytes == 1024
+        assert res.backfill_batch_size == 10
+        assert res.batch_size == 20
+        assert res.batch_age == 30.5
+        assert res.compression == 'gzip'
+        assert res.compress_min_bytes == 100
+        assert res.delta is True
+        assert res.deadband == 0.25
+        assert res.heartbeat == 600.0
+        assert res.timing_interval == 900.0
+        assert res.metrics_port == 9100
+        assert res.adaptive is True
+        assert res.min_interval == 15.0
+        assert res.max_interval == 600.0
+        assert res.adaptive_rate == 0.2
+        assert res.parallel_reads is True
+        assert res.class_timeout == 5.0
+        assert res.rediscover_interval == 120.0
+        assert res.startup_profile is True
 
     def test_parse_args_verbose2(self):
         res = self.cls.parse_args(['-vv'])
@@ -256,7 +468,34 @@ class TestRunner(object):
             engine_port=8088,
             dummy=False,
             interval=60.0,
-            class_args={}
+            class_args={},
+            connect_timeout=10.0,
+            read_timeout=30.0,
+            http_pool_size=2,
+            use_asyncio=False,
+            fixed_rate=False,
+            overrun='skip',
+            buffer_path=None,
+            buffer_max_entries=10000,
+            buffer_max_bytes=None,
+            backfill_batch_size=100,
+            batch_size=None,
+            batch_age=None,
+            compression=None,
+            compress_min_bytes=1024,
+            delta=False,
+            deadband=None,
+            heartbeat=300.0,
+            timing_interval=None,
+            metrics_port=None,
+            adaptive=False,
+            min_interval=None,
+            max_interval=None,
+            adaptive_rate=0.1,
+            parallel_reads=False,
+            class_timeout=None,
+            rediscover_interval=None,
+            startup_profile=False
         )
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
             with patch.multiple(
@@ -276,7 +515,32 @@ class TestRunner(object):
                 engine_port=8088,
                 engine_addr=None,
                 interval=60.0,
-                class_args={}
+                class_args={},
+                connect_timeout=10.0,
+                read_timeout=30.0,
+                http_pool_size=2,
+                fixed_rate=False,
+                overrun='skip',
+                buffer_path=None,
+                buffer_max_entries=10000,
+                buffer_max_bytes=None,
+                backfill_batch_size=100,
+                batch_size=None,
+                batch_age=None,
+                compression=None,
+                compress_min_bytes=1024,
+                delta=False,
+                deadband=None,
+                heartbeat=300.0,
+                timing_interval=None,
+                metrics_port=None,
+                adaptive=False,
+                min_interval=None,
+                max_interval=None,
+                adaptive_rate=0.1,
+                parallel_reads=False,
+                class_timeout=None,
+                rediscover_interval=None
             ),
             call().run()
         ]
@@ -316,7 +580,34 @@ class TestRunner(object):
             engine_port=5678,
             dummy=True,
             interval=123.45,
-            class_args={'foo': {'bar': 'baz'}}
+            class_args={'foo': {'bar': 'baz'}},
+            connect_timeout=1.5,
+            read_timeout=2.5,
+            http_pool_size=4,
+            use_asyncio=False,
+            fixed_rate=False,
+            overrun='skip',
+            buffer_path=None,
+            buffer_max_entries=10000,
+            buffer_max_bytes=None,
+            backfill_batch_size=100,
+            batch_size=None,
+            batch_age=None,
+            compression=None,
+            compress_min_bytes=1024,
+            delta=False,
+            deadband=None,
+            heartbeat=300.0,
+            timing_interval=None,
+            metrics_port=None,
+            adaptive=False,
+            min_interval=None,
+            max_interval=None,
+            adaptive_rate=0.1,
+            parallel_reads=False,
+            class_timeout=None,
+            rediscover_interval=None,
+            startup_profile=False
         )
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
             with patch.multiple(
@@ -338,7 +629,32 @@ class TestRunner(object):
                 engine_port=5678,
                 engine_addr='foo.bar.baz',
                 interval=123.45,
-                class_args={'foo': {'bar': 'baz'}}
+                class_args={'foo': {'bar': 'baz'}},
+                connect_timeout=1.5,
+                read_timeout=2.5,
+                http_pool_size=4,
+                fixed_rate=False,
+                overrun='skip',
+                buffer_path=None,
+                buffer_max_entries=10000,
+                buffer_max_bytes=None,
+                backfill_batch_size=100,
+                batch_size=None,
+                batch_age=None,
+                compression=None,
+                compress_min_bytes=1024,
+                delta=False,
+                deadband=None,
+                heartbeat=300.0,
+                timing_interval=None,
+                metrics_port=None,
+                adaptive=False,
+                min_interval=None,
+                max_interval=None,
+                adaptive_rate=0.1,
+                parallel_reads=False,
+                class_timeout=None,
+                rediscover_interval=None
             ),
             call().run()
         ]
@@ -351,7 +667,34 @@ class TestRunner(object):
             engine_port=8088,
             dummy=False,
             interval=60.0,
-            class_args={}
+            class_args={},
+            connect_timeout=10.0,
+            read_timeout=30.0,
+            http_pool_size=2,
+            use_asyncio=False,
+            fixed_rate=False,
+            overrun='skip',
+            buffer_path=None,
+            buffer_max_entries=10000,
+            buffer_max_bytes=None,
+            backfill_batch_size=100,
+            batch_size=None,
+            batch_age=None,
+            compression=None,
+            compress_min_bytes=1024,
+            delta=False,
+            deadband=None,
+            heartbeat=300.0,
+            timing_interval=None,
+            metrics_port=None,
+            adaptive=False,
+            min_interval=None,
+            max_interval=None,
+            adaptive_rate=0.1,
+            parallel_reads=False,
+            class_timeout=None,
+            rediscover_interval=None,
+            startup_profile=False
         )
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
             with patch.multiple(
@@ -385,7 +728,192 @@ class TestRunner(object):
                 engine_port=8088,
                 engine_addr=None,
                 interval=60.0,
-                class_args={}
+                class_args={},
+                connect_timeout=10.0,
+                read_timeout=30.0,
+                http_pool_size=2,
+                fixed_rate=False,
+                overrun='skip',
+                buffer_path=None,
+                buffer_max_entries=10000,
+                buffer_max_bytes=None,
+                backfill_batch_size=100,
+                batch_size=None,
+                batch_age=None,
+                compression=None,
+                compress_min_bytes=1024,
+                delta=False,
+                deadband=None,
+                heartbeat=300.0,
+                timing_interval=None,
+                metrics_port=None,
+                adaptive=False,
+                min_interval=None,
+                max_interval=None,
+                adaptive_rate=0.1,
+                parallel_reads=False,
+                class_timeout=None,
+                rediscover_interval=None
             ),
             call().run()
         ]
+
+    def test_console_entry_point_asyncio(self):
+        mock_args = Mock(
+            verbose=0,
+            dry_run=False,
+            engine_addr=None,
+            engine_port=8088,
+            dummy=False,
+            interval=60.0,
+            class_args={},
+            connect_timeout=10.0,
+            read_timeout=30.0,
+            http_pool_size=2,
+            use_asyncio=True,
+            fixed_rate=False,
+            overrun='skip',
+            buffer_path=None,
+            buffer_max_entries=10000,
+            buffer_max_bytes=None,
+            backfill_batch_size=100,
+            batch_size=None,
+            batch_age=None,
+            compression=None,
+            compress_min_bytes=1024,
+            delta=False,
+            deadband=None,
+            heartbeat=300.0,
+            timing_interval=None,
+            metrics_port=None,
+            adaptive=False,
+            min_interval=None,
+            max_interval=None,
+            adaptive_rate=0.1,
+            parallel_reads=False,
+            class_timeout=None,
+            rediscover_interval=None,
+            startup_profile=False
+        )
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                parse_args=DEFAULT,
+            ) as mocks:
+                mocks['parse_args'].return_value = mock_args
+                with patch('%s.SensorDaemon' % pbm,
+                           autospec=True) as mock_daemon:
+                    with patch('rpymostat_sensor.async_daemon.'
+                               'AsyncSensorDaemon',
+                               autospec=True) as mock_async:
+                        self.cls.console_entry_point()
+        assert mock_daemon.mock_calls == []
+        assert mock_async.mock_calls == [
+            call(
+                dry_run=False,
+                dummy_data=False,
+                engine_port=8088,
+                engine_addr=None,
+                interval=60.0,
+                class_args={},
+                connect_timeout=10.0,
+                read_timeout=30.0,
+                http_pool_size=2,
+                fixed_rate=False,
+                overrun='skip',
+                buffer_path=None,
+                buffer_max_entries=10000,
+                buffer_max_bytes=None,
+                backfill_batch_size=100,
+                batch_size=None,
+                batch_age=None,
+                compression=None,
+                compress_min_bytes=1024,
+                delta=False,
+                deadband=None,
+                heartbeat=300.0,
+                timing_interval=None,
+                metrics_port=None,
+                adaptive=False,
+                min_interval=None,
+                max_interval=None,
+                adaptive_rate=0.1,
+                parallel_reads=False,
+                class_timeout=None,
+                rediscover_interval=None
+            ),
+            call().run()
+        ]
+
+    def test_console_entry_point_startup_profile(self):
+        mock_args = Mock(
+            verbose=0,
+            list_classes=False,
+            use_asyncio=False,
+            startup_profile=True
+        )
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                parse_args=DEFAULT,
+                report_startup=DEFAULT,
+            ) as mocks:
+                mocks['parse_args'].return_value = mock_args
+                with patch('%s.SensorDaemon' % pbm,
+                           autospec=True) as mock_daemon:
+                    with patch('%s.monotonic_time' % pbm) as mock_mono:
+                        mock_mono.side_effect = [10.0, 12.5]
+                        with pytest.raises(SystemExit):
+                            self.cls.console_entry_point()
+        # constructed, but not run
+        assert len(mock_daemon.mock_calls) == 1
+        assert mocks['report_startup'].mock_calls == [
+            call(self.cls, mock_daemon.return_value, 2.5)
+        ]
+
+    def test_report_startup(self, capsys):
+        daemon = Mock(startup_times={
+            'discover_sensors': 0.25,
+            'discover_engine': 1.5
+        })
+        daemon._get_sensor_classes.return_value = [
+            Mock(module_name='foo.owfs'),
+            Mock(module_name='foo.other'),
+            Mock(module_name='foo.owfs')
+        ]
+        with patch('%s.profile_imports' % pbm, autospec=True) as mock_prof:
+            mock_prof.return_value = (
+                0.5, [('requests', 0.1, 0.3), ('foo', 0.05, 0.05)]
+            )
+            self.cls.report_startup(daemon, 2.0, limit=2)
+        # sensor class modules are imported lazily, so profile them too
+        assert mock_prof.mock_calls == [
+            call(['rpymostat_sensor.runner', 'foo.owfs', 'foo.other'],
+                 limit=2)
+        ]
+        out, err = capsys.readouterr()
+        assert out == (
+            "Daemon init: 2.000s\n"
+            "  discover_engine: 1.500s\n"
+            "  discover_sensors: 0.250s\n"
+            "\n"
+            "Imports of rpymostat_sensor.runner, foo.owfs, foo.other: 0.500s; "
+            "slowest modules (self, cumulative):\n"
+            "  0.100s 0.300s requests\n"
+            "  0.050s 0.050s foo\n"
+        )
+
+    def test_report_startup_unsupported(self, capsys):
+        daemon = Mock(startup_times={})
+        daemon._get_sensor_classes.return_value = []
+        with patch('%s.profile_imports' % pbm, autospec=True) as mock_prof:
+            mock_prof.return_value = None
+            self.cls.report_startup(daemon, 2.0)
+        out, err = capsys.readouterr()
+        assert out == (
+            "Daemon init: 2.000s\n"
+            "\n"
+            "Import profiling requires Python 3.7 or newer.\n"
+        )
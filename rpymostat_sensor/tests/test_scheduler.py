@@ -0,0 +1,209 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import pytest
+
+from rpymostat_sensor.scheduler import FixedRateScheduler, AdaptiveInterval
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.scheduler'
+pb = '%s.FixedRateScheduler' % pbm
+
+
+class TestFixedRateScheduler(object):
+
+    def setup(self):
+        self.cls = FixedRateScheduler(10.0)
+
+    def test_init(self):
+        assert self.cls.interval == 10.0
+        assert self.cls.align is True
+        assert self.cls.overrun == 'skip'
+        assert self.cls.overruns == 0
+        assert self.cls.missed_ticks == 0
+        assert self.cls._next is None
+
+    def test_init_bad_overrun(self):
+        with pytest.raises(RuntimeError):
+            FixedRateScheduler(10.0, overrun='foo')
+
+    def test_first_deadline_aligned(self):
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1234.5
+            res = self.cls._first_deadline(100.0)
+        assert res == 105.5
+
+    def test_first_deadline_on_boundary(self):
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1230.0
+            res = self.cls._first_deadline(100.0)
+        assert res == 100.0
+
+    def test_first_deadline_not_aligned(self):
+        self.cls.align = False
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1234.5
+            res = self.cls._first_deadline(100.0)
+        assert res == 100.0
+
+    def test_next_deadline(self):
+        self.cls.align = False
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.side_effect = [100.0, 103.0, 115.0, 119.99]
+            res = [self.cls.next_deadline() for x in range(4)]
+        assert res == [100.0, 110.0, 120.0, 130.0]
+        assert self.cls.overruns == 0
+        assert self.cls.missed_ticks == 0
+
+    def test_next_deadline_skip(self):
+        self.cls.align = False
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_mono.side_effect = [100.0, 125.0, 131.0]
+                res = [self.cls.next_deadline() for x in range(3)]
+        assert res == [100.0, 130.0, 140.0]
+        assert self.cls.overruns == 1
+        assert self.cls.missed_ticks == 2
+        assert mock_logger.mock_calls == [
+            call.warning('Cycle overran interval of %ss by %.3fs; %s %d '
+                         'missed tick(s)', 10.0, 15.0, 'skipping', 2)
+        ]
+
+    def test_next_deadline_coalesce(self):
+        self.cls.align = False
+        self.cls.overrun = 'coalesce'
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_mono.side_effect = [100.0, 125.0, 126.0]
+                res = [self.cls.next_deadline() for x in range(3)]
+        assert res == [100.0, 120.0, 130.0]
+        assert self.cls.overruns == 1
+        assert self.cls.missed_ticks == 2
+        assert mock_logger.mock_calls == [
+            call.warning('Cycle overran interval of %ss by %.3fs; %s %d '
+                         'missed tick(s)', 10.0, 15.0, 'coalescing', 2)
+        ]
+
+    def test_wait(self):
+        with patch('%s.next_deadline' % pb, autospec=True) as mock_nd:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                    mock_nd.return_value = 110.0
+                    mock_mono.return_value = 102.5
+                    self.cls.wait()
+        assert mock_nd.mock_calls == [call(self.cls)]
+        assert mock_sleep.mock_calls == [call(7.5)]
+
+    def test_wait_late(self):
+        with patch('%s.next_deadline' % pb, autospec=True) as mock_nd:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                    mock_nd.return_value = 110.0
+                    mock_mono.return_value = 112.5
+                    self.cls.wait()
+        assert mock_sleep.mock_calls == []
+
+
+class TestAdaptiveInterval(object):
+
+    def setup(self):
+        self.cls = AdaptiveInterval(10.0, 300.0, 0.5)
+
+    def update(self, now, readings):
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_mono.return_value = now
+                res = self.cls.update(readings)
+        return res, mock_logger
+
+    def test_init(self):
+        assert self.cls.min_interval == 10.0
+        assert self.cls.max_interval == 300.0
+        assert self.cls.rate == 0.5
+        assert self.cls.factor == 2.0
+        assert self.cls.interval == 10.0
+
+    def test_init_bad_intervals(self):
+        with pytest.raises(RuntimeError):
+            AdaptiveInterval(0, 10.0, 0.5)
+        with pytest.raises(RuntimeError):
+            AdaptiveInterval(20.0, 10.0, 0.5)
+
+    def test_first_update(self):
+        res, _ = self.update(100.0, {'s1': {'value': 20.0}})
+        assert res == 10.0
+        assert self.cls._last_values == {'s1': 20.0}
+
+    def test_backoff_and_speedup(self):
+        self.update(0.0, {'s1': {'value': 20.0}, 's2': {'value': None}})
+        # flat; 10 -> 20 -> 40
+        res, mock_logger = self.update(60.0, {'s1': {'value': 20.0}})
+        assert res == 20.0
+        assert mock_logger.mock_calls == [
+            call.info('Max rate of change %.3f/min; polling interval '
+                      'changed from %ss to %ss', 0.0, 10.0, 20.0)
+        ]
+        res, _ = self.update(120.0, {'s1': {'value': 20.1}})
+        assert res == 40.0
+        # between rate/2 and rate; unchanged
+        res, mock_logger = self.update(180.0, {'s1': {'value': 20.4}})
+        assert res == 40.0
+        assert mock_logger.mock_calls == []
+        # fast; straight to min
+        res, _ = self.update(210.0, {'s1': {'value': 19.0}})
+        assert res == 10.0
+
+    def test_backoff_max(self):
+        self.cls.interval = 250.0
+        self.update(0.0, {'s1': {'value': 20.0}})
+        res, _ = self.update(250.0, {'s1': {'value': 20.0}})
+        assert res == 300.0
+
+    def test_no_common_sensors(self):
+        self.update(0.0, {'s1': {'value': 20.0}})
+        res, _ = self.update(60.0, {'s2': {'value': 30.0}})
+        assert res == 20.0
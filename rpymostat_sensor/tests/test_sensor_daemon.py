@@ -35,12 +35,23 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ##################################################################################
 """
 
+import io
 import sys
+import json
+import threading
+import time
+import zlib
+import gzip
 import pytest
+import requests
 
 from rpymostat_sensor.sensor_daemon import SensorDaemon
 from rpymostat_sensor.sensors.dummy import DummySensor
 from rpymostat_sensor.sensors.base import BaseSensor
+from rpymostat_sensor.scheduler import FixedRateScheduler, AdaptiveInterval
+from rpymostat_sensor.buffer import SendBuffer
+from rpymostat_sensor.timing import TimingStats
+from rpymostat_sensor.metrics import MetricsExporter
 
 # https://code.google.com/p/mock/issues/detail?id=249
 # py>=3.4 should use unittest.mock not the mock package on pypi
@@ -131,6 +142,43 @@ class TestSensorDaemon(object):
         assert cls.interval == 60.0
         assert cls.host_id == 'myhostid'
         assert cls.sensors == sensors
+        assert cls.engine_url == 'http://foo.bar.baz:1234/v1/sensors/update'
+        assert cls.engine_batch_url == 'http://foo.bar.baz:1234/v1/sensors/' \
+                                       'update_batch'
+        assert cls.buffer is None
+        assert cls.backfill_batch_size == 100
+        assert cls.batch_size is None
+        assert cls.batch_age is None
+        assert cls._batch == []
+        assert cls.compression is None
+        assert cls.compress_min_bytes == 1024
+        assert cls.delta is False
+        assert cls.deadband is None
+        assert cls.heartbeat == 300.0
+        assert cls._delta_state == {}
+        assert isinstance(cls.timings, TimingStats)
+        assert cls.timing_interval is None
+        assert cls.read_errors == {}
+        assert cls.class_read_errors == {}
+        assert cls.metrics is None
+        assert sorted(cls.startup_times.keys()) == [
+            'discover_engine', 'discover_sensors'
+        ]
+        assert cls.timeout == (10.0, 30.0)
+        assert isinstance(cls.session, requests.Session)
+        assert cls.scheduler is None
+        assert cls.adaptive is None
+        assert cls.parallel_reads is False
+        assert cls.class_timeout is None
+        assert cls._busy == {}
+        assert cls.class_intervals == {}
+        assert cls._cached_sensors == set()
+        assert cls.class_args == {}
+        assert cls.rediscover_interval is None
+        assert cls._instances == {}
+        assert cls._classes is None
+        assert cls._rediscover_thread is None
+        assert cls.loop_interval == 60.0
         assert mock_logger.mock_calls == [
             call.warning('This machine running with host_id %s', 'myhostid')
         ]
@@ -139,6 +187,202 @@ class TestSensorDaemon(object):
         assert mocks['discover_sensors'].mock_calls == [call(cls, {})]
         assert mock_list.mock_calls == []
 
+    def test_init_class_intervals(self):
+        sensors = [Mock(), Mock()]
+
+        def se_discover(klass, class_args):
+            klass.class_intervals[sensors[0]] = 15.0
+            return sensors
+
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].side_effect = se_discover
+                cls = SensorDaemon(fixed_rate=True)
+        assert cls.interval == 60.0
+        assert cls.loop_interval == 15.0
+        assert cls.scheduler.interval == 15.0
+
+    def test_init_class_intervals_not_multiples(self):
+        sensors = [Mock(), Mock(), Mock()]
+
+        def se_discover(klass, class_args):
+            klass.class_intervals[sensors[0]] = 90.0
+            klass.class_intervals[sensors[1]] = 45.0
+            return sensors
+
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].side_effect = se_discover
+                cls = SensorDaemon()
+        assert cls.loop_interval == 15.0
+        assert call.warning(
+            'Sensor class intervals are not multiples of each other; running '
+            'the daemon loop every %ss', 15.0
+        ) in mock_logger.mock_calls
+
+    def test_init_class_intervals_all_set(self):
+        sensors = [Mock()]
+
+        def se_discover(klass, class_args):
+            klass.class_intervals[sensors[0]] = 45.0
+            return sensors
+
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].side_effect = se_discover
+                cls = SensorDaemon()
+        # the global interval doesn't apply to any class
+        assert cls.loop_interval == 45.0
+
+    def test_common_interval(self):
+        assert self.cls._common_interval([60.0]) == 60.0
+        assert self.cls._common_interval([60.0, 15.0]) == 15.0
+        assert self.cls._common_interval([60.0, 90.0]) == 30.0
+        assert self.cls._common_interval([60, 45, 90]) == 15.0
+        assert self.cls._common_interval([0.25, 1.5]) == 0.25
+        assert self.cls._common_interval([0.0001]) == 0.001
+
+    def test_init_adaptive(self):
+        sensors = [Mock(), Mock()]
+
+        def se_discover(klass, class_args):
+            klass.class_intervals[sensors[0]] = 15.0
+            return sensors
+
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].side_effect = se_discover
+                cls = SensorDaemon(interval=30.0, adaptive=True,
+                                   adaptive_rate=0.5)
+        assert isinstance(cls.adaptive, AdaptiveInterval)
+        assert cls.adaptive.min_interval == 30.0
+        assert cls.adaptive.max_interval == 300.0
+        assert cls.adaptive.rate == 0.5
+        assert cls.class_intervals == {}
+        assert cls.loop_interval == 30.0
+        assert call.warning(
+            'Per-class intervals are ignored in adaptive mode; all sensor '
+            'classes will be polled every cycle.'
+        ) in mock_logger.mock_calls
+
+    def test_init_adaptive_intervals(self):
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].return_value = [Mock()]
+                cls = SensorDaemon(adaptive=True, min_interval=10.0,
+                                   max_interval=120.0)
+        assert cls.adaptive.min_interval == 10.0
+        assert cls.adaptive.max_interval == 120.0
+        assert cls.adaptive.rate == 0.1
+        assert cls.loop_interval == 10.0
+        assert cls.next_interval() == 10.0
+
+    def test_init_adaptive_fixed_rate(self):
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].return_value = [Mock()]
+                with pytest.raises(RuntimeError):
+                    SensorDaemon(adaptive=True, fixed_rate=True)
+
+    def test_init_no_sensors_rediscover(self):
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].return_value = []
+                cls = SensorDaemon(rediscover_interval=60.0)
+        assert cls.sensors == []
+        assert cls.rediscover_interval == 60.0
+        assert mock_logger.mock_calls == [
+            call.warning('This machine running with host_id %s', 'myhostid'),
+            call.warning('No sensors discovered; looking for them again '
+                         'every %ss', 60.0)
+        ]
+
+    def test_init_class_timeout_serial(self):
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].return_value = [Mock()]
+                with pytest.raises(RuntimeError):
+                    SensorDaemon(class_timeout=5.0)
+
+    def test_init_bad_compression(self):
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch.multiple(
+                pb,
+                autospec=True,
+                find_host_id=DEFAULT,
+                discover_engine=DEFAULT,
+                discover_sensors=DEFAULT,
+            ) as mocks:
+                mocks['find_host_id'].return_value = 'myhostid'
+                mocks['discover_engine'].return_value = ('foo.bar.baz', 1234)
+                mocks['discover_sensors'].return_value = [Mock()]
+                with pytest.raises(RuntimeError):
+                    SensorDaemon(compression='bzip2')
+
     def test_init_list_classes(self, capsys):
         mock_classes = Mock()
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
@@ -153,14 +397,17 @@ class TestSensorDaemon(object):
                     mock_sensor_classes.return_value = mock_classes
                     with patch('%s._list_classes' % pbm,
                                new_callable=Mock) as mock_list:
-                        with pytest.raises(SystemExit):
-                            SensorDaemon(list_classes=True)
+                        with patch('%s.import_classes' % pbm,
+                                   autospec=True) as mock_import:
+                            with pytest.raises(SystemExit):
+                                SensorDaemon(list_classes=True)
         assert mock_logger.mock_calls == []
         assert mock_sensor_classes.mock_calls == [call()]
+        assert mock_import.mock_calls == [call(mock_classes)]
         assert mocks['find_host_id'].mock_calls == []
         assert mocks['discover_engine'].mock_calls == []
         assert mocks['discover_sensors'].mock_calls == []
-        assert mock_list.mock_calls == [call(mock_classes)]
+        assert mock_list.mock_calls == [call(mock_import.return_value)]
 
     def test_init_nondefault(self):
         dummy = Mock()
@@ -174,19 +421,30 @@ class TestSensorDaemon(object):
             ) as mocks:
                 with patch('%s._list_classes' % pbm,
                            autospec=True) as mock_list:
-                    mocks['find_host_id'].return_value = 'myhostid'
-                    mocks['discover_engine'].return_value = (
-                        'foo.bar.baz', 1234
-                    )
-                    mocks['discover_sensors'].return_value = [dummy]
-                    cls = SensorDaemon(
-                        dry_run=True,
-                        dummy_data=True,
-                        engine_port=1234,
-                        engine_addr='foo.bar.baz',
-                        interval=12.34,
-                        class_args={'foo': 'bar'}
-                    )
+                    with patch('%s.SendBuffer' % pbm,
+                               autospec=True) as mock_buf:
+                        mocks['find_host_id'].return_value = 'myhostid'
+                        mocks['discover_engine'].return_value = (
+                            'foo.bar.baz', 1234
+                        )
+                        mocks['discover_sensors'].return_value = [dummy]
+                        cls = SensorDaemon(
+                            dry_run=True,
+                            dummy_data=True,
+                            engine_port=1234,
+                            engine_addr='foo.bar.baz',
+                            interval=12.34,
+                            class_args={'foo': 'bar'},
+                            connect_timeout=1.5,
+                            read_timeout=2.5,
+                            http_pool_size=4,
+                            fixed_rate=True,
+                            overrun='coalesce',
+                            buffer_path='/foo/buf.sqlite',
+                            buffer_max_entries=50,
+                            buffer_max_bytes=1024,
+                            backfill_batch_size=10
+                        )
         assert cls.dry_run is True
         assert cls.dummy_data is True
         assert cls.engine_port == 1234
@@ -194,9 +452,19 @@ class TestSensorDaemon(object):
         assert cls.interval == 12.34
         assert cls.host_id == 'myhostid'
         assert cls.sensors == [dummy]
+        assert cls.timeout == (1.5, 2.5)
+        assert cls.session.get_adapter('http://foo')._pool_maxsize == 4
+        assert isinstance(cls.scheduler, FixedRateScheduler)
+        assert cls.scheduler.interval == 12.34
+        assert cls.scheduler.overrun == 'coalesce'
+        assert cls.buffer is mock_buf.return_value
+        assert mock_buf.mock_calls == [
+            call('/foo/buf.sqlite', max_entries=50, max_bytes=1024)
+        ]
+        assert cls.backfill_batch_size == 10
         assert mock_logger.mock_calls == [
             call.warning('This machine running with host_id %s', 'myhostid'),
-            call.warning("DRY RUN MODE - will not POST data to Engine.")
+            call.warning("DRY RUN MODE - will not PUT data to Engine.")
         ]
         assert mocks['find_host_id'].mock_calls == [call(cls)]
         assert mocks['discover_engine'].mock_calls == []
@@ -262,25 +530,88 @@ class TestSensorDaemon(object):
             call.debug('Sleeping %ss', 60.0)
         ]
 
+    def test_run_adaptive(self):
+        def se_ras(klass):
+            if mock_ras.call_count < 3:
+                return None
+            raise RuntimeError()
+
+        self.cls.adaptive = Mock(spec_set=AdaptiveInterval(60.0, 600.0, 0.1))
+        self.cls.adaptive.interval = 240.0
+        with patch('%s.read_and_send' % pb, autospec=True) as mock_ras:
+            with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                with patch('%s.logger' % pbm, autospec=True):
+                    mock_ras.side_effect = se_ras
+                    with pytest.raises(RuntimeError):
+                        self.cls.run()
+        assert mock_sleep.mock_calls == [call(240.0), call(240.0)]
+
+    def test_run_metrics(self):
+        self.cls.metrics = Mock(spec_set=MetricsExporter)
+        with patch('%s.read_and_send' % pb, autospec=True) as mock_ras:
+            with patch('%s.sleep' % pbm, autospec=True):
+                with patch('%s.logger' % pbm, autospec=True):
+                    mock_ras.side_effect = RuntimeError()
+                    with pytest.raises(RuntimeError):
+                        self.cls.run()
+        assert self.cls.metrics.mock_calls == [call.start(), call.stop()]
+
+    def test_run_fixed_rate(self):
+        def se_ras(klass):
+            if mock_ras.call_count < 3:
+                return None
+            raise RuntimeError()
+
+        self.cls.scheduler = Mock(spec_set=FixedRateScheduler)
+        with patch('%s.read_and_send' % pb, autospec=True) as mock_ras:
+            with patch('%s.sleep' % pbm, autospec=True) as mock_sleep:
+                with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                    mock_ras.side_effect = se_ras
+                    with pytest.raises(RuntimeError):
+                        self.cls.run()
+        assert mock_ras.mock_calls == [
+            call(self.cls),
+            call(self.cls),
+            call(self.cls)
+        ]
+        assert self.cls.scheduler.mock_calls == [
+            call.wait(),
+            call.wait(),
+            call.wait()
+        ]
+        assert mock_sleep.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.info('Running sensor daemon loop...')
+        ]
+
+    def test_run_flushes_batch(self):
+        with patch('%s.read_and_send' % pb, autospec=True) as mock_ras:
+            with patch('%s.flush_batch' % pb, autospec=True) as mock_flush:
+                with patch('%s.sleep' % pbm, autospec=True):
+                    with patch('%s.logger' % pbm, autospec=True):
+                        mock_ras.side_effect = KeyboardInterrupt()
+                        with pytest.raises(KeyboardInterrupt):
+                            self.cls.run()
+        assert mock_flush.mock_calls == [call(self.cls)]
+
     def test_sensor_classes(self):
 
         class EP1(object):
-            name = 'EP1'
+            pass
 
         class EP2(object):
-            name = 'EP2'
+            pass
 
-        with patch('%s.load_classes' % pbm, autospec=True) as mock_load:
+        with patch('%s.lazy_classes' % pbm, autospec=True) as mock_lazy:
             with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-                mock_load.return_value = [EP1, EP2]
+                mock_lazy.return_value = [EP1, EP2]
                 res = self.cls._sensor_classes()
         assert res == [EP1, EP2]
-        assert mock_load.mock_calls == [
+        assert mock_lazy.mock_calls == [
             call('rpymostat.sensors', superclass=BaseSensor)
         ]
         assert mock_logger.mock_calls == [
-            call.debug("%s Sensor classes loaded successfully: %s",
-                       2, ['EP1', 'EP2'])
+            call.debug("%s Sensor classes found: %s", 2, ['EP1', 'EP2'])
         ]
 
     def test_discover_sensors(self):
@@ -290,16 +621,25 @@ class TestSensorDaemon(object):
             def sensors_present(self):
                 pass
 
+            def close(self):
+                pass
+
         class Class2(object):
 
             def sensors_present(self):
                 pass
 
+            def close(self):
+                pass
+
         class Class3(object):
 
             def sensors_present(self):
                 pass
 
+            def close(self):
+                pass
+
         class Class4(object):
 
             def sensors_present(self):
@@ -311,36 +651,50 @@ class TestSensorDaemon(object):
         mock_cls1 = Mock(spec=Class1)
         mock_cls1.sensors_present.return_value = True
         mock1 = Mock(spec=Class1)
+        mock1.__name__ = 'Class1'
         mock1.return_value = mock_cls1
 
         mock_cls2 = Mock(spec=Class2)
         mock_cls2.sensors_present.return_value = False
         mock2 = Mock(spec=Class2)
+        mock2.__name__ = 'Class2'
         mock2.return_value = mock_cls2
 
         mock_cls3 = Mock(spec=Class3)
         mock_cls3.sensors_present.side_effect = se_exc
         mock3 = Mock(spec=Class3)
+        mock3.__name__ = 'Class3'
         mock3.return_value = mock_cls3
 
         mock4 = Mock(spec=Class4)
+        mock4.__name__ = 'Class4'
         mock4.side_effect = se_exc
 
         classes = [mock1, mock2, mock3, mock4]
 
-        cls_args = {'Class1': {'foo': 'bar'}}
+        cls_args = {
+            'Class1': {'foo': 'bar', 'interval': '5'},
+            'Class2': {'interval': '10'}
+        }
 
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
             with patch('%s._sensor_classes' % pb) as m_classes:
                 m_classes.return_value = classes
                 res = self.cls.discover_sensors(class_args=cls_args)
         assert res == [mock_cls1]
+        assert res[0].timings == self.cls.timings
+        assert self.cls._instances == {mock1: mock_cls1}
+        assert self.cls._classes == classes
+        assert self.cls.class_intervals == {mock_cls1: 5.0}
         assert m_classes.mock_calls == [call()]
         assert mock_cls1.mock_calls == [call.sensors_present()]
         assert mock1.mock_calls == [
             call(foo='bar'),
             call().sensors_present()
         ]
+        # instances without sensors present are closed
+        assert mock_cls2.mock_calls == [call.sensors_present(), call.close()]
+        assert mock_cls3.mock_calls == [call.sensors_present(), call.close()]
         assert mock_logger.mock_calls == [
             call.debug('Checking sensor classes for sensors...'),
             call.info('Sensor class %s.%s reports sensors present',
@@ -353,6 +707,277 @@ class TestSensorDaemon(object):
             call.debug('Discovered %d sensor classes with sensors present', 1)
         ]
 
+    def test_discover_sensors_cache(self):
+        sensor = Mock(spec_set=BaseSensor)
+        sensor.sensors_present.return_value = True
+        klass = Mock(return_value=sensor)
+        klass.__name__ = 'Class1'
+        cls_args = {'Class1': {'foo': 'bar', 'cache_ttl': '5',
+                               'cache_max_age': '60'}}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s._sensor_classes' % pb) as m_classes:
+                m_classes.return_value = [klass]
+                res = self.cls.discover_sensors(class_args=cls_args)
+        assert res == [sensor]
+        assert klass.mock_calls[0] == call(foo='bar')
+        assert sensor.cache_ttl == 5.0
+        assert sensor.cache_max_age == 60.0
+        assert self.cls._cached_sensors == set([sensor])
+        assert call.info(
+            'Caching readings for sensor class %s (ttl=%s, max_age=%s)',
+            'BaseSensor', 5.0, 60.0
+        ) in mock_logger.mock_calls
+
+    def test_get_sensor_classes_cached(self):
+        with patch('%s._sensor_classes' % pb) as m_classes:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                mock_mono.side_effect = [10.0, 10.5]
+                m_classes.return_value = ['foo']
+                assert self.cls._get_sensor_classes() == ['foo']
+                assert self.cls._get_sensor_classes() == ['foo']
+        assert m_classes.mock_calls == [call()]
+        assert self.cls.startup_times['sensor_classes'] == 0.5
+
+    def test_rediscover(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s4 = Mock(spec_set=BaseSensor)
+        s4.sensors_present.return_value = True
+        s6 = Mock(spec_set=BaseSensor)
+        k1 = Mock()
+        k2 = Mock()
+        k2.return_value.sensors_present.return_value = False
+        k3 = Mock(side_effect=RuntimeError())
+        k4 = Mock(return_value=s4)
+        k5 = Mock()
+        k6 = Mock()
+        for name, k in [('k1', k1), ('k2', k2), ('k3', k3), ('k4', k4),
+                        ('k5', k5), ('k6', k6)]:
+            k.__name__ = name
+        self.cls._classes = [k1, k2, k3, k4, k5, k6]
+        self.cls._instances = {k1: s1, k5: Mock()}
+        self.cls._discovered = [(k6, s6)]
+        self.cls.sensors = [s1]
+        self.cls.class_args = {'k4': {'foo': 'bar', 'interval': '30'}}
+        with patch('%s.logger' % pbm, autospec=True):
+            self.cls.rediscover()
+        # active instances aren't touched from the rediscovery thread
+        assert s1.mock_calls == []
+        assert k1.mock_calls == []
+        assert k5.mock_calls == []
+        # already queued
+        assert k6.mock_calls == []
+        assert k2.mock_calls == [
+            call(), call().sensors_present(), call().close()
+        ]
+        assert k3.mock_calls == [call()]
+        assert k4.mock_calls == [call(foo='bar')]
+        assert s4.mock_calls == [call.sensors_present()]
+        assert self.cls._discovered == [(k6, s6), (k4, s4)]
+        assert self.cls._recheck_due is True
+        # nothing is added until the polling thread applies it
+        assert self.cls.sensors == [s1]
+        assert self.cls.class_intervals == {}
+
+    def test_apply_rediscovery_not_due(self):
+        s1 = Mock(spec_set=BaseSensor)
+        self.cls._instances = {Mock(): s1}
+        self.cls.sensors = [s1]
+        self.cls._apply_rediscovery()
+        assert s1.mock_calls == []
+        assert self.cls.sensors == [s1]
+
+    def test_apply_rediscovery(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.sensors_present.return_value = True
+        s2 = Mock(spec_set=BaseSensor)
+        s2.sensors_present.return_value = False
+        s3 = Mock(spec_set=BaseSensor)
+        s3.sensors_present.side_effect = RuntimeError()
+        s4 = Mock(spec_set=BaseSensor)
+        s5 = Mock(spec_set=BaseSensor)
+        k1, k2, k3, k4, k5 = Mock(), Mock(), Mock(), Mock(), Mock()
+        k4.__name__ = 'k4'
+        busy = Mock(spec_set=threading.Thread)
+        busy.is_alive.return_value = True
+        self.cls._instances = {k1: s1, k2: s2, k3: s3, k5: s5}
+        self.cls._busy = {s5: busy}
+        self.cls._discovered = [(k4, s4)]
+        self.cls._recheck_due = True
+        self.cls.sensors = [s3, s5, s2, s1]
+        self.cls._latest = {s1: {'a': {}}, s2: {'b': {}}, s3: {'c': {}}}
+        self.cls.class_intervals = {s2: 10.0}
+        self.cls._cached_sensors = set([s2])
+        self.cls.class_args = {'k4': {'interval': '30'}}
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._apply_rediscovery()
+        assert self.cls.sensors == [s5, s1, s4]
+        assert self.cls._instances == {k1: s1, k4: s4, k5: s5}
+        assert self.cls._discovered == []
+        assert self.cls._recheck_due is False
+        assert self.cls._latest == {s1: {'a': {}}}
+        assert self.cls.class_intervals == {s4: 30.0}
+        assert self.cls.loop_interval == 30.0
+        assert self.cls._cached_sensors == set()
+        assert s1.mock_calls == [call.sensors_present()]
+        assert s2.mock_calls == [call.sensors_present(), call.close()]
+        assert s3.mock_calls == [call.sensors_present(), call.close()]
+        # still busy with a read that missed its deadline; not checked
+        assert s5.mock_calls == []
+        assert s4.mock_calls == []
+        assert s4.timings == self.cls.timings
+        assert call.warning(
+            'Sensor class %s no longer reports sensors present; removing it',
+            'BaseSensor'
+        ) in mock_logger.mock_calls
+        assert call.warning(
+            'Sensor class %s now reports sensors present; adding it', 'k4'
+        ) in mock_logger.mock_calls
+
+    def test_apply_rediscovery_fixed_rate(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.sensors_present.return_value = True
+        s2 = Mock(spec_set=BaseSensor)
+        s2.sensors_present.return_value = False
+        k1, k2 = Mock(), Mock()
+        self.cls._instances = {k1: s1, k2: s2}
+        self.cls._recheck_due = True
+        self.cls.sensors = [s1, s2]
+        self.cls.class_intervals = {s2: 45.0}
+        self.cls.loop_interval = 15.0
+        old = FixedRateScheduler(15.0, align=False, overrun='coalesce')
+        old.overruns = 2
+        old.missed_ticks = 5
+        self.cls.scheduler = old
+        with patch('%s.logger' % pbm, autospec=True):
+            self.cls._apply_rediscovery()
+        assert self.cls.sensors == [s1]
+        assert self.cls.loop_interval == 60.0
+        assert self.cls.scheduler is not old
+        assert self.cls.scheduler.interval == 60.0
+        assert self.cls.scheduler.align is False
+        assert self.cls.scheduler.overrun == 'coalesce'
+        assert self.cls.scheduler.overruns == 2
+        assert self.cls.scheduler.missed_ticks == 5
+
+    def test_apply_rediscovery_adaptive(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.sensors_present.return_value = True
+        s2 = Mock(spec_set=BaseSensor)
+        k1, k2 = Mock(), Mock()
+        k2.__name__ = 'k2'
+        self.cls._instances = {k1: s1}
+        self.cls._discovered = [(k2, s2)]
+        self.cls._recheck_due = True
+        self.cls.sensors = [s1]
+        self.cls.loop_interval = 10.0
+        self.cls.adaptive = Mock(spec_set=AdaptiveInterval)
+        self.cls.class_args = {'k2': {'interval': '45'}}
+        with patch('%s.logger' % pbm, autospec=True):
+            self.cls._apply_rediscovery()
+        assert self.cls.sensors == [s1, s2]
+        assert self.cls.class_intervals == {}
+        assert self.cls.loop_interval == 10.0
+
+    def test_update_loop_interval_unchanged(self):
+        s1 = Mock(spec_set=BaseSensor)
+        self.cls.sensors = [s1]
+        self.cls.class_intervals = {s1: 60.0}
+        sched = FixedRateScheduler(60.0)
+        self.cls.scheduler = sched
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._update_loop_interval()
+        assert self.cls.loop_interval == 60.0
+        assert self.cls.scheduler is sched
+        assert mock_logger.mock_calls == []
+
+    def test_rediscover_concurrent_read(self):
+
+        class Sensor(BaseSensor):
+
+            def __init__(self):
+                self.lock = threading.Lock()
+                self.overlaps = 0
+                self.check_threads = set()
+
+            def _use(self):
+                if not self.lock.acquire(False):
+                    self.overlaps += 1
+                    return
+                time.sleep(0.001)
+                self.lock.release()
+
+            def sensors_present(self):
+                self.check_threads.add(threading.current_thread())
+                self._use()
+                return True
+
+            def read(self):
+                self._use()
+                return {'s1': {'value': 1.0}}
+
+        sensor = Sensor()
+        klass = Mock()
+        klass.__name__ = 'Sensor'
+        self.cls._classes = [klass]
+        self.cls._instances = {klass: sensor}
+        self.cls.sensors = [sensor]
+        stop = threading.Event()
+
+        def rediscover():
+            while not stop.is_set():
+                self.cls.rediscover()
+                time.sleep(0.001)
+
+        t = threading.Thread(target=rediscover)
+        with patch('%s.logger' % pbm, autospec=True):
+            t.start()
+            try:
+                for _ in range(50):
+                    res = self.cls.read_sensors()
+                    assert res['sensors'] == {'s1': {'value': 1.0}}
+                    time.sleep(0.001)
+            finally:
+                stop.set()
+                t.join()
+        assert sensor.overlaps == 0
+        assert sensor.check_threads == set([threading.current_thread()])
+        assert klass.mock_calls == []
+        assert self.cls.sensors == [sensor]
+
+    def test_close_sensor_exception(self):
+        sensor = Mock(spec_set=BaseSensor)
+        sensor.close.side_effect = RuntimeError()
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls._close_sensor(sensor)
+        assert mock_logger.mock_calls == [
+            call.debug('Exception while closing sensor class %s',
+                       'BaseSensor', exc_info=1)
+        ]
+
+    def test_start_rediscovery_disabled(self):
+        self.cls.start_rediscovery()
+        assert self.cls._rediscover_thread is None
+        self.cls.stop_rediscovery()
+
+    def test_rediscovery_thread(self):
+        called = threading.Event()
+
+        def se_rediscover(klass):
+            called.set()
+            raise RuntimeError()
+
+        self.cls.rediscover_interval = 0.01
+        with patch('%s.rediscover' % pb, autospec=True) as mock_redisc:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_redisc.side_effect = se_rediscover
+                self.cls.start_rediscovery()
+                assert called.wait(5.0) is True
+                self.cls.stop_rediscovery()
+        assert self.cls._rediscover_thread is None
+        assert call.exception(
+            'Exception rediscovering sensors'
+        ) in mock_logger.mock_calls
+
     def test_discover_sensors_dummy(self):
         self.cls.dummy_data = True
 
@@ -363,122 +988,948 @@ class TestSensorDaemon(object):
         assert len(res) == 1
         assert isinstance(res[0], DummySensor)
         assert res[0].host_id == 'myhostid'
+        assert res[0].timings == self.cls.timings
         assert mock_logger.mock_calls == [
             call.warning('Running with --dummy - only DummySensor() will be '
                          'loaded')
         ]
 
+    def test_make_session(self):
+        res = self.cls._make_session(3)
+        assert isinstance(res, requests.Session)
+        adapter = res.get_adapter('http://foo.bar.baz:1234/')
+        assert adapter._pool_connections == 1
+        assert adapter._pool_maxsize == 3
+
     def test_read_and_send(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            read_sensors=DEFAULT,
+            send_data=DEFAULT
+        ) as mocks:
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1234.5
+                mocks['read_sensors'].return_value = {'foo': 'bar'}
+                self.cls.read_and_send()
+        assert mocks['read_sensors'].mock_calls == [call(self.cls)]
+        assert mocks['send_data'].mock_calls == [
+            call(self.cls, {'foo': 'bar'}, timestamp=1234.5)
+        ]
+        assert self.cls.timings.summary('cycle')['count'] == 1
+
+    def test_read_and_send_nothing_due(self):
+        with patch.multiple(
+            pb,
+            autospec=True,
+            read_sensors=DEFAULT,
+            send_data=DEFAULT,
+            log_timings=DEFAULT,
+            update_metrics=DEFAULT
+        ) as mocks:
+            mocks['read_sensors'].return_value = None
+            self.cls.read_and_send()
+        assert mocks['read_sensors'].mock_calls == [call(self.cls)]
+        assert mocks['send_data'].mock_calls == []
+        assert mocks['log_timings'].mock_calls == []
+        assert mocks['update_metrics'].mock_calls == []
+
+    def test_read_and_send_adaptive(self):
+        self.cls.adaptive = Mock(spec_set=AdaptiveInterval)
+        with patch.multiple(
+            pb,
+            autospec=True,
+            read_sensors=DEFAULT,
+            send_data=DEFAULT
+        ) as mocks:
+            mocks['read_sensors'].return_value = {
+                'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}
+            }
+            self.cls.read_and_send()
+        assert self.cls.adaptive.mock_calls == [
+            call.update({'s1': {'value': 1.0}})
+        ]
+
+    def test_next_interval(self):
+        assert self.cls.next_interval() == 60.0
+
+    def test_log_timings_disabled(self):
+        self.cls.timings.record('foo', 1.0)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            self.cls.log_timings()
+        assert mock_logger.mock_calls == []
+
+    def test_log_timings_not_due(self):
+        self.cls.timing_interval = 60.0
+        self.cls._timings_logged = 100.0
+        self.cls.timings.record('foo', 1.0)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                mock_mono.return_value = 150.0
+                self.cls.log_timings()
+        assert mock_logger.mock_calls == []
+        assert self.cls._timings_logged == 100.0
+
+    def test_log_timings(self):
+        self.cls.timing_interval = 60.0
+        self.cls._timings_logged = 100.0
+        self.cls.timings.record('foo', 1.0)
+        self.cls.timings.record('bar', 2.0)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                mock_mono.return_value = 160.0
+                self.cls.log_timings()
+        assert self.cls._timings_logged == 160.0
+        assert mock_logger.mock_calls == [
+            call.info('Timing for %s over last %d: p50=%.4fs p95=%.4fs '
+                      'max=%.4fs', 'bar', 1, 2.0, 2.0, 2.0),
+            call.info('Timing for %s over last %d: p50=%.4fs p95=%.4fs '
+                      'max=%.4fs', 'foo', 1, 1.0, 1.0, 1.0)
+        ]
+
+    def test_read_sensors(self):
 
         def se_exc():
             raise Exception()
 
         s1 = Mock(spec_set=BaseSensor)
-        s1.read.return_value = {
-            'sensor1': {'data': 's1data'},
-            'sensor2': {'data': 's2data'},
-        }
+        s1.read_iter.return_value = iter([
+            ('sensor1', {'data': 's1data'}),
+            ('sensor2', {'data': 's2data'})
+        ])
 
         s2 = Mock(spec_set=BaseSensor)
-        s2.read.side_effect = se_exc
+        s2.read_iter.side_effect = se_exc
 
         s3 = Mock(spec_set=BaseSensor)
-        s3.read.return_value = {
-            'sensor31': {'data': 's31data'},
-            'sensor32': {'data': 's32data'},
-        }
+        s3.read_iter.return_value = iter([
+            ('sensor31', {'data': 's31data'}),
+            ('sensor32', {'data': 's32data'})
+        ])
 
         self.cls.sensors = [s1, s2, s3]
 
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.requests.post' % pbm, autospec=True) as mock_post:
-                mock_post.return_value = Mock(status_code=201)
-                self.cls.read_and_send()
-        url = 'http://foo.bar.baz:1234/v1/sensors/update'
-        data = {
-             'host_id': 'myhostid',
-             'sensors': {
-                 'sensor1': {'data': 's1data'},
-                 'sensor2': {'data': 's2data'},
-                 'sensor31': {'data': 's31data'},
-                 'sensor32': {'data': 's32data'},
-             }
-         }
-        assert mock_post.mock_calls == [
-            call(url, json=data)
+            res = self.cls.read_sensors()
+        assert res == {
+            'host_id': 'myhostid',
+            'sensors': {
+                'sensor1': {'data': 's1data'},
+                'sensor2': {'data': 's2data'},
+                'sensor31': {'data': 's31data'},
+                'sensor32': {'data': 's32data'},
+            }
+        }
+        assert mock_logger.mock_calls == [
+            call.debug('Reading sensors'),
+            call.exception('Exception reading sensor %s', 'BaseSensor')
+        ]
+        assert self.cls.timings.summary('read.BaseSensor')['count'] == 3
+        assert self.cls.class_read_errors == {'BaseSensor': 1}
+
+    def test_count_read_errors(self):
+        self.cls.read_errors = {'s1': 2}
+        self.cls._count_read_errors({
+            's1': {'value': None},
+            's2': {'value': 1.0},
+            's3': {'value': None}
+        })
+        assert self.cls.read_errors == {'s1': 3, 's2': 0, 's3': 1}
+
+    def test_update_metrics_disabled(self):
+        self.cls._latest = {'foo': {'s1': {'value': 1.0}}}
+        self.cls.update_metrics()
+
+    def test_update_metrics(self):
+        self.cls.metrics = Mock(spec_set=MetricsExporter)
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls.buffer.__len__.return_value = 3
+        self.cls._latest = {
+            'c1': {'s1': {'value': 1.0}},
+            'c2': {'s2': {'value': 2.0}}
+        }
+        self.cls._batch = [{'timestamp': 1.0, 'sensors': {}}]
+        self.cls.read_errors = {'s1': 1}
+        self.cls.class_read_errors = {'c2': 2}
+        self.cls.timings.record('cycle', 1.0)
+        self.cls.update_metrics()
+        assert self.cls.metrics.mock_calls == [
+            call.update(
+                {'s1': {'value': 1.0}, 's2': {'value': 2.0}},
+                {'s1': 1},
+                {'c2': 2},
+                {'cycle': {'count': 1, 'p50': 1.0, 'p95': 1.0, 'max': 1.0}},
+                3,
+                1
+            )
+        ]
+
+    def test_read_sensors_class_intervals(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.read_iter.side_effect = [
+            iter([('sensor1', {'value': 1})]),
+            iter([('sensor1', {'value': 2})])
+        ]
+        s2 = Mock(spec_set=BaseSensor)
+        s2.read_iter.side_effect = [
+            iter([('sensor2', {'value': 3})]),
+            iter([('sensor2', {'value': 4})]),
+            iter([('sensor2', {'value': 5})])
         ]
+        self.cls.sensors = [s1, s2]
+        self.cls.loop_interval = 10.0
+        self.cls.class_intervals = {s1: 20.0, s2: 10.0}
+
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                mock_mono.side_effect = [100.0, 110.1, 119.8]
+                res = [self.cls.read_sensors() for x in range(3)]
+        assert [r['sensors'] for r in res] == [
+            {'sensor1': {'value': 1}, 'sensor2': {'value': 3}},
+            {'sensor1': {'value': 1}, 'sensor2': {'value': 4}},
+            {'sensor1': {'value': 2}, 'sensor2': {'value': 5}}
+        ]
+        assert len(s1.read_iter.mock_calls) == 2
+        assert len(s2.read_iter.mock_calls) == 3
         assert mock_logger.mock_calls == [
             call.debug('Reading sensors'),
-            call.exception('Exception reading sensor %s', 'BaseSensor'),
-            call.debug('POSTing sensor data to %s: %s', url, data),
-            call.info('POSTed sensor data to Engine')
+            call.debug('Reading sensors'),
+            call.debug('Sensor class %s not due for polling; using previous '
+                       'readings', 'BaseSensor'),
+            call.debug('Reading sensors')
         ]
 
-    def test_read_and_send_bad_status_code(self):
+    def test_read_sensors_intervals_not_multiples(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.read_iter.side_effect = lambda: iter([('sensor1', {'value': 1})])
+        s2 = Mock(spec_set=BaseSensor)
+        s2.read_iter.side_effect = lambda: iter([('sensor2', {'value': 2})])
+        s3 = Mock(spec_set=BaseSensor)
+        s3.read_iter.side_effect = lambda: iter([('sensor3', {'value': 3})])
+        self.cls.sensors = [s1, s2, s3]
+        self.cls.interval = 60.0
+        # s3 uses the global interval
+        self.cls.class_intervals = {s1: 90.0, s2: 45.0}
+        self.cls.loop_interval = 15.0
+        polls = {s1: [], s2: [], s3: []}
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                for tick in range(25):
+                    # a little timing jitter either way
+                    now = 1000.0 + tick * 15.0 + (0.2 if tick % 2 else -0.2)
+                    mock_mono.return_value = now
+                    for s in polls:
+                        s.read_iter.reset_mock()
+                    self.cls.read_sensors()
+                    for s in polls:
+                        if s.read_iter.called:
+                            polls[s].append(tick * 15)
+        assert polls[s1] == [0, 90, 180, 270, 360]
+        assert polls[s2] == [0, 45, 90, 135, 180, 225, 270, 315, 360]
+        assert polls[s3] == [0, 60, 120, 180, 240, 300, 360]
+
+    def test_read_sensors_nothing_due(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.read_iter.side_effect = lambda: iter([('sensor1', {'value': 1})])
+        s2 = Mock(spec_set=BaseSensor)
+        s2.read_iter.side_effect = lambda: iter([('sensor2', {'value': 2})])
+        self.cls.sensors = [s1, s2]
+        self.cls.interval = 60.0
+        self.cls.class_intervals = {s1: 61.0}
+        self.cls.loop_interval = 1.0
+        res = []
+        with patch('%s.logger' % pbm, autospec=True):
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                for tick in range(62):
+                    mock_mono.return_value = 1000.0 + tick
+                    res.append(self.cls.read_sensors())
+        sent = [x for x, r in enumerate(res) if r is not None]
+        assert sent == [0, 60, 61]
+        assert len(s1.read_iter.mock_calls) == 2
+        assert len(s2.read_iter.mock_calls) == 2
+        assert res[60]['sensors'] == {
+            'sensor1': {'value': 1}, 'sensor2': {'value': 2}
+        }
+
+    def test_class_due_now_late(self):
+        s1 = Mock(spec_set=BaseSensor)
+        self.cls.class_intervals = {s1: 60.0}
+        self.cls.loop_interval = 15.0
+        assert self.cls._class_due_now(s1, 100.0) is True
+        assert self.cls._class_due[s1] == 160.0
+        assert self.cls._class_due_now(s1, 152.6) is True
+        assert self.cls._class_due[s1] == 220.0
+        # more than half a loop interval late; restart from now
+        assert self.cls._class_due_now(s1, 230.0) is True
+        assert self.cls._class_due[s1] == 290.0
+        assert self.cls._class_due_now(s1, 282.4) is False
+
+    def test_read_sensors_cached(self):
         s1 = Mock(spec_set=BaseSensor)
-        s1.read.return_value = {
-            'sensor1': {'data': 's1data'},
-            'sensor2': {'data': 's2data'},
+        s1.cached_read.return_value = {
+            'sensor1': {'value': 1.0, 'read_time': 1234.5}
         }
+        s2 = Mock(spec_set=BaseSensor)
+        s2.read_iter.return_value = iter([('sensor2', {'value': 2.0})])
+        self.cls.sensors = [s1, s2]
+        self.cls._cached_sensors = set([s1])
+        with patch('%s.logger' % pbm, autospec=True):
+            res = self.cls.read_sensors()
+        assert res['sensors'] == {
+            'sensor1': {'value': 1.0, 'read_time': 1234.5},
+            'sensor2': {'value': 2.0}
+        }
+        assert s1.mock_calls == [call.cached_read()]
+        assert s2.mock_calls == [call.read_iter()]
 
+    def test_read_sensors_exception_clears_previous(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.read_iter.side_effect = [
+            iter([('sensor1', {'value': 1})]), RuntimeError()
+        ]
         self.cls.sensors = [s1]
+        with patch('%s.logger' % pbm, autospec=True):
+            res1 = self.cls.read_sensors()
+            res2 = self.cls.read_sensors()
+        assert res1['sensors'] == {'sensor1': {'value': 1}}
+        assert res2['sensors'] == {}
 
+    def test_read_sensors_parallel(self):
+        s1 = Mock(spec_set=BaseSensor)
+        s1.read_iter.return_value = iter([('sensor1', {'value': 1.0})])
+        s2 = Mock(spec_set=BaseSensor)
+        s2.read_iter.side_effect = RuntimeError()
+        s3 = Mock(spec_set=BaseSensor)
+        s3.read_iter.return_value = iter([('sensor3', {'value': None})])
+        self.cls.sensors = [s1, s2, s3]
+        self.cls.parallel_reads = True
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.requests.post' % pbm, autospec=True) as mock_post:
-                mock_post.return_value = Mock(status_code=404, text='foo')
-                self.cls.read_and_send()
-        url = 'http://foo.bar.baz:1234/v1/sensors/update'
-        data = {
-             'host_id': 'myhostid',
-             'sensors': {
-                 'sensor1': {'data': 's1data'},
-                 'sensor2': {'data': 's2data'}
-             }
-         }
-        assert mock_post.mock_calls == [
-            call(url, json=data)
+            res = self.cls.read_sensors()
+        assert res['sensors'] == {
+            'sensor1': {'value': 1.0},
+            'sensor3': {'value': None}
+        }
+        assert mock_logger.mock_calls == [
+            call.debug('Reading sensors'),
+            call.exception('Exception reading sensor %s', 'BaseSensor')
         ]
+        assert self.cls.class_read_errors == {'BaseSensor': 1}
+        assert self.cls.read_errors == {'sensor1': 0, 'sensor3': 1}
+        assert self.cls._busy == {}
+
+    def test_read_sensors_parallel_timeout(self):
+        release = threading.Event()
+
+        def se_slow():
+            yield 'sensor2a', {'value': 4.0}
+            release.wait(5.0)
+            yield 'sensor2', {'value': 3.0}
+
+        s1 = Mock(spec_set=BaseSensor)
+        s1.read_iter.side_effect = lambda: iter([('sensor1', {'value': 1.0})])
+        s2 = Mock(spec_set=BaseSensor)
+        s2.read_iter.side_effect = se_slow
+        self.cls.sensors = [s1, s2]
+        self.cls.parallel_reads = True
+        self.cls.class_timeout = 0.1
+        self.cls._latest = {s2: {'sensor2': {'value': 2.0, 'type': 'foo'}}}
+        try:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                res1 = self.cls.read_sensors()
+                res2 = self.cls.read_sensors()
+        finally:
+            release.set()
+        assert res1['sensors'] == {
+            'sensor1': {'value': 1.0},
+            'sensor2': {'value': None, 'type': 'foo'},
+            'sensor2a': {'value': 4.0}
+        }
+        assert res2['sensors'] == {
+            'sensor1': {'value': 1.0},
+            'sensor2': {'value': None, 'type': 'foo'},
+            'sensor2a': {'value': None}
+        }
         assert mock_logger.mock_calls == [
             call.debug('Reading sensors'),
-            call.debug('POSTing sensor data to %s: %s', url, data),
-            call.error('Error POSTing sensor data; got status code %s: %s',
+            call.warning('Sensor class %s did not return readings within '
+                         '%ss', 'BaseSensor', 0.1),
+            call.debug('Reading sensors'),
+            call.warning('Sensor class %s is still busy with a previous '
+                         'read; not reading it this cycle', 'BaseSensor')
+        ]
+        assert len(s1.read_iter.mock_calls) == 2
+        assert len(s2.read_iter.mock_calls) == 1
+        assert self.cls.read_errors == {
+            'sensor1': 0, 'sensor2': 2, 'sensor2a': 1
+        }
+        assert list(self.cls._busy.keys()) == [s2]
+        self.cls._busy[s2].join(5.0)
+        with patch('%s.logger' % pbm, autospec=True):
+            res3 = self.cls.read_sensors()
+        assert res3['sensors'] == {
+            'sensor1': {'value': 1.0},
+            'sensor2': {'value': 3.0},
+            'sensor2a': {'value': 4.0}
+        }
+        assert self.cls._busy == {}
+
+    def test_send_data(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=201)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_data(data)
+        assert res is True
+        url = 'http://foo.bar.baz:1234/v1/sensors/update'
+        assert self.cls.session.mock_calls == [
+            call.put(url, data=json.dumps(data).encode('utf-8'),
+                     headers={'Content-Type': 'application/json'},
+                     timeout=(10.0, 30.0))
+        ]
+        assert mock_logger.mock_calls == [
+            call.debug('PUTting sensor data to %s: %s', url, data),
+            call.info('PUT sensor data to Engine')
+        ]
+
+    def test_send_data_bad_status_code(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=404, text='foo')
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_data(data)
+        assert res is False
+        url = 'http://foo.bar.baz:1234/v1/sensors/update'
+        assert self.cls.session.mock_calls == [
+            call.put(url, data=json.dumps(data).encode('utf-8'),
+                     headers={'Content-Type': 'application/json'},
+                     timeout=(10.0, 30.0))
+        ]
+        assert mock_logger.mock_calls == [
+            call.debug('PUTting sensor data to %s: %s', url, data),
+            call.error('Error PUTting sensor data; got status code %s: %s',
                        404, 'foo')
         ]
 
-    def test_read_and_send_exception(self):
+    def test_send_data_exception(self):
 
         def se_exc(*args, **kwargs):
             raise Exception()
 
-        s1 = Mock(spec_set=BaseSensor)
-        s1.read.return_value = {
-            'sensor1': {'data': 's1data'},
-            'sensor2': {'data': 's2data'},
-        }
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.side_effect = se_exc
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_data(data)
+        assert res is False
+        url = 'http://foo.bar.baz:1234/v1/sensors/update'
+        assert self.cls.session.mock_calls == [
+            call.put(url, data=json.dumps(data).encode('utf-8'),
+                     headers={'Content-Type': 'application/json'},
+                     timeout=(10.0, 30.0))
+        ]
+        assert mock_logger.mock_calls == [
+            call.debug('PUTting sensor data to %s: %s', url, data),
+            call.exception('Exception caught when trying to PUT data to '
+                           'Engine; will try again at next interval.')
+        ]
 
-        self.cls.sensors = [s1]
+    def test_send_data_dry_run(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.dry_run = True
+        self.cls.session = Mock(spec_set=requests.Session)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_data(data)
+        assert res is False
+        assert self.cls.session.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.warning('DRY RUN - would PUT sensor data to %s: %s',
+                         'http://foo.bar.baz:1234/v1/sensors/update', data)
+        ]
+
+    def test_send_data_buffer_failure(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls.buffer.__len__.return_value = 3
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _send_update=DEFAULT,
+            drain_buffer=DEFAULT
+        ) as mocks:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mocks['_send_update'].return_value = False
+                res = self.cls.send_data(data, timestamp=1234.5)
+        assert res is False
+        assert mocks['_send_update'].mock_calls == [call(self.cls, data)]
+        assert mocks['drain_buffer'].mock_calls == []
+        assert self.cls.buffer.mock_calls == [
+            call.push(1234.5, {'s1': {'data': 's1data'}}),
+            call.__len__()
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning('Stored sensor data in send buffer (%d entries)', 3)
+        ]
+
+    def test_send_data_buffer_success(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _send_update=DEFAULT,
+            drain_buffer=DEFAULT
+        ) as mocks:
+            mocks['_send_update'].return_value = True
+            res = self.cls.send_data(data, timestamp=1234.5)
+        assert res is True
+        assert mocks['drain_buffer'].mock_calls == [call(self.cls)]
+        assert self.cls.buffer.mock_calls == []
+
+    def test_send_data_batching(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'data': 's1data'}}}
+        self.cls.batch_size = 10
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _send_update=DEFAULT,
+            _add_to_batch=DEFAULT
+        ) as mocks:
+            mocks['_add_to_batch'].return_value = False
+            res = self.cls.send_data(data, timestamp=1234.5)
+        assert res is False
+        assert mocks['_send_update'].mock_calls == []
+        assert mocks['_add_to_batch'].mock_calls == [
+            call(self.cls, data, 1234.5)
+        ]
+
+    def test_send_data_delta(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        delta = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        self.cls.delta = True
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _send_update=DEFAULT,
+            _delta_payload=DEFAULT
+        ) as mocks:
+            mocks['_delta_payload'].return_value = (delta, {'s1': 'state'})
+            mocks['_send_update'].return_value = True
+            res = self.cls.send_data(data, timestamp=1234.5)
+        assert res is True
+        assert mocks['_delta_payload'].mock_calls == [call(self.cls, data)]
+        assert mocks['_send_update'].mock_calls == [call(self.cls, delta)]
+        assert self.cls._delta_state == {'s1': 'state'}
+
+    def test_send_data_delta_failure(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        delta = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        self.cls.delta = True
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _send_update=DEFAULT,
+            _delta_payload=DEFAULT
+        ) as mocks:
+            with patch('%s.logger' % pbm, autospec=True):
+                mocks['_delta_payload'].return_value = (
+                    delta, {'s1': 'state'}
+                )
+                mocks['_send_update'].return_value = False
+                res = self.cls.send_data(data, timestamp=1234.5)
+        assert res is False
+        assert self.cls._delta_state == {}
+        assert self.cls.buffer.push.mock_calls == [
+            call(1234.5, {'s1': {'value': 1.0}})
+        ]
 
+    def test_send_data_no_sensors(self):
+        data = {'host_id': 'myhostid', 'sensors': {}}
+        self.cls.session = Mock(spec_set=requests.Session)
         with patch('%s.logger' % pbm, autospec=True) as mock_logger:
-            with patch('%s.requests.post' % pbm, autospec=True) as mock_post:
-                mock_post.side_effect = se_exc
-                self.cls.read_and_send()
-        url = 'http://foo.bar.baz:1234/v1/sensors/update'
+            res = self.cls.send_data(data)
+        assert res is True
+        assert self.cls.session.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.debug('No sensor data to send')
+        ]
+
+    def test_send_data_delta_nothing_changed(self):
+        data = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        self.cls.delta = True
+        with patch.multiple(
+            pb,
+            autospec=True,
+            _send_update=DEFAULT,
+            _delta_payload=DEFAULT
+        ) as mocks:
+            mocks['_delta_payload'].return_value = (
+                {'host_id': 'myhostid', 'sensors': {}}, {}
+            )
+            res = self.cls.send_data(data, timestamp=1234.5)
+        assert res is True
+        assert mocks['_send_update'].mock_calls == []
+
+    def test_delta_payload(self):
+        self.cls.deadband = 0.5
+        self.cls._delta_state = {
+            # unchanged info, value within deadband
+            's1': ({'type': 't', 'alias': 'a'}, 20.0, 90.0, 90.0),
+            # unchanged info, value outside deadband
+            's2': ({'type': 't'}, 20.0, 90.0, 90.0),
+            # changed info
+            's3': ({'type': 't', 'alias': 'old'}, 20.0, 90.0, 90.0),
+            # heartbeat expired
+            's4': ({'type': 't'}, 20.0, 90.0, -250.0),
+            # value went to None
+            's5': ({'type': 't'}, 20.0, 90.0, 90.0),
+        }
         data = {
-             'host_id': 'myhostid',
-             'sensors': {
-                 'sensor1': {'data': 's1data'},
-                 'sensor2': {'data': 's2data'}
-             }
-         }
-        assert mock_post.mock_calls == [
-            call(url, json=data)
+            'host_id': 'myhostid',
+            'sensors': {
+                's1': {'type': 't', 'alias': 'a', 'value': 20.25},
+                's2': {'type': 't', 'value': 21.0},
+                's3': {'type': 't', 'alias': 'new', 'value': 20.0},
+                's4': {'type': 't', 'value': 20.0},
+                's5': {'type': 't', 'value': None},
+                's6': {'type': 'new', 'value': 1.0}
+            }
+        }
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 100.0
+            res, state = self.cls._delta_payload(data)
+        assert res == {
+            'host_id': 'myhostid',
+            'sensors': {
+                's2': {'value': 21.0},
+                's3': {'type': 't', 'alias': 'new', 'value': 20.0},
+                's4': {'type': 't', 'value': 20.0},
+                's5': {'value': None},
+                's6': {'type': 'new', 'value': 1.0}
+            }
+        }
+        assert state == {
+            's2': ({'type': 't'}, 21.0, 100.0, 90.0),
+            's3': ({'type': 't', 'alias': 'new'}, 20.0, 100.0, 100.0),
+            's4': ({'type': 't'}, 20.0, 100.0, 100.0),
+            's5': ({'type': 't'}, None, 100.0, 90.0),
+            's6': ({'type': 'new'}, 1.0, 100.0, 100.0)
+        }
+
+    def test_delta_payload_read_time(self):
+        self.cls._delta_state = {
+            's1': ({'type': 't'}, 20.0, 90.0, 90.0)
+        }
+        data = {
+            'host_id': 'myhostid',
+            'sensors': {
+                's1': {'type': 't', 'value': 21.0, 'read_time': 1234.5}
+            }
+        }
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 100.0
+            res, state = self.cls._delta_payload(data)
+        assert res['sensors'] == {'s1': {'value': 21.0, 'read_time': 1234.5}}
+        assert state == {'s1': ({'type': 't'}, 21.0, 100.0, 90.0)}
+
+    def test_delta_payload_no_deadband(self):
+        self.cls._delta_state = {
+            's1': ({'type': 't'}, 20.0, 90.0, 90.0)
+        }
+        data = {
+            'host_id': 'myhostid',
+            'sensors': {'s1': {'type': 't', 'value': 20.0}}
+        }
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.return_value = 100.0
+            res, state = self.cls._delta_payload(data)
+        assert res == {
+            'host_id': 'myhostid',
+            'sensors': {'s1': {'value': 20.0}}
+        }
+
+    def test_within_deadband(self):
+        self.cls.deadband = 0.5
+        assert self.cls._within_deadband(1.0, 1.0) is True
+        assert self.cls._within_deadband(1.0, 1.4) is True
+        assert self.cls._within_deadband(1.0, 1.5) is False
+        assert self.cls._within_deadband(None, None) is True
+        assert self.cls._within_deadband(None, 1.0) is False
+        assert self.cls._within_deadband(1.0, None) is False
+
+    def test_add_to_batch_size(self):
+        self.cls.batch_size = 2
+        with patch('%s.flush_batch' % pb, autospec=True) as mock_flush:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                with patch('%s.logger' % pbm, autospec=True):
+                    mock_mono.return_value = 100.0
+                    mock_flush.return_value = True
+                    res1 = self.cls._add_to_batch(
+                        {'sensors': {'s1': 1}}, 1.0
+                    )
+                    assert mock_flush.mock_calls == []
+                    res2 = self.cls._add_to_batch(
+                        {'sensors': {'s1': 2}}, 2.0
+                    )
+        assert res1 is False
+        assert res2 is True
+        assert mock_flush.mock_calls == [call(self.cls)]
+        assert self.cls._batch == [
+            {'timestamp': 1.0, 'sensors': {'s1': 1}},
+            {'timestamp': 2.0, 'sensors': {'s1': 2}}
+        ]
+        assert self.cls._batch_started == 100.0
+
+    def test_add_to_batch_age(self):
+        self.cls.batch_age = 30.0
+        with patch('%s.flush_batch' % pb, autospec=True) as mock_flush:
+            with patch('%s.monotonic_time' % pbm) as mock_mono:
+                with patch('%s.logger' % pbm, autospec=True):
+                    mock_mono.side_effect = [100.0, 100.0, 120.0, 130.0]
+                    mock_flush.return_value = True
+                    self.cls._add_to_batch({'sensors': {'s1': 1}}, 1.0)
+                    self.cls._add_to_batch({'sensors': {'s1': 2}}, 2.0)
+                    assert mock_flush.mock_calls == []
+                    res = self.cls._add_to_batch({'sensors': {'s1': 3}}, 3.0)
+        assert res is True
+        assert mock_flush.mock_calls == [call(self.cls)]
+
+    def test_flush_batch(self):
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        samples = [{'timestamp': 1.0, 'sensors': {'s1': 1}}]
+        self.cls._batch = samples
+        self.cls._batch_started = 100.0
+        with patch.multiple(
+            pb,
+            autospec=True,
+            send_batch=DEFAULT,
+            drain_buffer=DEFAULT
+        ) as mocks:
+            mocks['send_batch'].return_value = True
+            res = self.cls.flush_batch()
+        assert res is True
+        assert mocks['send_batch'].mock_calls == [call(self.cls, samples)]
+        assert mocks['drain_buffer'].mock_calls == [call(self.cls)]
+        assert self.cls._batch == []
+        assert self.cls._batch_started is None
+
+    def test_flush_batch_empty(self):
+        with patch('%s.send_batch' % pb, autospec=True) as mock_send:
+            res = self.cls.flush_batch()
+        assert res is True
+        assert mock_send.mock_calls == []
+
+    def test_flush_batch_failure_buffer(self):
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls.buffer.__len__.return_value = 2
+        samples = [
+            {'timestamp': 1.0, 'sensors': {'s1': 1}},
+            {'timestamp': 2.0, 'sensors': {'s1': 2}}
+        ]
+        self.cls._batch = samples
+        with patch.multiple(
+            pb,
+            autospec=True,
+            send_batch=DEFAULT,
+            drain_buffer=DEFAULT
+        ) as mocks:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mocks['send_batch'].return_value = False
+                res = self.cls.flush_batch()
+        assert res is False
+        assert mocks['drain_buffer'].mock_calls == []
+        assert self.cls.buffer.mock_calls == [
+            call.push(1.0, {'s1': 1}),
+            call.push(2.0, {'s1': 2}),
+            call.__len__()
         ]
         assert mock_logger.mock_calls == [
-            call.debug('Reading sensors'),
-            call.debug('POSTing sensor data to %s: %s', url, data),
-            call.exception('Exception caught when trying to POST data to '
-                           'Engine; will try again at next interval.')
+            call.warning('Stored %d samples in send buffer (%d entries)', 2, 2)
+        ]
+
+    def test_flush_batch_dry_run(self):
+        self.cls.dry_run = True
+        samples = [{'timestamp': 1.0, 'sensors': {'s1': 1}}]
+        self.cls._batch = samples
+        with patch('%s.send_batch' % pb, autospec=True) as mock_send:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                res = self.cls.flush_batch()
+        assert res is False
+        assert mock_send.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.warning('DRY RUN - would PUT batch of %d samples to %s: %s',
+                         1, 'http://foo.bar.baz:1234/v1/sensors/update_batch',
+                         samples)
+        ]
+
+    def test_put_compress_gzip(self):
+        payload = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        body = json.dumps(payload).encode('utf-8')
+        self.cls.compression = 'gzip'
+        self.cls.compress_min_bytes = 10
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=201)
+        res = self.cls._put('http://foo/', payload)
+        assert res == self.cls.session.put.return_value
+        assert len(self.cls.session.put.mock_calls) == 1
+        args, kwargs = self.cls.session.put.call_args
+        assert args == ('http://foo/', )
+        assert kwargs['headers'] == {
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip'
+        }
+        assert kwargs['timeout'] == (10.0, 30.0)
+        assert gzip.GzipFile(
+            fileobj=io.BytesIO(kwargs['data'])
+        ).read() == body
+
+    def test_put_compress_deflate(self):
+        payload = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        body = json.dumps(payload).encode('utf-8')
+        self.cls.compression = 'deflate'
+        self.cls.compress_min_bytes = 10
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=201)
+        self.cls._put('http://foo/', payload)
+        args, kwargs = self.cls.session.put.call_args
+        assert kwargs['headers']['Content-Encoding'] == 'deflate'
+        assert zlib.decompress(kwargs['data']) == body
+
+    def test_put_timings(self):
+        payload = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        self.cls.compression = 'gzip'
+        self.cls.compress_min_bytes = 10
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=201)
+        self.cls._put('http://foo/', payload)
+        assert self.cls.timings.names() == ['compress', 'http', 'serialize']
+
+    def test_put_compress_too_small(self):
+        payload = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        body = json.dumps(payload).encode('utf-8')
+        self.cls.compression = 'gzip'
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls._put('http://foo/', payload)
+        assert self.cls.session.mock_calls == [
+            call.put('http://foo/', data=body,
+                     headers={'Content-Type': 'application/json'},
+                     timeout=(10.0, 30.0))
+        ]
+
+    def test_put_compress_unsupported(self):
+        payload = {'host_id': 'myhostid', 'sensors': {'s1': {'value': 1.0}}}
+        body = json.dumps(payload).encode('utf-8')
+        self.cls.compression = 'deflate'
+        self.cls.compress_min_bytes = 10
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.side_effect = [
+            Mock(status_code=415), Mock(status_code=201)
+        ]
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls._put('http://foo/', payload)
+        assert res.status_code == 201
+        assert self.cls.compression is None
+        assert self.cls.session.put.mock_calls[1] == call(
+            'http://foo/', data=body,
+            headers={'Content-Type': 'application/json'},
+            timeout=(10.0, 30.0)
+        )
+        assert mock_logger.mock_calls[1] == call.warning(
+            'Engine does not accept %s-encoded requests; disabling '
+            'compression', 'deflate'
+        )
+
+    def test_send_batch(self):
+        samples = [{'timestamp': 1.0, 'sensors': {'s1': {'value': 1}}}]
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=202)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_batch(samples)
+        assert res is True
+        url = 'http://foo.bar.baz:1234/v1/sensors/update_batch'
+        assert self.cls.session.mock_calls == [
+            call.put(url, data=json.dumps(
+                {'host_id': 'myhostid', 'samples': samples}
+            ).encode('utf-8'), headers={'Content-Type': 'application/json'},
+                timeout=(10.0, 30.0))
+        ]
+        assert mock_logger.mock_calls == [
+            call.debug('PUTting batch of %d samples to %s', 1, url),
+            call.info('PUT batch of %d samples to Engine', 1)
+        ]
+
+    def test_send_batch_bad_status_code(self):
+        samples = [{'timestamp': 1.0, 'sensors': {'s1': {'value': 1}}}]
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.return_value = Mock(status_code=500, text='foo')
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_batch(samples)
+        assert res is False
+        assert mock_logger.mock_calls[1] == call.error(
+            'Error PUTting sensor data batch; got status code %s: %s',
+            500, 'foo'
+        )
+
+    def test_send_batch_exception(self):
+        samples = [{'timestamp': 1.0, 'sensors': {'s1': {'value': 1}}}]
+        self.cls.session = Mock(spec_set=requests.Session)
+        self.cls.session.put.side_effect = RuntimeError()
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = self.cls.send_batch(samples)
+        assert res is False
+        assert mock_logger.mock_calls[1] == call.exception(
+            'Exception caught when trying to PUT data batch to Engine'
+        )
+
+    def test_drain_buffer(self):
+        self.cls.backfill_batch_size = 2
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls.buffer.peek.side_effect = [
+            [(1, 1.0, {'s': 1}), (2, 2.0, {'s': 2})],
+            [(3, 3.0, {'s': 3})],
+            []
+        ]
+        self.cls.buffer.__len__.return_value = 0
+        with patch('%s.send_batch' % pb, autospec=True) as mock_send:
+            with patch('%s.logger' % pbm, autospec=True):
+                mock_send.return_value = True
+                self.cls.drain_buffer()
+        assert mock_send.mock_calls == [
+            call(self.cls, [
+                {'timestamp': 1.0, 'sensors': {'s': 1}},
+                {'timestamp': 2.0, 'sensors': {'s': 2}}
+            ]),
+            call(self.cls, [{'timestamp': 3.0, 'sensors': {'s': 3}}])
         ]
+        assert self.cls.buffer.remove.mock_calls == [call([1, 2]), call([3])]
+        assert self.cls.buffer.peek.mock_calls == [call(2), call(2), call(2)]
+        assert self.cls._drain_lock.acquire(False) is True
+
+    def test_drain_buffer_failure(self):
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls.buffer.peek.return_value = [(1, 1.0, {'s': 1})]
+        with patch('%s.send_batch' % pb, autospec=True) as mock_send:
+            mock_send.return_value = False
+            self.cls.drain_buffer()
+        assert len(mock_send.mock_calls) == 1
+        assert self.cls.buffer.remove.mock_calls == []
+
+    def test_drain_buffer_max_batches(self):
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls.buffer.peek.return_value = [(1, 1.0, {'s': 1})]
+        with patch('%s.send_batch' % pb, autospec=True) as mock_send:
+            with patch('%s.logger' % pbm, autospec=True):
+                mock_send.return_value = True
+                self.cls.drain_buffer(max_batches=3)
+        assert len(mock_send.mock_calls) == 3
+
+    def test_drain_buffer_already_draining(self):
+        self.cls.buffer = MagicMock(spec_set=SendBuffer)
+        self.cls._drain_lock.acquire()
+        with patch('%s.send_batch' % pb, autospec=True) as mock_send:
+            self.cls.drain_buffer()
+        assert mock_send.mock_calls == []
+        assert self.cls.buffer.mock_calls == []
 
     def test_find_host_id(self):
         with patch('%s.SystemID.id_string' % pbm,
@@ -0,0 +1,172 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import pytest
+
+from rpymostat_sensor.timing import (
+    TimingStats, null_timer, profile_imports, parse_importtime, IMPORT_MARKER
+)
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.timing'
+pb = '%s.TimingStats' % pbm
+
+
+class TestNullTimer(object):
+
+    def test_null_timer(self):
+        with null_timer():
+            x = 1
+        assert x == 1
+
+
+class TestTimingStats(object):
+
+    def setup(self):
+        self.cls = TimingStats(window=4)
+
+    def test_init(self):
+        assert self.cls.window == 4
+        assert self.cls._samples == {}
+
+    def test_record(self):
+        for x in range(6):
+            self.cls.record('foo', float(x))
+        self.cls.record('bar', 1.5)
+        assert list(self.cls._samples['foo']) == [2.0, 3.0, 4.0, 5.0]
+        assert list(self.cls._samples['bar']) == [1.5]
+        assert self.cls.names() == ['bar', 'foo']
+
+    def test_timer(self):
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.side_effect = [10.0, 10.25]
+            with self.cls.timer('foo'):
+                pass
+        assert list(self.cls._samples['foo']) == [0.25]
+
+    def test_timer_exception(self):
+        with patch('%s.monotonic_time' % pbm) as mock_mono:
+            mock_mono.side_effect = [10.0, 11.0]
+            with pytest.raises(RuntimeError):
+                with self.cls.timer('foo'):
+                    raise RuntimeError()
+        assert list(self.cls._samples['foo']) == [1.0]
+
+    def test_summary_none(self):
+        assert self.cls.summary('foo') is None
+
+    def test_summary(self):
+        self.cls.window = 100
+        for x in range(100, 0, -1):
+            self.cls.record('foo', float(x))
+        assert self.cls.summary('foo') == {
+            'count': 100,
+            'p50': 50.0,
+            'p95': 95.0,
+            'max': 100.0
+        }
+
+    def test_summary_one(self):
+        self.cls.record('foo', 2.0)
+        assert self.cls.summary('foo') == {
+            'count': 1, 'p50': 2.0, 'p95': 2.0, 'max': 2.0
+        }
+
+    def test_summaries(self):
+        self.cls.record('foo', 2.0)
+        self.cls.record('bar', 3.0)
+        assert self.cls.summaries() == {
+            'foo': {'count': 1, 'p50': 2.0, 'p95': 2.0, 'max': 2.0},
+            'bar': {'count': 1, 'p50': 3.0, 'p95': 3.0, 'max': 3.0}
+        }
+
+
+class TestProfileImports(object):
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 | encodings\n' +
+            IMPORT_MARKER +
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:      2000 |       2000 |     urllib3\n'
+            'import time:       500 |       3500 |   requests\n'
+            'import time:      1000 |       1000 |   logging\n'
+            'import time:       250 |       4750 | foo\n'
+            'Traceback (most recent call last):\n'
+        )
+        assert parse_importtime(output, limit=3) == (
+            0.00375,
+            [
+                ('urllib3', 0.002, 0.002),
+                ('logging', 0.001, 0.001),
+                ('requests', 0.0005, 0.0035)
+            ]
+        )
+
+    def test_parse_importtime_empty(self):
+        assert parse_importtime('') == (0, [])
+
+    @pytest.mark.skipif(sys.version_info < (3, 7),
+                        reason='requires -X importtime')
+    def test_profile_imports(self):
+        total, modules = profile_imports(
+            ['rpymostat_sensor.timing', 'rpymostat_sensor.no_such_module',
+             'rpymostat_sensor.metrics'], limit=50
+        )
+        assert total > 0
+        names = [m[0] for m in modules]
+        assert 'rpymostat_sensor.timing' in names
+        # still imported after the one that failed
+        assert 'rpymostat_sensor.metrics' in names
+
+    def test_profile_imports_unsupported(self):
+        with patch('%s.sys' % pbm) as mock_sys:
+            mock_sys.version_info = (2, 7, 12)
+            with patch('%s.subprocess' % pbm, autospec=True) as mock_sub:
+                assert profile_imports(['foo']) is None
+        assert mock_sub.mock_calls == []
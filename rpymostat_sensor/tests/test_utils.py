@@ -0,0 +1,66 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import pytest
+
+from rpymostat_sensor.utils import str2bool
+
+
+class TestStr2Bool(object):
+
+    def test_bool(self):
+        assert str2bool(True) is True
+        assert str2bool(False) is False
+
+    def test_none(self):
+        assert str2bool(None) is False
+
+    def test_true_strings(self):
+        for s in ['1', 'true', 'True', 'YES', 'on', ' y ', 't']:
+            assert str2bool(s) is True
+
+    def test_false_strings(self):
+        for s in ['0', 'false', 'False', 'NO', 'off', 'n', 'f', '']:
+            assert str2bool(s) is False
+
+    def test_int(self):
+        assert str2bool(1) is True
+        assert str2bool(0) is False
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            str2bool('foo')
@@ -0,0 +1,132 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+from rpymostat_sensor.watcher import DirWatcher
+import rpymostat_sensor.watcher as watcher
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock, DEFAULT  # noqa
+else:
+    from unittest.mock import patch, call, Mock, DEFAULT  # noqa
+
+pbm = 'rpymostat_sensor.watcher'
+pb = '%s.DirWatcher' % pbm
+
+no_inotify = pytest.mark.skipif(
+    watcher._libc is None, reason='inotify is not available'
+)
+
+
+class TestDirWatcher(object):
+
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @no_inotify
+    def test_inotify(self):
+        w = DirWatcher(self.path)
+        assert w.method == 'inotify'
+        assert w.changed() is False
+        os.mkdir(os.path.join(self.path, '28-0123456789ab'))
+        assert w.changed() is True
+        assert w.changed() is False
+        os.rmdir(os.path.join(self.path, '28-0123456789ab'))
+        assert w.changed() is True
+        w.close()
+        assert w.method == 'mtime'
+        w.close()
+
+    @no_inotify
+    def test_inotify_dir_removed(self):
+        w = DirWatcher(self.path)
+        shutil.rmtree(self.path)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            assert w.changed() is True
+        assert w.method == 'mtime'
+        assert mock_logger.mock_calls == [
+            call.warning('inotify watch on %s was removed; falling back to '
+                         'mtime checks', self.path)
+        ]
+        assert w.changed() is False
+
+    @no_inotify
+    def test_del(self):
+        fds = len(os.listdir('/proc/self/fd'))
+        for _ in range(10):
+            DirWatcher(self.path)
+        assert len(os.listdir('/proc/self/fd')) == fds
+        w = DirWatcher(self.path)
+        w.close()
+        w.__del__()
+
+    def test_mtime(self):
+        w = DirWatcher(self.path, use_inotify=False)
+        assert w.method == 'mtime'
+        assert w.changed() is False
+        with patch('%s._get_mtime' % pb, autospec=True) as mock_mtime:
+            mock_mtime.return_value = 1234.5
+            assert w.changed() is True
+            assert w.changed() is False
+
+    def test_no_libc(self):
+        with patch('%s._libc' % pbm, None):
+            w = DirWatcher(self.path)
+        assert w.method == 'mtime'
+
+    @no_inotify
+    def test_missing_path(self):
+        path = os.path.join(self.path, 'foo')
+        w = DirWatcher(path)
+        assert w.method == 'mtime'
+        assert w._mtime is None
+        assert w.changed() is False
+        os.mkdir(path)
+        assert w.changed() is True
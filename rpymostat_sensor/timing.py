@@ -0,0 +1,222 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import sys
+import math
+import threading
+import subprocess
+from collections import deque
+from contextlib import contextmanager
+
+from rpymostat_sensor.utils import monotonic_time
+
+# written to stderr before the profiled import, to separate its -X importtime
+# output from that of interpreter startup
+IMPORT_MARKER = '-- rpymostat-sensor import profile --\n'
+
+
+@contextmanager
+def null_timer():
+    """
+    Context manager that does nothing; used in place of
+    :py:meth:`TimingStats.timer` when timing is not enabled.
+    """
+    yield
+
+
+class TimingStats(object):
+    """
+    Thread-safe collection of rolling timing samples, keyed by name. The
+    most recent ``window`` durations are kept for each name, from which
+    p50/p95/max summaries are calculated.
+    """
+
+    def __init__(self, window=100):
+        """
+        Initialize the timing stats.
+
+        :param window: number of most recent samples to keep for each name
+        :type window: int
+        """
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, duration):
+        """
+        Record one duration sample.
+
+        :param name: name of the thing that was timed
+        :type name: str
+        :param duration: duration in seconds
+        :type duration: float
+        """
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+            self._samples[name].append(duration)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Context manager that records the duration of its body under ``name``,
+        whether or not the body raises an exception.
+
+        :param name: name of the thing being timed
+        :type name: str
+        """
+        start = monotonic_time()
+        try:
+            yield
+        finally:
+            self.record(name, monotonic_time() - start)
+
+    def names(self):
+        """
+        Return the sorted list of names that have samples.
+
+        :rtype: list
+        """
+        with self._lock:
+            return sorted(self._samples.keys())
+
+    def summary(self, name):
+        """
+        Return a summary of the current samples for ``name``, or None if
+        there are none. The returned dict has keys ``count``, ``p50``,
+        ``p95`` and ``max``; durations are in seconds.
+
+        :param name: name to summarize
+        :type name: str
+        :rtype: dict
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, []))
+        if len(samples) < 1:
+            return None
+        return {
+            'count': len(samples),
+            'p50': self._percentile(samples, 50),
+            'p95': self._percentile(samples, 95),
+            'max': samples[-1]
+        }
+
+    def summaries(self):
+        """
+        Return a dict of every name with samples to its :py:meth:`~.summary`.
+
+        :rtype: dict
+        """
+        return dict((n, self.summary(n)) for n in self.names())
+
+    @staticmethod
+    def _percentile(samples, pct):
+        """
+        Return the nearest-rank percentile of a sorted, non-empty list.
+
+        :param samples: sorted samples
+        :type samples: list
+        :param pct: percentile, 0-100
+        :type pct: int
+        :rtype: float
+        """
+        idx = int(math.ceil((pct / 100.0) * len(samples))) - 1
+        return samples[max(idx, 0)]
+
+
+def profile_imports(modules, limit=20):
+    """
+    Import ``modules``, in order, in a fresh interpreter with Python's
+    ``-X importtime`` option, to find where their import time goes. A module
+    that fails to import doesn't stop the others. Requires Python 3.7 or
+    newer.
+
+    :param modules: names of the modules to import
+    :type modules: list
+    :param limit: number of slowest modules to return
+    :type limit: int
+    :return: None if not supported, otherwise a 2-tuple of the total import
+      time in seconds and a list of the ``limit`` slowest modules, by their
+      own (self) import time, as (name, self seconds, cumulative seconds)
+      tuples
+    :rtype: tuple
+    """
+    if sys.version_info < (3, 7):
+        return None
+    code = 'import sys\nsys.stderr.write(%r)\n' % IMPORT_MARKER
+    for module in modules:
+        code += 'try:\n    import %s\nexcept Exception:\n    pass\n' % module
+    p = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    _, err = p.communicate()
+    return parse_importtime(err.decode('utf-8', 'replace'), limit=limit)
+
+
+def parse_importtime(output, limit=20):
+    """
+    Parse ``-X importtime`` output; see :py:func:`~.profile_imports`. Only
+    lines after :py:data:`~.IMPORT_MARKER`, if present, are used.
+
+    :param output: stderr of the profiled interpreter
+    :type output: str
+    :param limit: number of slowest modules to return
+    :type limit: int
+    :return: 2-tuple of the total import time in seconds and a list of the
+      ``limit`` slowest modules, as (name, self seconds, cumulative seconds)
+    :rtype: tuple
+    """
+    modules = []
+    for line in output.split(IMPORT_MARKER)[-1].splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0])
+            cumulative_us = int(parts[1])
+        except ValueError:
+            # the header line
+            continue
+        modules.append(
+            (parts[2].strip(), self_us / 1000000.0, cumulative_us / 1000000.0)
+        )
+    total = sum(m[1] for m in modules)
+    modules.sort(key=lambda m: m[1], reverse=True)
+    return total, modules[:limit]
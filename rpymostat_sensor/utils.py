@@ -0,0 +1,65 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import time
+
+
+def str2bool(value):
+    """
+    Convert a boolean-ish value to a bool. Sensor class arguments given on
+    the command line (``-c ClassName=arg_name=value``) are always strings, so
+    this accepts the usual string spellings as well as actual booleans.
+
+    :param value: value to convert
+    :type value: bool or str
+    :return: boolean value
+    :rtype: bool
+    """
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    v = str(value).strip().lower()
+    if v in ['1', 'true', 'yes', 'on', 'y', 't']:
+        return True
+    if v in ['0', 'false', 'no', 'off', 'n', 'f', '']:
+        return False
+    raise ValueError('Cannot convert "%s" to a boolean' % value)
+
+
+# time.monotonic() is only available on py3.3+; fall back to time.time()
+monotonic_time = getattr(time, 'monotonic', time.time)
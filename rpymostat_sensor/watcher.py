@@ -0,0 +1,214 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/RPyMostat-sensor>
+
+##################################################################################
+Copyright 2016 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of RPyMostat-sensor, also known as RPyMostat-sensor.
+
+    RPyMostat-sensor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RPyMostat-sensor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with RPyMostat-sensor.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/RPyMostat-sensor> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import errno
+import struct
+import logging
+import ctypes
+import ctypes.util
+
+logger = logging.getLogger(__name__)
+
+# inotify event flags, from <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# events that mean entries were added to or removed from a directory
+WATCH_MASK = (
+    IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+    IN_MOVE_SELF | IN_ONLYDIR
+)
+
+# inotify_init1() flags; same values as O_NONBLOCK / O_CLOEXEC on Linux
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event header: wd, mask, cookie, len
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """
+    Load the C library with :py:mod:`ctypes`, if it provides the inotify
+    functions.
+
+    :return: C library, or None if inotify is not available
+    :rtype: :py:class:`ctypes.CDLL`
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError, TypeError):
+        return None
+    return libc
+
+
+_libc = _load_libc()
+
+
+class DirWatcher(object):
+    """
+    Detect entries being added to or removed from a directory, i.e. devices
+    appearing in an OWFS mountpoint or ``/sys/bus/w1/devices``. Uses Linux
+    inotify (via :py:mod:`ctypes`) where available, so that checking for
+    changes is a single non-blocking read. The directory's mtime is also
+    checked on every call, which is the only method used where inotify is
+    unavailable, and catches changes on filesystems (such as FUSE and sysfs)
+    that do not always generate inotify events.
+    """
+
+    def __init__(self, path, use_inotify=True):
+        """
+        Start watching a directory.
+
+        :param path: path to the directory to watch
+        :type path: str
+        :param use_inotify: whether to use inotify if it is available
+        :type use_inotify: bool
+        """
+        self.path = path
+        self._fd = None
+        self._mtime = self._get_mtime()
+        if use_inotify:
+            self._fd = self._inotify_watch()
+        self.method = 'mtime' if self._fd is None else 'inotify'
+        logger.debug('Watching %s for changes using %s', path, self.method)
+
+    def _inotify_watch(self):
+        """
+        Create an inotify instance watching ``self.path``.
+
+        :return: inotify file descriptor, or None if inotify is unavailable
+          or the watch could not be added
+        :rtype: int
+        """
+        if _libc is None:
+            return None
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.debug('inotify_init1() failed: %s',
+                         os.strerror(ctypes.get_errno()))
+            return None
+        path = self.path
+        if not isinstance(path, bytes):
+            path = path.encode('utf-8')
+        if _libc.inotify_add_watch(fd, path, WATCH_MASK) < 0:
+            logger.debug('inotify_add_watch() on %s failed: %s', self.path,
+                         os.strerror(ctypes.get_errno()))
+            os.close(fd)
+            return None
+        return fd
+
+    def _get_mtime(self):
+        """
+        Return the modification time of ``self.path``, or None if it cannot
+        be determined.
+
+        :rtype: float
+        """
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def changed(self):
+        """
+        Return whether entries have been added to or removed from the
+        directory since the last call (or since the watcher was created).
+
+        :rtype: bool
+        """
+        mtime = self._get_mtime()
+        changed = mtime != self._mtime
+        self._mtime = mtime
+        if self._fd is not None and self._read_events():
+            changed = True
+        return changed
+
+    def _read_events(self):
+        """
+        Read and discard all pending inotify events. If the watch was removed
+        (i.e. the directory was deleted or unmounted), fall back to mtime
+        checks.
+
+        :return: whether there were any events
+        :rtype: bool
+        """
+        buf = b''
+        while True:
+            try:
+                chunk = os.read(self._fd, 4096)
+            except OSError as ex:
+                if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not chunk:
+                break
+            buf += chunk
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size + length
+            if mask & IN_IGNORED:
+                logger.warning('inotify watch on %s was removed; falling '
+                               'back to mtime checks', self.path)
+                self.close()
+                break
+        return len(buf) > 0
+
+    def close(self):
+        """
+        Stop watching the directory with inotify.
+        """
+        if self._fd is None:
+            return
+        os.close(self._fd)
+        self._fd = None
+        self.method = 'mtime'
+
+    def __del__(self):
+        # release the inotify instance if close() was never called
+        if getattr(self, '_fd', None) is not None:
+            self.close()
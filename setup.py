@@ -41,7 +41,9 @@ from rpymostat_sensor.version import VERSION, PROJECT_URL
 
 entry_points = {
     'rpymostat.sensors': [
-        'owfs = rpymostat_sensor.sensors.owfs:OWFS'
+        'owfs = rpymostat_sensor.sensors.owfs:OWFS',
+        'owserver = rpymostat_sensor.sensors.owserver:OWServer',
+        'w1_therm = rpymostat_sensor.sensors.w1_therm:W1Therm'
     ],
     'console_scripts': [
         'rpymostat-sensor = rpymostat_sensor.runner:console_entry_point'